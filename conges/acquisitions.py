@@ -0,0 +1,103 @@
+"""
+Acquisition mensuelle des congés annuels.
+
+Les droits s'acquièrent chaque mois à raison de jours_conges_annuels / 12,
+au prorata des jours de présence le mois de l'embauche (aucun droit avant).
+Une date d'embauche inconnue est traitée comme antérieure à l'année.
+
+Le calcul est fait par lot, pour tous les employés à la fois : les colonnes
+utiles (id, date d'embauche, droit annuel) sont chargées en une requête,
+l'arithmétique de dates est faite colonne par colonne sur des ordinaux
+entiers, et les résultats sont enregistrés par upsert (executemany) dans
+AcquisitionMensuelle, une ligne par employé et par mois. Relancer le
+calcul d'un mois remplace ses lignes, dans une transaction : celles des
+employés qui ne sont plus concernés (désactivés depuis) sont supprimées.
+"""
+import calendar
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AcquisitionMensuelle, User
+
+TAILLE_LOT = 10000
+CENTIEME = Decimal("0.01")
+
+
+def _fractions_presence(embauches, debut, fin):
+    """Part de la période [debut, fin] (ordinaux inclus) travaillée, pour chaque date d'embauche"""
+    duree = fin - debut + 1
+    return [1.0 if e <= debut else 0.0 if e > fin else (fin - e + 1) / duree for e in embauches]
+
+
+def calculer_colonnes(embauches, droits_annuels, annee, mois):
+    """(acquis du mois, cumul depuis janvier) pour des colonnes alignées.
+
+    embauches : dates d'embauche (ou None) ; droits_annuels : jours par an.
+    """
+    premier = date(annee, mois, 1).toordinal()
+    dernier = premier + calendar.monthrange(annee, mois)[1] - 1
+    debut_annee = date(annee, 1, 1).toordinal()
+    embauches = [e.toordinal() if e else debut_annee for e in embauches]
+
+    presence_mois = _fractions_presence(embauches, premier, dernier)
+    # Mois de présence depuis janvier : mois pleins après l'embauche + prorata du mois d'embauche
+    mois_cumules = []
+    for ordinal, fraction in zip(embauches, presence_mois):
+        if ordinal <= debut_annee:
+            mois_cumules.append(float(mois))
+        elif ordinal > dernier:
+            mois_cumules.append(0.0)
+        else:
+            embauche = date.fromordinal(ordinal)
+            jours_mois_embauche = calendar.monthrange(annee, embauche.month)[1]
+            prorata = (jours_mois_embauche - embauche.day + 1) / jours_mois_embauche
+            mois_cumules.append(mois - embauche.month + prorata)
+
+    mensuels = [droit / 12 for droit in droits_annuels]
+    acquis = [Decimal(m * f).quantize(CENTIEME) for m, f in zip(mensuels, presence_mois)]
+    cumuls = [Decimal(m * n).quantize(CENTIEME) for m, n in zip(mensuels, mois_cumules)]
+    return acquis, cumuls
+
+
+def calculer_acquisitions(annee, mois, taille_lot=TAILLE_LOT):
+    """Calcule et enregistre les acquisitions du mois pour tous les employés actifs.
+
+    Retourne le nombre d'employés traités.
+    """
+    fin_mois = date(annee, mois, calendar.monthrange(annee, mois)[1])
+    lignes = list(User.objects.filter(is_active=True).exclude(date_embauche__gt=fin_mois)
+                  .order_by("pk").values_list("pk", "date_embauche", "jours_conges_annuels"))
+    maintenant = timezone.now()
+    with transaction.atomic():
+        if lignes:
+            _enregistrer(lignes, annee, mois, connection.ops.adapt_datetimefield_value(maintenant), taille_lot)
+        # Lignes d'un calcul précédent que celui-ci n'a pas remplacées
+        AcquisitionMensuelle.objects.filter(annee=annee, mois=mois, date_calcul__lt=maintenant).delete()
+    return len(lignes)
+
+
+def _enregistrer(lignes, annee, mois, date_calcul, taille_lot):
+    ids, embauches, droits = zip(*lignes)
+    acquis, cumuls = calculer_colonnes(embauches, droits, annee, mois)
+    with connection.cursor() as cursor:
+        for debut in range(0, len(ids), taille_lot):
+            fin = debut + taille_lot
+            cursor.executemany(_SQL_UPSERT, [
+                (i, annee, mois, a, c, date_calcul)
+                for i, a, c in zip(ids[debut:fin], acquis[debut:fin], cumuls[debut:fin])
+            ])
+
+
+# Upsert par executemany : ni instance de modèle par ligne, ni limite de
+# paramètres par requête (syntaxe commune à SQLite et PostgreSQL).
+_SQL_UPSERT = """
+    INSERT INTO {table} (employe_id, annee, mois, jours_acquis, jours_cumules, date_calcul)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (employe_id, annee, mois) DO UPDATE SET
+        jours_acquis = excluded.jours_acquis,
+        jours_cumules = excluded.jours_cumules,
+        date_calcul = excluded.date_calcul
+""".format(table=AcquisitionMensuelle._meta.db_table)
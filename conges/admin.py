@@ -1,2 +1,379 @@
+"""
+Administration Django des modèles de conges.
+
+Les __str__ des modèles traversent des clés étrangères (Service → direction,
+NotificationConge → destinataire, …) : chaque liste charge ces relations
+par jointure (list_select_related) et les champs de clé étrangère passent
+par l'autocomplétion plutôt que par des listes déroulantes chargeant toute
+la table. Les recherches portent sur des colonnes indexées.
+
+Pour les grandes tables, le nombre total de lignes d'une liste non filtrée
+est estimé (voir PaginateurEstime) plutôt que compté, et le second
+comptage « n au total » de l'admin est désactivé : une liste s'affiche en
+un nombre fixe de requêtes, quel que soit le volume.
+"""
+import functools
+from datetime import date, datetime
+
 from django.contrib import admin
-# Register your models he
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .audit import Action
+from .models import (AcquisitionMensuelle, AffectationApprobation, CalendrierFeries, DemandeArchivee, Departement,
+                     DemandeConge, Direction, EtapeApprobation, HistoriqueConge, JourFerie, LotCloture,
+                     NotificationConge, Service, SoldeConge, Tache, TypeConge, User)
+from .taches import TACHES
+
+# En dessous, le comptage exact reste bon marché et il est préféré
+SEUIL_COMPTAGE_ESTIME = 100_000
+
+
+def estimer_lignes(modele, using="default"):
+    """Estimation du nombre de lignes d'une table, sans la parcourir (None si indisponible)"""
+    connexion = connections[using]
+    if connexion.vendor == "postgresql":
+        with connexion.cursor() as curseur:
+            curseur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                            [modele._meta.db_table])
+            ligne = curseur.fetchone()
+        return ligne[0] if ligne and ligne[0] >= 0 else None
+    if connexion.vendor in ("sqlite", "mysql"):
+        # Identifiants auto-incrémentés : le plus grand, lu sur l'index de la clé primaire
+        return modele._default_manager.using(using).aggregate(estimation=Max("pk"))["estimation"] or 0
+    return None
+
+
+class PaginateurEstime(Paginator):
+    """Paginateur dont le total est estimé pour une liste non filtrée d'une grande table"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimation = estimer_lignes(queryset.model, queryset.db)
+            if estimation is not None and estimation >= SEUIL_COMPTAGE_ESTIME:
+                return estimation
+        return super().count
+
+
+def filtre_valeurs(titre, champ, valeurs):
+    """Filtre de liste sur des valeurs connues d'avance.
+
+    Le filtre par défaut d'un champ sans choices lit ses valeurs par un
+    SELECT DISTINCT sur toute la table ; `valeurs` est ici un callable
+    retournant des paires (valeur, libellé), évalué sans requête.
+    """
+    class Filtre(admin.SimpleListFilter):
+        title = titre
+        parameter_name = champ
+
+        def lookups(self, request, model_admin):
+            return valeurs()
+
+        def queryset(self, request, queryset):
+            if self.value() is not None:
+                return queryset.filter(**{champ: self.value()})
+            return queryset
+
+    return Filtre
+
+
+def _annees():
+    annee = timezone.now().year
+    return [(str(a), str(a)) for a in range(annee + 1, annee - 5, -1)]
+
+
+FiltreAnnee = filtre_valeurs("année", "annee", _annees)
+
+
+class HierarchieDatesParBornes:
+    """dates()/datetimes() à l'année ou au mois déduits des bornes MIN/MAX.
+
+    La hiérarchie de dates de l'admin liste les années (puis les mois) par
+    un SELECT DISTINCT sur la date tronquée, qui parcourt toute la table.
+    Ici, toutes les périodes entre la première et la dernière date sont
+    proposées, éventuellement vides ; les jours restent lus en base (un
+    mois de données au plus).
+    """
+
+    def dates(self, field_name, kind, order="ASC"):
+        if kind not in ("year", "month"):
+            return super().dates(field_name, kind, order)
+        return self._periodes(field_name, kind, order, date)
+
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None):
+        if kind not in ("year", "month"):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        return self._periodes(field_name, kind, order, datetime)
+
+    def _periodes(self, field_name, kind, order, type_date):
+        bornes = self.aggregate(premiere=Min(field_name), derniere=Max(field_name))
+        if bornes["premiere"] is None:
+            return []
+        premiere, derniere = bornes["premiere"], bornes["derniere"]
+        if isinstance(premiere, datetime) and timezone.is_aware(premiere):
+            premiere, derniere = timezone.localtime(premiere), timezone.localtime(derniere)
+        if kind == "year":
+            periodes = [type_date(annee, 1, 1) for annee in range(premiere.year, derniere.year + 1)]
+        else:
+            periodes = [type_date(numero // 12, numero % 12 + 1, 1)
+                        for numero in range(premiere.year * 12 + premiere.month - 1,
+                                            derniere.year * 12 + derniere.month)]
+        return periodes if order == "ASC" else periodes[::-1]
+
+
+class ListeGrandeTable(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.date_hierarchy:
+            queryset.__class__ = _avec_hierarchie_par_bornes(queryset.__class__)
+        return queryset
+
+
+@functools.cache
+def _avec_hierarchie_par_bornes(classe):
+    return type(classe.__name__, (HierarchieDatesParBornes, classe), {})
+
+
+class GrandeTableAdmin(admin.ModelAdmin):
+    paginator = PaginateurEstime
+    show_full_result_count = False
+    list_per_page = 50
+    # Recherche d'un identifiant numérique : égalité sur cette colonne (index)
+    # plutôt qu'un LIKE combiné par OR aux autres champs de recherche
+    champ_identifiant = None
+
+    def get_changelist(self, request, **kwargs):
+        return ListeGrandeTable
+
+    def get_search_results(self, request, queryset, search_term):
+        terme = search_term.strip()
+        if self.champ_identifiant and terme.isdigit():
+            return queryset.filter(**{self.champ_identifiant: int(terme)}), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+# -------------------------------
+# Organisation
+# -------------------------------
+@admin.register(Direction)
+class DirectionAdmin(admin.ModelAdmin):
+    list_display = ("nom", "code", "directeur", "calendrier", "date_creation")
+    list_select_related = ("directeur", "calendrier")
+    list_filter = ("calendrier",)
+    search_fields = ("^nom", "=code")
+    autocomplete_fields = ("directeur", "calendrier")
+
+
+class JourFerieInline(admin.TabularInline):
+    model = JourFerie
+    extra = 1
+
+
+@admin.register(CalendrierFeries)
+class CalendrierFeriesAdmin(admin.ModelAdmin):
+    list_display = ("nom", "code", "pays", "par_defaut")
+    search_fields = ("^nom", "=code")
+    inlines = (JourFerieInline,)
+
+
+@admin.register(JourFerie)
+class JourFerieAdmin(admin.ModelAdmin):
+    list_display = ("date", "libelle", "type_jour", "calendrier")
+    list_select_related = ("calendrier",)
+    list_filter = ("calendrier", "type_jour")
+    date_hierarchy = "date"
+    search_fields = ("^libelle",)
+    autocomplete_fields = ("calendrier",)
+
+
+@admin.register(Service)
+class ServiceAdmin(admin.ModelAdmin):
+    list_display = ("nom", "code", "direction", "chef_service")
+    list_select_related = ("direction", "chef_service")
+    list_filter = ("direction",)
+    search_fields = ("^nom",)
+    autocomplete_fields = ("direction", "chef_service")
+
+    def get_queryset(self, request):
+        # __str__ lit direction.nom, y compris dans les résultats d'autocomplétion. La
+        # liste n'applique plus list_select_related à un queryset déjà en select_related.
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+
+@admin.register(Departement)
+class DepartementAdmin(admin.ModelAdmin):
+    list_display = ("nom", "code", "service", "chef_departement")
+    list_select_related = ("service__direction", "chef_departement")
+    search_fields = ("^nom",)
+    autocomplete_fields = ("service", "chef_departement")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+
+@admin.register(User)
+class UtilisateurAdmin(GrandeTableAdmin, UserAdmin):
+    list_display = ("username", "first_name", "last_name", "role", "direction", "manager", "is_active")
+    list_select_related = ("direction", "manager")
+    list_filter = ("role", "is_active", "is_staff")
+    search_fields = ("^username", "^last_name")
+    autocomplete_fields = ("direction", "service", "departement", "manager")
+    fieldsets = UserAdmin.fieldsets + (
+        ("Organisation", {"fields": ("role", "direction", "service", "departement", "manager")}),
+        ("Congés", {"fields": ("jours_conges_annuels", "date_embauche",
+                               "notifications_email", "notifications_app")}),
+    )
+
+
+# -------------------------------
+# Congés
+# -------------------------------
+class EtapeApprobationInline(admin.TabularInline):
+    """Circuit d'approbation ; sans étape, seul l'approbateur requis du type décide"""
+    model = EtapeApprobation
+    extra = 0
+
+
+@admin.register(TypeConge)
+class TypeCongeAdmin(admin.ModelAdmin):
+    list_display = ("nom", "approbateur_requis", "necessite_justificatif", "duree_max_jours",
+                    "delai_prevenance_jours", "actif")
+    list_filter = ("actif", "approbateur_requis")
+    search_fields = ("=nom",)
+    inlines = [EtapeApprobationInline]
+
+
+@admin.register(DemandeConge)
+class DemandeCongeAdmin(GrandeTableAdmin):
+    list_display = ("id", "employe", "type_conge", "date_debut", "date_fin", "jours_ouvrables", "statut",
+                    "date_demande", "approbateur")
+    list_select_related = ("employe", "type_conge", "approbateur")
+    list_filter = ("statut", "type_conge", "priorite")
+    date_hierarchy = "date_demande"
+    search_fields = ("employe__username__exact",)
+    champ_identifiant = "pk"
+    autocomplete_fields = ("employe", "type_conge", "remplacant")
+    # Le statut et sa décision ne changent que par effectuer_transition, qui
+    # tient à jour soldes, affectations et historique
+    readonly_fields = ("version", "jours_ouvrables", "jours_reserves", "date_demande", "circuit", "etape", "statut",
+                       "approbateur", "date_traitement")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+
+@admin.register(NotificationConge)
+class NotificationCongeAdmin(GrandeTableAdmin):
+    list_display = ("titre", "destinataire", "type_notification", "lu", "date_creation")
+    list_select_related = ("destinataire",)
+    list_filter = ("type_notification", "lu")
+    date_hierarchy = "date_creation"
+    search_fields = ("destinataire__username__exact",)
+    champ_identifiant = "demande_id"
+    autocomplete_fields = ("demande", "destinataire")
+
+
+@admin.register(HistoriqueConge)
+class HistoriqueCongeAdmin(GrandeTableAdmin):
+    """Journal en ajout seul : consultation uniquement"""
+    list_display = ("date_action", "demande_id", "utilisateur", "action", "ancien_statut", "nouveau_statut")
+    list_select_related = ("utilisateur",)
+    list_filter = (filtre_valeurs("action", "action", lambda: [
+        (valeur, valeur.replace("_", " ").capitalize())
+        for nom, valeur in vars(Action).items() if not nom.startswith("_")]),)
+    date_hierarchy = "date_action"
+    search_fields = ("utilisateur__username__exact",)
+    champ_identifiant = "demande_id"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AffectationApprobation)
+class AffectationApprobationAdmin(GrandeTableAdmin):
+    """Table dérivée (conges.affectations) : consultation uniquement"""
+    list_display = ("demande", "approbateur", "type_conge", "priorite", "escalade", "date_demande")
+    list_select_related = ("demande__employe", "demande__type_conge", "approbateur", "type_conge")
+    list_filter = ("escalade", "priorite")
+    search_fields = ("approbateur__username__exact",)
+    champ_identifiant = "demande_id"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DemandeArchivee)
+class DemandeArchiveeAdmin(GrandeTableAdmin):
+    """Demandes sorties des tables courantes (conges.archives) : consultation uniquement"""
+    list_display = ("id", "employe", "type_conge", "date_debut", "date_fin", "jours_ouvrables", "statut",
+                    "date_archivage")
+    list_select_related = ("employe", "type_conge")
+    list_filter = ("statut", "type_conge")
+    search_fields = ("employe__username__exact",)
+    champ_identifiant = "pk"
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SoldeConge)
+class SoldeCongeAdmin(GrandeTableAdmin):
+    list_display = ("employe", "annee", "jours_droits", "jours_pris", "jours_reserves", "jours_reportes",
+                    "jours_disponibles", "date_cloture")
+    list_select_related = ("employe",)
+    list_filter = (FiltreAnnee,)
+    search_fields = ("employe__username__exact",)
+    autocomplete_fields = ("employe",)
+
+
+@admin.register(AcquisitionMensuelle)
+class AcquisitionMensuelleAdmin(GrandeTableAdmin):
+    list_display = ("employe", "annee", "mois", "jours_acquis", "jours_cumules", "date_calcul")
+    list_select_related = ("employe",)
+    list_filter = (FiltreAnnee,
+                   filtre_valeurs("mois", "mois", lambda: [(str(m), f"{m:02d}") for m in range(1, 13)]))
+    search_fields = ("employe__username__exact",)
+    autocomplete_fields = ("employe",)
+
+
+@admin.register(LotCloture)
+class LotClotureAdmin(admin.ModelAdmin):
+    list_display = ("annee", "borne_min", "borne_max", "nombre_employes", "date_traitement")
+    list_filter = ("annee",)
+
+
+@admin.register(Tache)
+class TacheAdmin(GrandeTableAdmin):
+    list_display = ("id", "nom", "statut", "priorite", "progression", "tentatives", "cree_par", "date_creation")
+    list_select_related = ("cree_par",)
+    list_filter = ("statut", filtre_valeurs("tâche", "nom", lambda: [(nom, nom) for nom in sorted(TACHES)]))
+    date_hierarchy = "date_creation"
+    search_fields = ("nom__exact",)
+    champ_identifiant = "pk"
+    autocomplete_fields = ("cree_par",)
+    readonly_fields = ("travailleur", "tentatives", "progression", "message", "resultat", "erreur", "date_fin")
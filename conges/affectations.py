@@ -0,0 +1,134 @@
+"""
+Affectation des demandes en attente à leurs approbateurs possibles.
+
+La table AffectationApprobation associe chaque demande en attente aux
+utilisateurs qui peuvent approuver l'étape en cours de son circuit
+(conges.circuits), selon les mêmes règles que
+DemandeConge.get_approbateurs_possibles() :
+- manager, chef de département, chef de service, directeur : le
+  responsable correspondant de l'employé ;
+- secrétaire, RH : tous les utilisateurs de ce rôle.
+
+Elle est tenue à jour :
+- à la soumission d'une demande, dans la même transaction (signal) ;
+- au passage à l'étape suivante et à la sortie de l'attente, dans la
+  transaction de la transition (conges.transitions) ;
+- à l'escalade d'une étape (conges.circuits) ;
+- à chaque changement d'organisation (responsable d'une direction, d'un
+  service ou d'un département, rattachement ou manager d'un employé, rôle
+  secrétaire / RH) : les signaux mettent en file (conges.taches) le
+  recalcul des demandes concernées.
+
+La boîte d'un approbateur (vue boite_approbation) se lit alors sur les
+index de la table, sans évaluer les règles à l'affichage. La commande
+affecter_approbateurs recalcule toutes les demandes en attente.
+"""
+from django.db import transaction
+
+from .models import AffectationApprobation, DemandeConge, TypeConge, User
+
+Approbateur = TypeConge.Approbateur
+
+LIGNES_PAR_LOT = 2000
+
+# Approbateur requis → responsable de l'employé
+RESPONSABLES = {
+    Approbateur.MANAGER: "employe__manager_id",
+    Approbateur.CHEF_DEPT: "employe__departement__chef_departement_id",
+    Approbateur.CHEF_SERV: "employe__service__chef_service_id",
+    Approbateur.DIRECTEUR: "employe__direction__directeur_id",
+}
+# Approbateur requis → rôle dont tous les titulaires peuvent approuver
+ROLES = {
+    Approbateur.SECRETAIRE: User.Role.SECRETAIRE,
+    Approbateur.RH: User.Role.RH,
+}
+
+# Critères de demandes_concernees() (paramètres de la tâche mise en file)
+CRITERES = {
+    "employe_id": "employe_id",
+    "direction_id": "employe__direction_id",
+    "service_id": "employe__service_id",
+    "departement_id": "employe__departement_id",
+}
+
+
+def demandes_concernees(**criteres):
+    """Demandes en attente correspondant à tous les critères (voir CRITERES)"""
+    return DemandeConge.objects.filter(statut=DemandeConge.Statut.EN_ATTENTE,
+                                       **{CRITERES[nom]: valeur for nom, valeur in criteres.items()})
+
+
+def calculer(demandes):
+    """Affectations (non enregistrées) des demandes en attente de `demandes`,
+    pour l'étape en cours de leur circuit (conges.circuits) et son escalade :
+    une requête pour les demandes et leurs responsables, une de plus si une
+    étape requiert un rôle."""
+    lignes = list(demandes.filter(statut=DemandeConge.Statut.EN_ATTENTE).order_by().values(
+        "pk", "type_conge_id", "priorite", "date_demande", "circuit", "etape", "escaladee",
+        "type_conge__approbateur_requis", *RESPONSABLES.values()))
+    for ligne in lignes:
+        circuit, etape = ligne["circuit"], ligne["etape"]
+        courante = circuit[etape] if etape < len(circuit) else {"approbateur": ligne["type_conge__approbateur_requis"]}
+        ligne["niveaux"] = [(courante["approbateur"], False)]
+        if ligne["escaladee"] and courante.get("escalade_vers"):
+            ligne["niveaux"].append((courante["escalade_vers"], True))
+    roles = {ROLES[requis] for ligne in lignes for requis, _ in ligne["niveaux"] if requis in ROLES}
+    titulaires = {}
+    if roles:
+        for pk, role in User.objects.filter(role__in=roles).values_list("pk", "role"):
+            titulaires.setdefault(role, []).append(pk)
+
+    affectations = []
+    for ligne in lignes:
+        approbateurs = {}
+        for requis, escalade in ligne["niveaux"]:
+            if requis in ROLES:
+                ids = titulaires.get(ROLES[requis], ())
+            else:
+                responsable = ligne.get(RESPONSABLES.get(requis))
+                ids = (responsable,) if responsable else ()
+            for approbateur_id in ids:
+                approbateurs.setdefault(approbateur_id, escalade)
+        affectations.extend(
+            AffectationApprobation(demande_id=ligne["pk"], approbateur_id=approbateur_id,
+                                   type_conge_id=ligne["type_conge_id"], priorite=ligne["priorite"],
+                                   date_demande=ligne["date_demande"], escalade=escalade)
+            for approbateur_id, escalade in approbateurs.items())
+    return affectations
+
+
+def affecter(demandes, remplacer=True):
+    """Enregistre les affectations des demandes en attente de `demandes`,
+    à la place des précédentes si `remplacer`. Retourne leur nombre."""
+    affectations = calculer(demandes)
+    with transaction.atomic(savepoint=False):
+        if remplacer:
+            AffectationApprobation.objects.filter(demande__in=demandes.values("pk")).delete()
+        AffectationApprobation.objects.bulk_create(affectations, batch_size=500)
+    return len(affectations)
+
+
+def retirer(demande_id):
+    """Demande sortie de l'attente : plus aucun approbateur ne la voit"""
+    AffectationApprobation.objects.filter(demande_id=demande_id).delete()
+
+
+def reaffecter(demandes=None, progression=None):
+    """Recalcule les affectations de `demandes` (par défaut toutes les
+    demandes en attente) par lots, chacun dans sa transaction. Retourne le
+    nombre d'affectations enregistrées."""
+    if demandes is None:
+        # Recalcul complet : aussi les affectations restées sur des demandes sorties de l'attente
+        AffectationApprobation.objects.exclude(demande__statut=DemandeConge.Statut.EN_ATTENTE).delete()
+        demandes = demandes_concernees()
+    demandes = demandes.order_by("pk")
+    dernier, lues, enregistrees = 0, 0, 0
+    while True:
+        lot = list(demandes.filter(pk__gt=dernier).values_list("pk", flat=True)[:LIGNES_PAR_LOT])
+        if not lot:
+            return enregistrees
+        enregistrees += affecter(DemandeConge.objects.filter(pk__in=lot))
+        dernier, lues = lot[-1], lues + len(lot)
+        if progression:
+            progression(lues, enregistrees)
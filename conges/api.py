@@ -0,0 +1,446 @@
+"""
+API JSON versionnée (/api/v1/) : demandes, notifications, soldes,
+organigramme et demandes archivées (conges.archives).
+
+- Pagination par curseur (?curseur=…&limite=…) : chaque page est lue par
+  l'index de la clé primaire (id < dernier id reçu), sans OFFSET, donc en
+  temps constant quelle que soit la profondeur.
+- Champs au choix (?champs=id,statut,employe.nom) : seules les colonnes
+  nécessaires sont lues, et les jointures ne sont faites que pour les
+  relations demandées.
+- Les lignes sont lues avec values() (pas d'instances de modèle) et
+  encodées par orjson lorsqu'il est installé.
+- /api/v1/simulation/ évalue des périodes candidates pour le formulaire
+  de demande, à partir de données en cache (voir conges.simulation).
+
+Chaque vue exécute un nombre fixe de requêtes, indépendant de la taille
+de la page (voir BUDGETS_REQUETES dans conges.tests).
+"""
+import base64
+import binascii
+import json
+from datetime import date
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import HttpResponse, QueryDict
+
+from .forms import FiltreDemandesForm
+from .models import (DemandeArchivee, Departement, DemandeConge, Direction, NotificationConge, Service, SoldeConge,
+                     User)
+from .portees import TOUT, portee as portee_utilisateur
+from .remplacements import SUGGESTIONS_DEFAUT, suggerer_remplacants
+from .simulation import simuler
+from .soldes import soldes_initiaux
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance facultative
+    orjson = None
+
+LIMITE_DEFAUT = 50
+LIMITE_MAX = 500
+PERIODES_MAX = 20
+SUGGESTIONS_MAX = 50
+
+_encodeur_django = DjangoJSONEncoder()
+
+
+def encoder(donnees):
+    if orjson is not None:
+        # Dates et datetimes natifs ; Decimal et autres types via l'encodeur Django
+        return orjson.dumps(donnees, default=_encodeur_django.default)
+    return json.dumps(donnees, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+
+
+def reponse_json(donnees, status=200):
+    return HttpResponse(encoder(donnees), content_type="application/json", status=status)
+
+
+class ErreurAPI(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def vue_api(vue):
+    """Authentification par session (401 plutôt qu'une redirection) et erreurs en JSON"""
+    @wraps(vue)
+    def enveloppe(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return reponse_json({"erreur": "Authentification requise"}, status=401)
+        if request.method != "GET":
+            return reponse_json({"erreur": "Méthode non autorisée"}, status=405)
+        try:
+            return vue(request, *args, **kwargs)
+        except ErreurAPI as erreur:
+            return reponse_json({"erreur": str(erreur)}, status=erreur.status)
+    return enveloppe
+
+
+# -------------------------------
+# Champs exposés
+# -------------------------------
+class Champ:
+    """Champ de la réponse, calculé à partir d'une ou plusieurs colonnes de values()"""
+
+    def __init__(self, *colonnes, calcul=None):
+        self.colonnes = colonnes
+        self.calcul = calcul
+
+
+def _nom_complet(prenom, nom, username):
+    return f"{prenom} {nom}".strip() or username
+
+
+def _personne(relation):
+    """Champs d'une personne liée (employe, approbateur, …)"""
+    return {
+        f"{relation}.id": Champ(f"{relation}_id"),
+        f"{relation}.username": Champ(f"{relation}__username"),
+        f"{relation}.nom": Champ(f"{relation}__first_name", f"{relation}__last_name", f"{relation}__username",
+                                 calcul=_nom_complet),
+    }
+
+
+class Ressource:
+    def __init__(self, champs, defaut):
+        self.champs = {nom: champ if isinstance(champ, Champ) else Champ(champ) for nom, champ in champs.items()}
+        self.defaut = defaut
+
+    def choisir(self, parametre):
+        """Liste des champs demandés (?champs=…), ou les champs par défaut"""
+        if not parametre:
+            return self.defaut
+        noms = [nom.strip() for nom in parametre.split(",") if nom.strip()]
+        inconnus = [nom for nom in noms if nom not in self.champs]
+        if inconnus:
+            raise ErreurAPI(f"Champs inconnus : {', '.join(inconnus)}")
+        return noms
+
+    def lire(self, queryset, noms, colonnes_internes=()):
+        """Lignes sérialisables : values() restreint aux colonnes des champs
+        demandés (et aux `colonnes_internes`, lues sans être exposées), les
+        relations traversées étant jointes par la même requête."""
+        extraction = []
+        colonnes = {"id", *colonnes_internes}
+        for nom in noms:
+            champ = self.champs[nom]
+            colonnes.update(champ.colonnes)
+            extraction.append((nom.split("."), champ))
+        lignes = queryset.values(*colonnes)
+        return lignes, lambda ligne: self._objet(ligne, extraction)
+
+    @staticmethod
+    def _objet(ligne, extraction):
+        objet = {}
+        for chemin, champ in extraction:
+            if champ.calcul:
+                valeur = champ.calcul(*(ligne[colonne] for colonne in champ.colonnes))
+            else:
+                valeur = ligne[champ.colonnes[0]]
+            cible = objet
+            for cle in chemin[:-1]:
+                cible = cible.setdefault(cle, {})
+            cible[chemin[-1]] = valeur
+        return objet
+
+
+DEMANDES = Ressource({
+    "id": "id",
+    "statut": "statut",
+    "priorite": "priorite",
+    "type": "type_conge__nom",
+    "date_debut": "date_debut",
+    "date_fin": "date_fin",
+    "jours_ouvrables": "jours_ouvrables",
+    "jours_reserves": "jours_reserves",
+    "motif_demande": "motif_demande",
+    "date_demande": "date_demande",
+    "date_traitement": "date_traitement",
+    "motif_rejet": "motif_rejet",
+    "commentaire_approbateur": "commentaire_approbateur",
+    "version": "version",
+    **_personne("employe"),
+    **_personne("approbateur"),
+    **_personne("remplacant"),
+}, defaut=["id", "statut", "type", "date_debut", "date_fin", "jours_ouvrables", "date_demande", "employe.id",
+           "employe.nom"])
+
+NOTIFICATIONS = Ressource({
+    "id": "id",
+    "demande": "demande_id",
+    "type": "type_notification",
+    "titre": "titre",
+    "message": "message",
+    "lu": "lu",
+    "date_creation": "date_creation",
+    "date_lecture": "date_lecture",
+    "demande.statut": "demande__statut",
+    "demande.date_debut": "demande__date_debut",
+    "demande.date_fin": "demande__date_fin",
+}, defaut=["id", "demande", "type", "titre", "lu", "date_creation"])
+
+ARCHIVES = Ressource({
+    "id": "id",
+    "statut": "statut",
+    "priorite": "priorite",
+    "type": "type_conge__nom",
+    "date_debut": "date_debut",
+    "date_fin": "date_fin",
+    "jours_ouvrables": "jours_ouvrables",
+    "motif_demande": "motif_demande",
+    "date_demande": "date_demande",
+    "date_traitement": "date_traitement",
+    "motif_rejet": "motif_rejet",
+    "commentaire_approbateur": "commentaire_approbateur",
+    "circuit": "circuit",
+    "historique": "historique",
+    "date_archivage": "date_archivage",
+    **_personne("employe"),
+    **_personne("approbateur"),
+    **_personne("remplacant"),
+}, defaut=["id", "statut", "type", "date_debut", "date_fin", "jours_ouvrables", "date_demande", "employe.id",
+           "employe.nom"])
+
+SOLDES = Ressource({
+    "id": "id",
+    "annee": "annee",
+    "jours_droits": "jours_droits",
+    "jours_pris": "jours_pris",
+    "jours_reserves": "jours_reserves",
+    "jours_reportes": "jours_reportes",
+    "jours_disponibles": "jours_disponibles",
+    "date_cloture": "date_cloture",
+    **_personne("employe"),
+}, defaut=["annee", "jours_droits", "jours_pris", "jours_reserves", "jours_disponibles", "employe.id"])
+
+
+# -------------------------------
+# Pagination par curseur
+# -------------------------------
+def encoder_curseur(dernier_id):
+    return base64.urlsafe_b64encode(str(dernier_id).encode()).decode().rstrip("=")
+
+
+def decoder_curseur(curseur):
+    try:
+        return int(base64.urlsafe_b64decode(curseur + "=" * (-len(curseur) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ErreurAPI("Curseur invalide")
+
+
+def _entier(request, nom, defaut, maximum=None):
+    valeur = request.GET.get(nom)
+    if not valeur:
+        return defaut
+    if not valeur.isdigit() or int(valeur) < 1:
+        raise ErreurAPI(f"Paramètre {nom} invalide")
+    return min(int(valeur), maximum) if maximum else int(valeur)
+
+
+def page(request, ressource, queryset, en_tete=()):
+    """Page de résultats par id décroissant : une seule requête.
+
+    `en_tete` : lignes non enregistrées (colonnes de values()), placées en
+    tête de la première page.
+    """
+    noms = ressource.choisir(request.GET.get("champs"))
+    limite = _entier(request, "limite", LIMITE_DEFAUT, LIMITE_MAX)
+    curseur = request.GET.get("curseur")
+    if curseur:
+        queryset = queryset.filter(pk__lt=decoder_curseur(curseur))
+        en_tete = ()
+    en_tete = list(en_tete)[:limite]
+    limite -= len(en_tete)
+    lignes, objet = ressource.lire(queryset.order_by("-pk"), noms)
+    # Une ligne de plus que la page indique s'il reste des résultats
+    lignes = list(lignes[:limite + 1])
+    suivant = None
+    if len(lignes) > limite:
+        # Page remplie par l'en-tête : la suivante reprend à la première ligne
+        suivant = encoder_curseur(lignes[limite - 1]["id"] if limite else lignes[0]["id"] + 1)
+    return reponse_json({"resultats": [objet(ligne) for ligne in en_tete + lignes[:limite]], "suivant": suivant})
+
+
+# -------------------------------
+# Vues
+# -------------------------------
+@vue_api
+def demandes(request):
+    """Mêmes filtres et même portée que liste_demandes ; un employé ne voit que ses demandes"""
+    portee = DemandeConge.objects.visible_to(request.user)
+    filtres = QueryDict(mutable=True)
+    for nom in ("statut", "type_conge", "employe", "date_debut", "date_fin"):
+        if nom in request.GET:
+            filtres[nom] = request.GET[nom]
+    if filtres:
+        form_filtre = FiltreDemandesForm(filtres, user=request.user)
+        if not form_filtre.is_valid():
+            raise ErreurAPI(form_filtre.errors.as_json())
+        portee = form_filtre.filtrer(portee)
+    return page(request, DEMANDES, portee)
+
+
+@vue_api
+def demande(request, demande_id):
+    portee = DemandeConge.objects.visible_to(request.user).filter(pk=demande_id)
+    lignes, objet = DEMANDES.lire(portee, DEMANDES.choisir(request.GET.get("champs")))
+    ligne = lignes.first()
+    if ligne is None:
+        raise ErreurAPI("Demande introuvable", status=404)
+    return reponse_json(objet(ligne))
+
+
+@vue_api
+def notifications(request):
+    portee = NotificationConge.objects.filter(destinataire=request.user)
+    if request.GET.get("lu") in ("0", "1"):
+        portee = portee.filter(lu=request.GET["lu"] == "1")
+    return page(request, NOTIFICATIONS, portee)
+
+
+@vue_api
+def soldes(request):
+    """Soldes de l'utilisateur, ou d'un employé de sa portée (?employe=).
+
+    Sans ligne enregistrée pour l'année demandée (l'année en cours par
+    défaut), le solde est calculé depuis ses demandes, comme pour le
+    formulaire de demande (conges.soldes.solde_annuel), et renvoyé sans id.
+    """
+    employe_id = _entier(request, "employe", request.user.pk)
+    visibles = portee_utilisateur(request.user)
+    if visibles != TOUT and employe_id not in visibles:
+        raise ErreurAPI("Accès refusé", status=403)
+    portee = SoldeConge.objects.filter(employe_id=employe_id).annotate(
+        jours_disponibles=F("jours_droits") - F("jours_pris") - F("jours_reserves"))
+    annee = _entier(request, "annee", date.today().year)
+    if request.GET.get("annee"):
+        portee = portee.filter(annee=annee)
+    en_tete = []
+    if not request.GET.get("curseur") and not portee.filter(annee=annee).exists():
+        employe = request.user if employe_id == request.user.pk else User.objects.filter(pk=employe_id).first()
+        if employe is not None:
+            en_tete.append(_solde_calcule(employe, annee))
+    return page(request, SOLDES, portee, en_tete)
+
+
+def _solde_calcule(employe, annee):
+    """Colonnes de SOLDES pour le solde non enregistré de l'employé"""
+    solde = soldes_initiaux([employe], annee)[employe.pk]
+    return {
+        "id": None, "annee": annee, "jours_droits": solde.jours_droits, "jours_pris": solde.jours_pris,
+        "jours_reserves": solde.jours_reserves, "jours_reportes": solde.jours_reportes,
+        "jours_disponibles": solde.jours_disponibles, "date_cloture": None, "employe_id": employe.pk,
+        "employe__username": employe.username, "employe__first_name": employe.first_name,
+        "employe__last_name": employe.last_name,
+    }
+
+
+@vue_api
+def archives(request):
+    """Demandes archivées de la portée de l'utilisateur, par employé (?employe=) et année de début (?annee=)"""
+    portee = DemandeArchivee.objects.visible_to(request.user)
+    if request.GET.get("employe"):
+        portee = portee.filter(employe_id=_entier(request, "employe", None))
+    if request.GET.get("annee"):
+        portee = portee.filter(date_debut__year=_entier(request, "annee", None))
+    return page(request, ARCHIVES, portee)
+
+
+@vue_api
+def archive(request, demande_id):
+    """Demande archivée, avec son historique et les notifications reçues par l'utilisateur"""
+    portee = DemandeArchivee.objects.visible_to(request.user).filter(pk=demande_id)
+    noms = ARCHIVES.choisir(request.GET.get("champs") or ",".join([*ARCHIVES.defaut, "historique"]))
+    lignes, objet = ARCHIVES.lire(portee, noms, colonnes_internes=["notifications"])
+    ligne = lignes.first()
+    if ligne is None:
+        raise ErreurAPI("Demande archivée introuvable", status=404)
+    return reponse_json({**objet(ligne), "notifications": [
+        notification for notification in ligne["notifications"] if notification["destinataire_id"] == request.user.pk
+    ]})
+
+
+def _periode(valeur):
+    """« AAAA-MM-JJ,AAAA-MM-JJ,type_conge_id » → (date_debut, date_fin, type_conge_id)"""
+    try:
+        debut, fin, type_id = valeur.split(",")
+        return date.fromisoformat(debut), date.fromisoformat(fin), int(type_id)
+    except ValueError:
+        raise ErreurAPI(f"Période invalide : {valeur} (attendu : date_debut,date_fin,type_conge)")
+
+
+@vue_api
+def simulation(request):
+    """Jours ouvrables, solde projeté et conflits de périodes candidates
+    (?periode=…&periode=…), pour l'utilisateur ; rien n'est enregistré"""
+    periodes = request.GET.getlist("periode")
+    if not periodes:
+        raise ErreurAPI("Au moins une période est requise")
+    if len(periodes) > PERIODES_MAX:
+        raise ErreurAPI(f"Au plus {PERIODES_MAX} périodes par simulation")
+    resultats = simuler(request.user, [_periode(valeur) for valeur in periodes],
+                        urgent=request.GET.get("urgent") == "1")
+    return reponse_json({"resultats": resultats})
+
+
+def _date(request, nom):
+    try:
+        return date.fromisoformat(request.GET.get(nom, ""))
+    except ValueError:
+        raise ErreurAPI(f"Paramètre {nom} invalide (attendu : AAAA-MM-JJ)")
+
+
+@vue_api
+def remplacants(request):
+    """Collègues disponibles pour remplacer l'utilisateur du ?date_debut= au
+    ?date_fin=, les plus proches et les moins sollicités d'abord"""
+    date_debut, date_fin = _date(request, "date_debut"), _date(request, "date_fin")
+    if date_fin < date_debut:
+        raise ErreurAPI("La date de fin doit être postérieure à la date de début")
+    limite = _entier(request, "limite", SUGGESTIONS_DEFAUT, SUGGESTIONS_MAX)
+    candidats = suggerer_remplacants(request.user, date_debut, date_fin, limite).values(
+        "id", "username", "first_name", "last_name", "proximite", "charge")
+    return reponse_json({"resultats": [
+        {"id": ligne["id"], "nom": _nom_complet(ligne["first_name"], ligne["last_name"], ligne["username"]),
+         "proximite": ligne["proximite"], "charge": ligne["charge"]}
+        for ligne in candidats
+    ]})
+
+
+@vue_api
+def organisation(request):
+    """Organigramme complet : une requête par niveau (directions, services, départements)"""
+    def responsable(prefixe, ligne):
+        if ligne[f"{prefixe}_id"] is None:
+            return None
+        return {"id": ligne[f"{prefixe}_id"],
+                "nom": _nom_complet(ligne[f"{prefixe}__first_name"], ligne[f"{prefixe}__last_name"],
+                                    ligne[f"{prefixe}__username"])}
+
+    def colonnes(prefixe):
+        return (f"{prefixe}_id", f"{prefixe}__first_name", f"{prefixe}__last_name", f"{prefixe}__username")
+
+    departements = {}
+    for ligne in Departement.objects.order_by("nom").values("id", "nom", "code", "service_id",
+                                                           *colonnes("chef_departement")):
+        departements.setdefault(ligne["service_id"], []).append({
+            "id": ligne["id"], "nom": ligne["nom"], "code": ligne["code"],
+            "chef": responsable("chef_departement", ligne),
+        })
+    services = {}
+    for ligne in Service.objects.order_by("nom").values("id", "nom", "code", "direction_id",
+                                                       *colonnes("chef_service")):
+        services.setdefault(ligne["direction_id"], []).append({
+            "id": ligne["id"], "nom": ligne["nom"], "code": ligne["code"],
+            "chef": responsable("chef_service", ligne),
+            "departements": departements.get(ligne["id"], []),
+        })
+    directions = [
+        {"id": ligne["id"], "nom": ligne["nom"], "code": ligne["code"],
+         "directeur": responsable("directeur", ligne), "services": services.get(ligne["id"], [])}
+        for ligne in Direction.objects.order_by("nom").values("id", "nom", "code", *colonnes("directeur"))
+    ]
+    return reponse_json({"directions": directions})
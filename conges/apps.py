@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CongesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'conges'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import travaux  # noqa: F401  (enregistre les tâches de la file)
@@ -0,0 +1,145 @@
+"""
+Archivage des demandes de congé clôturées.
+
+Les demandes approuvées, rejetées ou annulées dont la période s'est
+terminée avant une date limite quittent les tables courantes
+(DemandeConge, NotificationConge, HistoriqueConge) pour la table
+DemandeArchivee : une ligne par demande, qui garde son identifiant et
+recopie son historique et ses notifications en listes JSON. Les listes,
+les index et les soldes calculés sur les tables courantes ne portent plus
+ces années que personne ne consulte.
+
+Les demandes sont archivées par lots de clés primaires consécutives, chacun
+dans sa propre transaction : un archivage interrompu reprend aux demandes
+restantes. Un lot coûte un nombre fixe de requêtes.
+
+Les soldes restent justes : avant de déplacer les demandes de congé
+annuel d'une année, la ligne SoldeConge de l'employé pour cette année est
+créée si elle n'existe pas encore, calculée sur les demandes encore
+présentes (conges.soldes). Une fois archivée une demande de l'année, le
+solde de l'employé pour cette année ne se recalcule donc plus depuis les
+demandes. User.conges_consommes_annee() additionne demandes courantes et
+archivées.
+
+Les demandes archivées se lisent à la demande par l'API
+(/api/v1/archives/), dans la portée de l'utilisateur, et dans
+l'administration.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import invalider_utilisateurs
+from .models import (AffectationApprobation, DemandeArchivee, DemandeConge, HistoriqueConge, NotificationConge,
+                     SoldeConge, TypeConge, User)
+from .soldes import soldes_initiaux
+
+ANNEES_CONSERVEES = getattr(settings, "CONGES_ANNEES_CONSERVEES", 2)
+LIGNES_PAR_LOT = 1000
+
+STATUTS_CLOTURES = (DemandeConge.Statut.APPROUVE, DemandeConge.Statut.REJETE, DemandeConge.Statut.ANNULE)
+
+# Colonnes recopiées telles quelles de DemandeConge
+CHAMPS_DEMANDE = ("id", "employe_id", "type_conge_id", "date_debut", "date_fin", "motif_demande", "justificatif",
+                  "statut", "priorite", "date_demande", "jours_ouvrables", "circuit", "approbateur_id",
+                  "date_traitement", "motif_rejet", "commentaire_approbateur", "remplacant_id",
+                  "instructions_remplacement")
+CHAMPS_HISTORIQUE = ("utilisateur_id", "action", "ancien_statut", "nouveau_statut", "commentaire", "date_action")
+CHAMPS_NOTIFICATION = ("destinataire_id", "type_notification", "destinataire_type", "titre", "message", "lu",
+                       "date_creation", "date_lecture")
+
+
+def limite_par_defaut(aujourd_hui=None):
+    """1er janvier de l'année la plus ancienne conservée dans les tables courantes"""
+    return date((aujourd_hui or date.today()).year - ANNEES_CONSERVEES, 1, 1)
+
+
+def archivables(limite):
+    """Demandes clôturées dont la période s'est terminée avant `limite`"""
+    return DemandeConge.objects.filter(statut__in=STATUTS_CLOTURES, date_fin__lt=limite)
+
+
+def figer_soldes(demandes):
+    """Crée les lignes de solde manquantes des années de congé annuel de
+    `demandes` (lignes values() de DemandeConge), tant que ces demandes sont
+    encore dans les tables courantes. Une requête de plus par année manquante."""
+    paires = {(ligne["employe_id"], ligne["date_debut"].year) for ligne in demandes
+              if ligne["type_conge__nom"] == TypeConge.Type.ANNUEL}
+    if not paires:
+        return
+    existantes = set(SoldeConge.objects.filter(
+        employe_id__in={employe_id for employe_id, _ in paires}, annee__in={annee for _, annee in paires},
+    ).values_list("employe_id", "annee"))
+    manquantes = paires - existantes
+    if not manquantes:
+        return
+    employes = User.objects.only("id", "jours_conges_annuels").in_bulk({employe_id for employe_id, _ in manquantes})
+    par_annee = {}
+    for employe_id, annee in manquantes:
+        par_annee.setdefault(annee, []).append(employes[employe_id])
+    SoldeConge.objects.bulk_create([solde for annee, concernes in par_annee.items()
+                                    for solde in soldes_initiaux(concernes, annee).values()])
+
+
+def archiver_lot(ids):
+    """Archive les demandes clôturées parmi `ids`, en une transaction.
+
+    Retourne le nombre de demandes archivées.
+    """
+    with transaction.atomic():
+        demandes = list(DemandeConge.objects.filter(pk__in=ids, statut__in=STATUTS_CLOTURES).order_by()
+                        .values(*CHAMPS_DEMANDE, "type_conge__nom"))
+        if not demandes:
+            return 0
+        ids = [ligne["id"] for ligne in demandes]
+        for ligne in demandes:
+            ligne["justificatif"] = ligne["justificatif"] or ""  # NULL sans justificatif
+        figer_soldes(demandes)
+
+        historiques, notifications = {}, {}
+        for modele, champs, par_demande in ((HistoriqueConge, CHAMPS_HISTORIQUE, historiques),
+                                            (NotificationConge, CHAMPS_NOTIFICATION, notifications)):
+            for ligne in modele.objects.filter(demande_id__in=ids).order_by("pk").values("demande_id", *champs):
+                par_demande.setdefault(ligne.pop("demande_id"), []).append(ligne)
+        DemandeArchivee.objects.bulk_create([
+            DemandeArchivee(**{champ: ligne[champ] for champ in CHAMPS_DEMANDE},
+                            historique=historiques.get(ligne["id"], []),
+                            notifications=notifications.get(ligne["id"], []))
+            for ligne in demandes
+        ], batch_size=500)
+
+        # Sans récepteur de signal ni dépendant, delete() supprime en une requête
+        for modele in (HistoriqueConge, AffectationApprobation):
+            modele.objects.filter(demande_id__in=ids).delete()
+        # NotificationConge et DemandeConge ont des récepteurs post_delete :
+        # delete() chargerait chaque ligne pour les appeler un à un. On passe
+        # donc par _raw_delete (API privée, une requête par table), et les
+        # récepteurs sont volontairement sautés :
+        # - invalider_cache_notification / invalider_cache_demande : remplacés
+        #   par l'invalidation groupée ci-dessous ;
+        # - liberer_reservation : sans objet, les demandes archivées sont
+        #   clôturées et n'ont plus de jours réservés.
+        for portee in (NotificationConge.objects.filter(demande_id__in=ids), DemandeConge.objects.filter(pk__in=ids)):
+            portee._raw_delete(portee.db)
+
+        utilisateurs = {ligne["employe_id"] for ligne in demandes}
+        utilisateurs.update(notification["destinataire_id"]
+                            for liste in notifications.values() for notification in liste)
+        transaction.on_commit(lambda: invalider_utilisateurs(*utilisateurs))
+    return len(demandes)
+
+
+def archiver(limite=None, progression=None):
+    """Archive par lots les demandes clôturées avant `limite` (par défaut
+    limite_par_defaut()). Retourne le nombre de demandes archivées."""
+    demandes = archivables(limite or limite_par_defaut()).order_by("pk")
+    dernier, archivees = 0, 0
+    while True:
+        lot = list(demandes.filter(pk__gt=dernier).values_list("pk", flat=True)[:LIGNES_PAR_LOT])
+        if not lot:
+            return archivees
+        archivees += archiver_lot(lot)
+        dernier = lot[-1]
+        if progression:
+            progression(archivees)
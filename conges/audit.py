@@ -0,0 +1,122 @@
+"""
+Journal d'audit des demandes de congé (HistoriqueConge).
+
+Les changements de statut d'une DemandeConge enregistrés par save() sont
+captés par les signaux : le statut lu en base à l'instanciation est comparé
+au statut enregistré. Les entrées sont accumulées en mémoire pendant la
+transaction et insérées par un seul bulk_create à sa validation ; une
+transaction annulée n'écrit rien. Hors transaction, l'entrée est insérée
+immédiatement.
+
+Les écritures qui ne passent pas par save() (QuerySet.update) doivent
+appeler journaliser() elles-mêmes.
+"""
+import threading
+import weakref
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import DemandeConge, HistoriqueConge
+
+
+class Action:
+    CREATION = "CREATION"
+    APPROBATION = "APPROBATION"
+    # Étape intermédiaire d'un circuit d'approbation (conges.circuits)
+    APPROBATION_ETAPE = "APPROBATION_ETAPE"
+    REJET = "REJET"
+    ANNULATION = "ANNULATION"
+    REMISE_EN_ATTENTE = "REMISE_EN_ATTENTE"
+
+
+ACTIONS_PAR_STATUT = {
+    DemandeConge.Statut.EN_ATTENTE: Action.REMISE_EN_ATTENTE,
+    DemandeConge.Statut.APPROUVE: Action.APPROBATION,
+    DemandeConge.Statut.REJETE: Action.REJET,
+    DemandeConge.Statut.ANNULE: Action.ANNULATION,
+}
+
+# Tampons en attente, par thread : (alias, points de sauvegarde) -> entrées
+_local = threading.local()
+
+
+def memoriser_statut(demande):
+    # Statut différé (only/defer) : inconnu, la transition suivante ne sera pas comparée
+    demande._statut_origine = demande.__dict__.get("statut")
+
+
+def enregistrer_transition(demande, created, using=DEFAULT_DB_ALIAS):
+    ancien_statut = None if created else demande._statut_origine
+    nouveau_statut = demande.__dict__.get("statut")
+    memoriser_statut(demande)
+    if nouveau_statut is None or ancien_statut == nouveau_statut or (ancien_statut is None and not created):
+        return
+    if created:
+        action, acteur_id, commentaire = Action.CREATION, demande.employe_id, ""
+    else:
+        action = ACTIONS_PAR_STATUT[nouveau_statut]
+        traitee = nouveau_statut in (DemandeConge.Statut.APPROUVE, DemandeConge.Statut.REJETE)
+        commentaire = demande.motif_rejet if nouveau_statut == DemandeConge.Statut.REJETE \
+            else demande.commentaire_approbateur
+        # Approbation et rejet par l'approbateur, annulation par l'employé
+        acteur_id = (demande.approbateur_id if traitee else None) or demande.employe_id
+    # Les appelants peuvent désigner l'auteur explicitement (demande.acteur_audit = user)
+    acteur = getattr(demande, "acteur_audit", None)
+    journaliser(demande.pk, acteur.pk if acteur else acteur_id, action, ancien_statut or "",
+                nouveau_statut, commentaire, using=using)
+
+
+def journaliser(demande_id, utilisateur_id, action, ancien_statut="", nouveau_statut="", commentaire="",
+                using=DEFAULT_DB_ALIAS):
+    """Ajoute une entrée au journal, écrite à la validation de la transaction courante"""
+    entree = HistoriqueConge(demande_id=demande_id, utilisateur_id=utilisateur_id, action=action,
+                             ancien_statut=ancien_statut, nouveau_statut=nouveau_statut,
+                             commentaire=commentaire or "")
+    connexion = transaction.get_connection(using)
+    if not connexion.in_atomic_block:
+        HistoriqueConge.objects.using(using).bulk_create([entree])
+        return
+
+    tampons = _local.__dict__.setdefault("tampons", {})
+    # Un tampon par niveau de point de sauvegarde : l'annulation d'un point de
+    # sauvegarde retire son callback, et avec lui les entrées qu'il contenait.
+    cle = (using, tuple(connexion.savepoint_ids))
+    tampon = tampons.get(cle)
+    if tampon is None or not tampon.en_attente:
+        for autre_cle, autre in list(tampons.items()):
+            if not autre.en_attente:
+                del tampons[autre_cle]  # transaction annulée
+        tampon = tampons[cle] = _Tampon(cle, using)
+    tampon.entrees.append(entree)
+
+
+class _Tampon:
+    """Entrées d'un niveau de point de sauvegarde, écrites par un callback on_commit.
+
+    Le tampon ne garde qu'une référence faible vers son callback : tant que
+    Django le conserve, l'écriture est planifiée. L'annulation de la
+    transaction ou du point de sauvegarde abandonne le callback, aussitôt
+    libéré ; le tampon n'est alors plus en attente.
+    """
+
+    def __init__(self, cle, using):
+        self.cle = cle
+        self.entrees = []
+        self.ecrit = False
+        vidage = partial(_vider, self, using)
+        self._vidage = weakref.ref(vidage)
+        transaction.on_commit(vidage, using=using)
+
+    @property
+    def en_attente(self):
+        return not self.ecrit and self._vidage() is not None
+
+
+def _vider(tampon, using):
+    tampon.ecrit = True
+    tampons = getattr(_local, "tampons", {})
+    if tampons.get(tampon.cle) is tampon:
+        del tampons[tampon.cle]
+    if tampon.entrees:
+        HistoriqueConge.objects.using(using).bulk_create(tampon.entrees)
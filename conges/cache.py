@@ -0,0 +1,50 @@
+"""
+Cache par utilisateur des fragments du tableau de bord.
+
+Chaque utilisateur a un compteur de génération, incrémenté (via les signaux)
+à chaque écriture sur ses demandes ou ses notifications. Les fragments sont
+mis en cache sous une clé qui contient cette génération : une écriture rend
+immédiatement obsolètes les anciens fragments, sans suppression explicite.
+
+Les écritures qui ne passent pas par save()/delete() (QuerySet.update,
+bulk_create) doivent appeler invalider_utilisateurs() elles-mêmes.
+
+Les générations sont aussi incrémentées par les workers de tâches et les
+commandes : le cache doit être partagé par tous les processus (CACHES).
+"""
+import time
+
+from django.core.cache import cache
+
+
+# Durée de vie d'un fragment ; la validité est assurée par la génération
+DUREE_FRAGMENTS = 24 * 3600
+
+
+def _cle_generation(user_id):
+    return f"conges:generation:{user_id}"
+
+
+def cle_fragment(nom, user_id, generation):
+    return f"conges:fragment:{nom}:{user_id}:{generation}"
+
+
+def generation(user_id):
+    cle = _cle_generation(user_id)
+    valeur = cache.get(cle)
+    if valeur is None:
+        # Valeur initiale horodatée : une génération évincée du cache ne peut
+        # pas repartir sur un numéro déjà utilisé par des fragments périmés.
+        cache.add(cle, time.time_ns(), None)
+        valeur = cache.get(cle)
+    return valeur
+
+
+def invalider_utilisateurs(*user_ids):
+    for user_id in set(user_ids):
+        if user_id is None:
+            continue
+        try:
+            cache.incr(_cle_generation(user_id))
+        except ValueError:
+            cache.set(_cle_generation(user_id), time.time_ns(), None)
@@ -0,0 +1,236 @@
+"""
+Calendriers des jours fériés, par site.
+
+Chaque direction peut avoir son calendrier (CalendrierFeries) ; les
+directions sans calendrier, et les employés sans direction, suivent le
+calendrier par défaut. Les jours non travaillés d'un calendrier sont les
+jours fériés légaux de son pays (paquet holidays) plus les jours saisis
+pour lui (JourFerie : fermetures de l'entreprise, fériés locaux).
+
+L'ensemble des calendriers est lu en deux requêtes et gardé en mémoire
+par processus (ainsi que dans le cache partagé), sous la forme d'un
+frozenset de dates par calendrier et par année : le calcul des jours
+ouvrables ne fait ensuite ni requête ni appel à holidays. Le tout est
+versionné par une génération, incrémentée (via les signaux) à chaque
+modification d'un calendrier, d'un jour férié ou du calendrier d'une
+direction. Les écritures qui ne passent pas par save()/delete()
+(QuerySet.update, bulk_create) doivent appeler invalider_calendriers()
+elles-mêmes.
+
+Les jours ouvrables de chaque demande sont enregistrés dans
+DemandeConge.jours_ouvrables. Une modification de calendrier met en file
+(conges.taches) leur recalcul pour les demandes concernées ; la commande
+calculer_jours_ouvrables recalcule toutes les demandes existantes. Le
+recalcul met à jour dans la même transaction les réservations des demandes
+en attente et les soldes concernés (conges.soldes), et incrémente la
+génération des jours ouvrables, qui entre dans les validateurs HTTP de la
+liste des demandes.
+"""
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+# Calendrier appliqué s'il n'existe aucun calendrier par défaut en base
+PAYS_DEFAUT = "BI"
+DUREE_CALENDRIERS = 24 * 3600
+LIGNES_PAR_LOT = 2000
+
+_CLE_GENERATION = "conges:generation:calendriers"
+_CLE_GENERATION_JOURS = "conges:generation:jours_ouvrables"
+
+
+def _generation(cle):
+    valeur = cache.get(cle)
+    if valeur is None:
+        cache.add(cle, time.time_ns(), None)
+        valeur = cache.get(cle)
+    return valeur
+
+
+def _incrementer(cle):
+    try:
+        cache.incr(cle)
+    except ValueError:
+        cache.set(cle, time.time_ns(), None)
+
+
+def generation_calendriers():
+    return _generation(_CLE_GENERATION)
+
+
+def invalider_calendriers():
+    _incrementer(_CLE_GENERATION)
+
+
+def generation_jours_ouvrables():
+    """Change à chaque recalcul qui modifie des jours ouvrables enregistrés"""
+    return _generation(_CLE_GENERATION_JOURS)
+
+
+@lru_cache(maxsize=64)
+def feries_legaux(pays, annee):
+    """Jours fériés légaux d'un pays pour une année.
+
+    Le paquet holidays est lourd à importer : il n'est chargé qu'au premier
+    calcul de jours ouvrables, pas au démarrage de chaque processus.
+    """
+    if not pays:
+        return frozenset()
+    import holidays
+
+    return frozenset(holidays.country_holidays(pays, years=annee))
+
+
+class Calendrier:
+    """Jours non travaillés d'un calendrier, en mémoire"""
+
+    def __init__(self, pays, jours=()):
+        self.pays = pays
+        self._saisis = {}
+        for jour in jours:
+            self._saisis.setdefault(jour.year, set()).add(jour)
+        self._feries = {}
+
+    def feries(self, annee):
+        """Jours non travaillés de l'année (frozenset de dates)"""
+        feries = self._feries.get(annee)
+        if feries is None:
+            feries = self._feries[annee] = feries_legaux(self.pays, annee) | self._saisis.get(annee, frozenset())
+        return feries
+
+    def est_ouvrable(self, jour):
+        return jour.weekday() < 5 and jour not in self.feries(jour.year)
+
+    def jours_ouvrables(self, date_debut, date_fin):
+        """Jours du lundi au vendredi de la période (bornes incluses), fériés exclus"""
+        if date_fin < date_debut:
+            return 0
+        semaines, reste = divmod((date_fin - date_debut).days + 1, 7)
+        jours = semaines * 5 + sum(1 for decalage in range(reste)
+                                   if (date_debut + timedelta(days=decalage)).weekday() < 5)
+        for annee in range(date_debut.year, date_fin.year + 1):
+            jours -= sum(1 for jour in self.feries(annee) if date_debut <= jour <= date_fin and jour.weekday() < 5)
+        return jours
+
+
+class Calendriers:
+    """Tous les calendriers et leur attribution aux directions"""
+
+    def __init__(self, calendriers, par_direction, defaut):
+        self.calendriers = calendriers
+        self.par_direction = par_direction
+        self.defaut = defaut
+
+    def de_direction(self, direction_id):
+        return self.calendriers[self.par_direction.get(direction_id, self.defaut)]
+
+
+def charger():
+    """Calendriers lus en base : deux requêtes"""
+    from .models import CalendrierFeries, JourFerie
+
+    pays, par_direction, defaut = {None: PAYS_DEFAUT}, {}, None
+    for ligne in CalendrierFeries.objects.values("id", "pays", "par_defaut", "directions__id"):
+        pays[ligne["id"]] = ligne["pays"]
+        if ligne["par_defaut"]:
+            defaut = ligne["id"]
+        if ligne["directions__id"] is not None:
+            par_direction[ligne["directions__id"]] = ligne["id"]
+    jours = {}
+    for calendrier_id, jour in JourFerie.objects.order_by().values_list("calendrier_id", "date"):
+        jours.setdefault(calendrier_id, []).append(jour)
+    return Calendriers({calendrier_id: Calendrier(code, jours.get(calendrier_id, ()))
+                        for calendrier_id, code in pays.items()}, par_direction, defaut)
+
+
+# Calendriers de la génération courante, dans ce processus : (génération, Calendriers)
+_memoire = {}
+
+
+def calendriers():
+    """Calendriers de la génération courante : mémoire du processus, cache partagé, puis base"""
+    generation = generation_calendriers()
+    memoire = _memoire.get("calendriers")
+    if memoire and memoire[0] == generation:
+        return memoire[1]
+
+    cle = f"conges:calendriers:{generation}"
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = charger()
+        cache.set(cle, valeur, DUREE_CALENDRIERS)
+    _memoire["calendriers"] = (generation, valeur)
+    return valeur
+
+
+def calendrier_employe(user):
+    return calendriers().de_direction(user.direction_id)
+
+
+# -------------------------------
+# Jours ouvrables enregistrés sur les demandes
+# -------------------------------
+def demandes_concernees(calendrier_id=None, direction_id=None, employe_id=None):
+    """Demandes dont les jours ouvrables dépendent du calendrier, de la
+    direction ou de l'employé donné ; toutes les demandes sans argument."""
+    from .models import CalendrierFeries, DemandeConge
+
+    demandes = DemandeConge.objects.all()
+    if employe_id is not None:
+        return demandes.filter(employe_id=employe_id)
+    if direction_id is not None:
+        return demandes.filter(employe__direction_id=direction_id)
+    if calendrier_id is not None:
+        filtre = Q(employe__direction__calendrier_id=calendrier_id)
+        if CalendrierFeries.objects.filter(pk=calendrier_id, par_defaut=True).exists():
+            filtre |= Q(employe__direction__isnull=True) | Q(employe__direction__calendrier__isnull=True)
+        return demandes.filter(filtre)
+    return demandes
+
+
+def recalculer_jours_ouvrables(demandes=None, progression=None):
+    """Recalcule DemandeConge.jours_ouvrables par lots (parcours de la clé
+    primaire) ; seules les lignes dont la valeur change sont écrites, avec
+    la réservation des demandes en attente et les soldes de congé annuel
+    concernés. Retourne le nombre de demandes modifiées."""
+    from .cache import invalider_utilisateurs
+    from .models import DemandeConge, TypeConge
+    from .soldes import reconcilier_soldes
+
+    Statut = DemandeConge.Statut
+    # Relus en base : l'invalidation du cache n'a peut-être pas encore eu lieu
+    courants = charger()
+    demandes = (demandes if demandes is not None else DemandeConge.objects.all()).order_by("pk").values_list(
+        "pk", "employe_id", "employe__direction_id", "date_debut", "date_fin", "jours_ouvrables", "statut",
+        "jours_reserves", "type_conge__nom")
+    dernier, lues, modifiees = 0, 0, 0
+    while True:
+        lot = list(demandes.filter(pk__gt=dernier)[:LIGNES_PAR_LOT])
+        if not lot:
+            return modifiees
+        a_modifier, employes, soldes = [], set(), set()
+        for pk, employe_id, direction_id, debut, fin, enregistres, statut, reserves, type_nom in lot:
+            jours = courants.de_direction(direction_id).jours_ouvrables(debut, fin)
+            if jours != enregistres:
+                # Une réservation en cours suit les jours de la demande
+                if statut == Statut.EN_ATTENTE and reserves:
+                    reserves = jours
+                a_modifier.append(DemandeConge(pk=pk, jours_ouvrables=jours, jours_reserves=reserves))
+                employes.add(employe_id)
+                if type_nom == TypeConge.Type.ANNUEL and statut in (Statut.APPROUVE, Statut.EN_ATTENTE):
+                    soldes.add((employe_id, debut.year))
+        if a_modifier:
+            with transaction.atomic():
+                DemandeConge.objects.bulk_update(a_modifier, ["jours_ouvrables", "jours_reserves"], batch_size=500)
+                reconcilier_soldes(soldes)
+                # bulk_update ne déclenche pas les signaux : fragments du tableau
+                # de bord, soldes en cache et validateurs de la liste des demandes
+                transaction.on_commit(lambda employes=employes: invalider_utilisateurs(*employes))
+                transaction.on_commit(lambda: _incrementer(_CLE_GENERATION_JOURS))
+        dernier, lues, modifiees = lot[-1][0], lues + len(lot), modifiees + len(a_modifier)
+        if progression:
+            progression(lues, modifiees)
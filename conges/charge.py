@@ -0,0 +1,336 @@
+"""
+Générateur de charge pour l'application WSGI (projconj.wsgi.application).
+
+Des utilisateurs virtuels rejouent en parallèle le parcours employé
+(connexion → tableau de bord → création de demande) ou le parcours manager
+(liste des demandes → traitement), soit directement sur l'application
+WSGI dans le processus, soit à travers un serveur HTTP local.
+
+Le parcours « api » (managers et RH) parcourt les demandes page par page
+par l'API JSON, puis lit notifications, soldes et organigramme.
+"""
+import http.client
+import io
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+
+
+def ouvrir_session(user):
+    """Crée directement une session authentifiée et retourne sa clé (pas de hachage de mot de passe)"""
+    session = SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return session.session_key
+
+
+class ReponseCharge:
+    def __init__(self, statut, entetes, contenu):
+        self.statut = statut
+        self.entetes = entetes
+        self.contenu = contenu
+
+    @property
+    def texte(self):
+        return self.contenu.decode("utf-8", errors="replace")
+
+
+class ClientBase:
+    """Client minimal avec gestion des cookies (session, CSRF)"""
+
+    def __init__(self):
+        self.cookies = {}
+
+    def _entete_cookies(self):
+        return "; ".join(f"{nom}={valeur}" for nom, valeur in self.cookies.items())
+
+    def _lire_cookies(self, entetes):
+        for nom, valeur in entetes:
+            if nom.lower() == "set-cookie":
+                cookie = SimpleCookie()
+                cookie.load(valeur)
+                for morceau in cookie.values():
+                    self.cookies[morceau.key] = morceau.value
+
+    def get(self, chemin):
+        return self.requete("GET", chemin)
+
+    def post(self, chemin, donnees):
+        donnees = dict(donnees)
+        if "csrftoken" in self.cookies:
+            donnees.setdefault("csrfmiddlewaretoken", self.cookies["csrftoken"])
+        return self.requete("POST", chemin, urlencode(donnees).encode())
+
+    def requete(self, methode, chemin, corps=b""):
+        raise NotImplementedError
+
+
+class ClientWSGI(ClientBase):
+    """Appelle directement l'application WSGI, sans passer par le réseau"""
+
+    def __init__(self, application, hote="localhost"):
+        super().__init__()
+        self.application = application
+        self.hote = hote
+
+    def requete(self, methode, chemin, corps=b""):
+        chemin, _, query = chemin.partition("?")
+        environ = {
+            "REQUEST_METHOD": methode,
+            "PATH_INFO": chemin,
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.hote,
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": self.hote,
+            "HTTP_COOKIE": self._entete_cookies(),
+            "CONTENT_TYPE": "application/x-www-form-urlencoded",
+            "CONTENT_LENGTH": str(len(corps)),
+            "wsgi.input": io.BytesIO(corps),
+            "wsgi.errors": io.StringIO(),
+            "wsgi.url_scheme": "http",
+            "wsgi.version": (1, 0),
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        resultat = {}
+
+        def start_response(statut, entetes, exc_info=None):
+            resultat["statut"] = int(statut.split()[0])
+            resultat["entetes"] = entetes
+
+        iterable = self.application(environ, start_response)
+        try:
+            contenu = b"".join(iterable)
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+        self._lire_cookies(resultat["entetes"])
+        return ReponseCharge(resultat["statut"], resultat["entetes"], contenu)
+
+
+class ClientHTTP(ClientBase):
+    """Passe par un vrai serveur HTTP (une connexion keep-alive par utilisateur)"""
+
+    def __init__(self, url):
+        super().__init__()
+        morceaux = urlsplit(url)
+        self.connexion = http.client.HTTPConnection(morceaux.hostname, morceaux.port or 80, timeout=30)
+
+    def requete(self, methode, chemin, corps=b""):
+        entetes = {"Cookie": self._entete_cookies()}
+        if methode == "POST":
+            entetes["Content-Type"] = "application/x-www-form-urlencoded"
+        self.connexion.request(methode, chemin, body=corps or None, headers=entetes)
+        reponse = self.connexion.getresponse()
+        contenu = reponse.read()
+        self._lire_cookies(reponse.getheaders())
+        return ReponseCharge(reponse.status, reponse.getheaders(), contenu)
+
+
+class Statistiques:
+    """Latences (en secondes) par étape, partagées entre les utilisateurs virtuels"""
+
+    # Bornes supérieures des classes de l'histogramme, en millisecondes
+    CLASSES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.latences = defaultdict(list)
+        self.erreurs = defaultdict(int)
+        self.debut = time.perf_counter()
+        self.fin = None
+
+    def enregistrer(self, etape, duree, succes):
+        with self._verrou:
+            self.latences[etape].append(duree)
+            if not succes:
+                self.erreurs[etape] += 1
+
+    @staticmethod
+    def percentile(valeurs, p):
+        if not valeurs:
+            return 0.0
+        valeurs = sorted(valeurs)
+        index = min(len(valeurs) - 1, max(0, round(p / 100 * len(valeurs)) - 1))
+        return valeurs[index]
+
+    def resume(self):
+        duree = (self.fin or time.perf_counter()) - self.debut
+        lignes = {}
+        toutes = []
+        for etape, valeurs in sorted(self.latences.items()):
+            toutes.extend(valeurs)
+            lignes[etape] = self._ligne(valeurs, self.erreurs[etape], duree)
+        lignes["TOTAL"] = self._ligne(toutes, sum(self.erreurs.values()), duree)
+        return {"duree_s": duree, "etapes": lignes, "histogramme": self.histogramme(toutes)}
+
+    def _ligne(self, valeurs, erreurs, duree):
+        return {
+            "requetes": len(valeurs),
+            "erreurs": erreurs,
+            "req_par_s": len(valeurs) / duree if duree else 0.0,
+            "p50_ms": self.percentile(valeurs, 50) * 1000,
+            "p95_ms": self.percentile(valeurs, 95) * 1000,
+            "p99_ms": self.percentile(valeurs, 99) * 1000,
+            "max_ms": max(valeurs, default=0.0) * 1000,
+        }
+
+    def histogramme(self, valeurs):
+        comptes = [0] * (len(self.CLASSES_MS) + 1)
+        for valeur in valeurs:
+            ms = valeur * 1000
+            for i, borne in enumerate(self.CLASSES_MS):
+                if ms <= borne:
+                    comptes[i] += 1
+                    break
+            else:
+                comptes[-1] += 1
+        libelles = [f"<= {borne} ms" for borne in self.CLASSES_MS] + [f"> {self.CLASSES_MS[-1]} ms"]
+        return list(zip(libelles, comptes))
+
+    def rapport(self):
+        resume = self.resume()
+        lignes = [
+            f"Durée : {resume['duree_s']:.1f} s",
+            "",
+            f"{'Étape':<28}{'Requêtes':>9}{'Erreurs':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}{'max ms':>9}",
+        ]
+        for etape, l in resume["etapes"].items():
+            lignes.append(
+                f"{etape:<28}{l['requetes']:>9}{l['erreurs']:>9}{l['req_par_s']:>9.1f}{l['p50_ms']:>9.1f}"
+                f"{l['p95_ms']:>9.1f}{l['p99_ms']:>9.1f}{l['max_ms']:>9.1f}"
+            )
+        lignes += ["", "Histogramme des latences :"]
+        total = max(1, sum(nb for _, nb in resume["histogramme"]))
+        for libelle, nb in resume["histogramme"]:
+            lignes.append(f"{libelle:>12} | {'#' * round(50 * nb / total):<50} {nb}")
+        return "\n".join(lignes)
+
+
+class UtilisateurVirtuel(threading.Thread):
+    """Rejoue un parcours en boucle jusqu'à l'échéance ou au nombre d'itérations"""
+
+    # Pages de demandes lues par le parcours « api »
+    PAGES_API = 5
+
+    def __init__(self, numero, client, parcours, username, mot_de_passe, type_conge_id,
+                 stats, echeance, iterations):
+        super().__init__(name=f"utilisateur-virtuel-{numero}", daemon=True)
+        self.numero = numero
+        self.type_conge_id = type_conge_id
+        self.client = client
+        self.parcours = parcours
+        self.username = username
+        self.mot_de_passe = mot_de_passe
+        self.stats = stats
+        self.echeance = echeance
+        self.iterations = iterations
+        self.compteur = 0
+
+    def etape(self, nom, methode, chemin, donnees=None, statuts_attendus=(200, 302)):
+        debut = time.perf_counter()
+        try:
+            if methode == "POST":
+                reponse = self.client.post(chemin, donnees or {})
+            else:
+                reponse = self.client.get(chemin)
+            succes = reponse.statut in statuts_attendus
+        except Exception:
+            reponse, succes = None, False
+        self.stats.enregistrer(nom, time.perf_counter() - debut, succes)
+        return reponse
+
+    def connexion(self):
+        self.etape("connexion (GET)", "GET", "/accounts/login/")
+        self.etape("connexion (POST)", "POST", "/accounts/login/",
+                   {"username": self.username, "password": self.mot_de_passe}, statuts_attendus=(302,))
+
+    def parcours_employe(self):
+        self.connexion()
+        self.etape("dashboard", "GET", "/")
+        self.etape("creer_demande_conge (GET)", "GET", "/demandes/nouvelle/")
+        debut = date.today() + timedelta(days=30 + (self.numero * 31 + self.compteur * 7) % 300)
+        self.etape("creer_demande_conge (POST)", "POST", "/demandes/nouvelle/", {
+            "type_conge": self.type_conge_id,
+            "date_debut": debut.isoformat(),
+            "date_fin": debut.isoformat(),
+            "motif_demande": "Test de charge",
+            "priorite": "NORMALE",
+        }, statuts_attendus=(302,))
+
+    def parcours_manager(self):
+        self.connexion()
+        reponse = self.etape("liste_demandes", "GET", "/demandes/?statut=EN_ATTENTE")
+        ids = re.findall(r"/demandes/(\d+)/traiter/", reponse.texte) if reponse else []
+        if not ids:
+            return
+        chemin = f"/demandes/{ids[(self.numero + self.compteur) % len(ids)]}/traiter/"
+        reponse = self.etape("traiter_demande (GET)", "GET", chemin)
+        version = re.search(r'name="version" value="(\d+)"', reponse.texte) if reponse else None
+        self.etape("traiter_demande (POST)", "POST", chemin,
+                   {"statut": "APPROUVE", "version": version.group(1) if version else 0}, statuts_attendus=(302,))
+
+    def parcours_api(self):
+        # `mot_de_passe` contient ici une clé de session déjà ouverte
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = self.mot_de_passe
+        chemin = "/api/v1/demandes/?limite=100"
+        for _ in range(self.PAGES_API):
+            reponse = self.etape("api_demandes", "GET", chemin, statuts_attendus=(200,))
+            suivant = json.loads(reponse.contenu).get("suivant") if reponse and reponse.statut == 200 else None
+            if not suivant:
+                break
+            chemin = f"/api/v1/demandes/?limite=100&curseur={suivant}"
+        self.etape("api_demandes (champs liés)", "GET",
+                   "/api/v1/demandes/?limite=100&champs=id,statut,employe.nom,approbateur.nom",
+                   statuts_attendus=(200,))
+        self.etape("api_notifications", "GET", "/api/v1/notifications/", statuts_attendus=(200,))
+        self.etape("api_soldes", "GET", "/api/v1/soldes/", statuts_attendus=(200,))
+        self.etape("api_organisation", "GET", "/api/v1/organisation/", statuts_attendus=(200,))
+
+    def run(self):
+        try:
+            while time.perf_counter() < self.echeance and (not self.iterations or self.compteur < self.iterations):
+                self.client.cookies.clear()
+                getattr(self, f"parcours_{self.parcours}")()
+                self.compteur += 1
+        finally:
+            connection.close()
+
+
+def lancer_charge(fabrique_client, comptes, type_conge_id, utilisateurs=10, duree=30, iterations=0):
+    """Lance `utilisateurs` utilisateurs virtuels en parallèle.
+
+    fabrique_client : callable sans argument retournant un client neuf.
+    comptes : dict parcours -> liste de (username, mot_de_passe) ; pour le
+    parcours « api », (username, clé de session).
+    """
+    stats = Statistiques()
+    echeance = stats.debut + duree if duree else float("inf")
+    parcours = [p for p in ("employe", "manager", "api") if comptes.get(p)]
+    threads = []
+    for numero in range(utilisateurs):
+        nom = parcours[numero % len(parcours)]
+        username, mot_de_passe = comptes[nom][numero % len(comptes[nom])]
+        threads.append(UtilisateurVirtuel(numero, fabrique_client(), nom, username, mot_de_passe,
+                                          type_conge_id, stats, echeance, iterations))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats.fin = time.perf_counter()
+    return stats
@@ -0,0 +1,146 @@
+"""
+Circuits d'approbation à plusieurs niveaux.
+
+Le circuit d'un type de congé est la suite de ses étapes (EtapeApprobation),
+par exemple manager puis chef de service ; un type sans étape garde son
+seul approbateur_requis. Une étape peut ne s'appliquer qu'au-delà d'un
+nombre de jours ouvrables (seuil_jours) et prévoir une escalade : sans
+décision après escalade_apres_jours, la demande est aussi soumise à
+l'approbateur escalade_vers.
+
+Les règles de tous les types sont compilées en une requête en tuples
+d'étapes, gardés en mémoire du processus et dans le cache partagé,
+versionnés par la génération des types de congé (conges.simulation),
+incrémentée à chaque modification d'un type ou d'une étape. À la soumission,
+le circuit de la demande est tiré de ces règles en un passage, sans requête,
+et enregistré sur la demande (DemandeConge.circuit) : une modification
+ultérieure des règles ne change pas le circuit des demandes déjà soumises.
+
+DemandeConge.etape est l'indice de l'étape en cours. L'approbation d'une
+étape qui n'est pas la dernière est un seul UPDATE conditionnel
+(conges.transitions) qui avance l'étape : la demande reste en attente et
+passe dans la boîte des approbateurs de l'étape suivante
+(conges.affectations). La dernière approbation, ou un rejet à n'importe
+quelle étape, termine la demande.
+
+escalader() (tâche planifiée, commande escalader_demandes) ajoute les
+approbateurs d'escalade aux demandes dont l'échéance est dépassée, lues
+par l'index (statut, escalade_a).
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .affectations import LIGNES_PAR_LOT, affecter
+from .cache import invalider_utilisateurs
+from .diffusion import diffuseur
+from .models import AffectationApprobation, DemandeConge, NotificationConge, TypeConge
+from .simulation import generation_types
+
+DUREE_REGLES = 24 * 3600
+
+
+@dataclass(frozen=True)
+class Etape:
+    approbateur: str
+    seuil_jours: int = 0
+    escalade_apres_jours: int | None = None
+    escalade_vers: str = ""
+
+    def s_applique(self, jours):
+        return not self.seuil_jours or jours > self.seuil_jours
+
+    def en_json(self):
+        etape = {"approbateur": self.approbateur}
+        if self.escalade_apres_jours and self.escalade_vers:
+            etape.update(escalade_apres_jours=self.escalade_apres_jours, escalade_vers=self.escalade_vers)
+        return etape
+
+
+def charger():
+    """Règles lues en base, une requête : {type_conge_id: (approbateur_requis, (Etape, …))}"""
+    regles = {}
+    for type_id, requis, approbateur, seuil, delai, vers in TypeConge.objects.order_by(
+            "pk", "etapes__ordre").values_list("pk", "approbateur_requis", "etapes__approbateur",
+                                               "etapes__seuil_jours", "etapes__escalade_apres_jours",
+                                               "etapes__escalade_vers"):
+        _, etapes = regles.setdefault(type_id, (requis, []))
+        if approbateur:
+            etapes.append(Etape(approbateur, seuil, delai, vers))
+    return {type_id: (requis, tuple(etapes)) for type_id, (requis, etapes) in regles.items()}
+
+
+# Règles de la génération courante, dans ce processus : (génération, règles)
+_memoire = {}
+
+
+def regles():
+    """Règles compilées de la génération courante : mémoire du processus, cache partagé, puis base"""
+    generation = generation_types()
+    memoire = _memoire.get("regles")
+    if memoire and memoire[0] == generation:
+        return memoire[1]
+
+    cle = f"conges:circuits:{generation}"
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = charger()
+        cache.set(cle, valeur, DUREE_REGLES)
+    _memoire["regles"] = (generation, valeur)
+    return valeur
+
+
+def circuit(type_conge_id, jours):
+    """Étapes (sérialisables en JSON) du circuit d'une demande de `jours` jours ouvrables"""
+    requis, etapes = regles().get(type_conge_id, (TypeConge.Approbateur.MANAGER, ()))
+    retenues = [etape.en_json() for etape in etapes if etape.s_applique(jours)]
+    return retenues or [{"approbateur": requis}]
+
+
+def echeance_escalade(etape, debut):
+    """Date d'escalade d'une étape commencée à `debut`, ou None"""
+    if etape.get("escalade_vers"):
+        return debut + timedelta(days=etape["escalade_apres_jours"])
+    return None
+
+
+def escalader(maintenant=None):
+    """Soumet aux approbateurs d'escalade les demandes dont l'étape en cours
+    attend depuis trop longtemps, par lots, et les prévient. Retourne le
+    nombre de demandes escaladées."""
+    maintenant = maintenant or timezone.now()
+    echues = DemandeConge.objects.filter(statut=DemandeConge.Statut.EN_ATTENTE, escalade_a__lte=maintenant)
+    escaladees = 0
+    while True:
+        lot = list(echues.order_by("pk").values_list("pk", flat=True)[:LIGNES_PAR_LOT])
+        if not lot:
+            return escaladees
+        with transaction.atomic():
+            # Conditionnel : une étape approuvée entre-temps a une nouvelle échéance
+            escaladees += echues.filter(pk__in=lot).update(escalade_a=None, escaladee=True)
+            affecter(DemandeConge.objects.filter(pk__in=lot))
+            notifications = [
+                NotificationConge(
+                    demande_id=demande_id, destinataire_id=approbateur_id,
+                    type_notification=NotificationConge.TypeNotification.RAPPEL_APPROBATION,
+                    destinataire_type=NotificationConge.Destinataire.APPROBATEUR,
+                    titre="Demande de congé escaladée",
+                    message="Une demande de congé attend une décision au-delà du délai prévu : "
+                            "elle vous est soumise en escalade.",
+                )
+                for demande_id, approbateur_id in AffectationApprobation.objects.filter(
+                    demande_id__in=lot, escalade=True).values_list("demande_id", "approbateur_id")
+            ]
+            NotificationConge.objects.bulk_create(notifications)
+            # bulk_create ne déclenche pas les signaux (cache et diffusion en direct)
+            destinataires = {notification.destinataire_id for notification in notifications}
+            transaction.on_commit(lambda destinataires=destinataires: _signaler(destinataires))
+
+
+def _signaler(destinataires):
+    invalider_utilisateurs(*destinataires)
+    for destinataire_id in destinataires:
+        diffuseur.publier(destinataire_id)
@@ -0,0 +1,109 @@
+"""
+Clôture annuelle des soldes de congés.
+
+Pour chaque employé actif : le solde de l'année est clôturé, le reliquat
+(droits - jours pris - jours réservés) est reporté sur l'année suivante
+dans la limite du plafond de report, et la ligne de solde de l'année
+suivante est ouverte (ou complétée si l'employé y a déjà des demandes).
+Les jours réservés par des demandes encore en attente ne sont pas
+reportés : approuvées après la clôture, elles restent imputées sur l'année
+clôturée ; rejetées, leurs jours n'augmentent pas le report déjà fait.
+
+Les employés sont découpés en lots de plages d'identifiants consécutifs
+(LotCloture), planifiés puis traités chacun dans sa propre
+transaction, qui marque aussi le lot comme traité : les lots peuvent être
+traités en parallèle par plusieurs processus, et une clôture interrompue
+reprend aux lots restants. Chaque lot coûte un nombre fixe de requêtes.
+Relancée, la clôture rattrape les employés actifs dont le solde n'a pas
+été clôturé (réactivés après le traitement de leur lot, par exemple).
+"""
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .cache import invalider_utilisateurs
+from .models import LotCloture, SoldeConge, User
+from .soldes import soldes_initiaux
+
+PLAFOND_REPORT = getattr(settings, "CONGES_REPORT_MAX", 5)
+TAILLE_LOT = 1000
+
+
+def planifier_lots(annee, taille_lot=TAILLE_LOT):
+    """Planifie la clôture de `annee` pour les employés actifs dont le solde
+    n'est pas encore clôturé et retourne les lots restant à traiter.
+
+    Un employé dont l'identifiant tombe dans la plage d'un lot existant fait
+    rouvrir ce lot (le retraitement ignore les soldes déjà clôturés) ; les
+    autres forment de nouveaux lots, qui ne chevauchent jamais les plages
+    existantes : deux lots traités en parallèle n'ont aucun employé commun.
+    """
+    lots = list(LotCloture.objects.filter(annee=annee).order_by("borne_min")
+                .values_list("pk", "borne_min", "borne_max"))
+    clotures = SoldeConge.objects.filter(employe=OuterRef("pk"), annee=annee, date_cloture__isnull=False)
+    ids = (User.objects.filter(is_active=True).filter(~Exists(clotures)).order_by("pk")
+           .values_list("pk", flat=True))
+
+    bornes_min = [borne_min for _, borne_min, _ in lots]
+    a_rouvrir, par_intervalle = set(), defaultdict(list)
+    for pk in ids:
+        # Lot de plage commençant au plus tard à pk ; sinon intervalle entre deux lots
+        position = bisect_right(bornes_min, pk)
+        if position and pk <= lots[position - 1][2]:
+            a_rouvrir.add(lots[position - 1][0])
+        else:
+            par_intervalle[position].append(pk)
+
+    LotCloture.objects.filter(pk__in=a_rouvrir, date_traitement__isnull=False).update(date_traitement=None)
+    LotCloture.objects.bulk_create([
+        LotCloture(annee=annee, borne_min=lot[0], borne_max=lot[-1], nombre_employes=len(lot))
+        for intervalle in par_intervalle.values()
+        for lot in (intervalle[debut:debut + taille_lot] for debut in range(0, len(intervalle), taille_lot))
+    ])
+    return list(LotCloture.objects.filter(annee=annee, date_traitement__isnull=True))
+
+
+def cloturer_lot(lot_id, plafond_report=PLAFOND_REPORT):
+    """Clôture l'année pour les employés d'un lot, en une transaction.
+
+    Retourne le nombre d'employés traités (0 si le lot l'était déjà).
+    """
+    maintenant = timezone.now()
+    with transaction.atomic():
+        # Marquage conditionnel : un lot n'est jamais traité deux fois
+        if not LotCloture.objects.filter(pk=lot_id, date_traitement__isnull=True).update(
+                date_traitement=maintenant):
+            return 0
+        lot = LotCloture.objects.get(pk=lot_id)
+        annee = lot.annee
+        employes = list(User.objects.filter(is_active=True, pk__range=(lot.borne_min, lot.borne_max))
+                        .only("id", "jours_conges_annuels"))
+        ids = [employe.pk for employe in employes]
+        soldes = {s.employe_id: s for s in SoldeConge.objects.filter(employe_id__in=ids, annee=annee)}
+        suivants = {s.employe_id: s for s in SoldeConge.objects.filter(employe_id__in=ids, annee=annee + 1)}
+        soldes_manquants = soldes_initiaux([e for e in employes if e.pk not in soldes], annee)
+        suivants_manquants = soldes_initiaux([e for e in employes if e.pk not in suivants], annee + 1)
+
+        a_creer, clotures, reports = [], [], []
+        for employe in employes:
+            solde = soldes.get(employe.pk) or soldes_manquants[employe.pk]
+            if solde.date_cloture:
+                continue
+            solde.date_cloture = maintenant
+            report = min(max(solde.jours_disponibles, 0), plafond_report)
+            suivant = suivants.get(employe.pk) or suivants_manquants[employe.pk]
+            suivant.jours_droits += report
+            suivant.jours_reportes = report
+            for ligne, modifiees in ((solde, clotures), (suivant, reports)):
+                (a_creer if ligne.pk is None else modifiees).append(ligne)
+
+        SoldeConge.objects.bulk_create(a_creer)
+        SoldeConge.objects.bulk_update(clotures, ["date_cloture"], batch_size=500)
+        SoldeConge.objects.bulk_update(reports, ["jours_droits", "jours_reportes"], batch_size=500)
+        # Soldes en cache (bulk_create et bulk_update ne déclenchent pas les signaux)
+        transaction.on_commit(lambda: invalider_utilisateurs(*ids))
+    return len(employes)
@@ -0,0 +1,62 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) pour les pages de liste.
+
+Les validateurs sont calculés par une seule requête d'agrégat sur la portée
+de l'utilisateur (dates maximales indexées, nombre de lignes et, au besoin,
+somme des numéros de version), sans évaluer les querysets de la page. Si le navigateur possède déjà la version
+courante, la vue répond 304 Not Modified.
+"""
+import hashlib
+
+from django.contrib import messages
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def agregats_validateurs(*champs_dates, version=None):
+    """Arguments de aggregate() : date maximale de chaque champ et nombre de lignes.
+
+    version : champ incrémenté à chaque modification ; sa somme change aussi
+    pour les modifications qui ne touchent aucune date (étape intermédiaire
+    d'un circuit d'approbation).
+    """
+    agregats = {f"max_{champ}": Max(champ) for champ in champs_dates}
+    agregats["nombre"] = Count("pk")
+    if version:
+        agregats["versions"] = Sum(version)
+    return agregats
+
+
+def calculer_validateurs(portee, *resultats):
+    """(etag, last_modified) à partir des résultats d'aggregate().
+
+    portee : ce qui distingue la page à données égales (utilisateur, filtres).
+    """
+    dates = [valeur for resultat in resultats for cle, valeur in resultat.items()
+             if cle.startswith("max_") and valeur is not None]
+    derniere_modification = int(max(dates).timestamp()) if dates else None
+    empreinte = hashlib.md5(repr((portee, resultats)).encode()).hexdigest()
+    return f'"{empreinte}"', derniere_modification
+
+
+def reponse_conditionnelle(request, etag, derniere_modification):
+    """Réponse 304 si la version du client est à jour, sinon None.
+
+    Jamais de 304 lorsqu'un message flash attend d'être affiché.
+    """
+    if request.method not in ("GET", "HEAD") or len(messages.get_messages(request)):
+        return None
+    reponse = get_conditional_response(request, etag=etag, last_modified=derniere_modification)
+    if reponse is not None:
+        ajouter_validateurs(reponse, etag, derniere_modification)
+    return reponse
+
+
+def ajouter_validateurs(reponse, etag, derniere_modification):
+    reponse.headers["ETag"] = etag
+    if derniere_modification:
+        reponse.headers["Last-Modified"] = http_date(derniere_modification)
+    # Page personnelle : revalidation systématique, jamais de cache partagé
+    patch_cache_control(reponse, private=True, no_cache=True)
+    return reponse
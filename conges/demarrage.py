@@ -0,0 +1,97 @@
+"""
+Profil du démarrage à froid de projconj.
+
+Chaque mesure lance un nouvel interpréteur avec `python -X importtime`,
+qui écrit sur stderr une ligne par module importé :
+
+    import time: self [us] | cumulative | imported package
+
+Deux cibles :
+- "check" : `manage.py check` (chargement des applications, des modèles,
+  des URL et des vérifications système) ;
+- "wsgi" : import de projconj.wsgi et chargement de l'URLconf, soit ce que
+  fait un processus du serveur d'application avant sa première requête.
+
+Les dépendances lourdes utilisées par une partie seulement des requêtes
+(holidays pour le calcul des jours fériés, par exemple) sont importées au
+premier usage : elles ne doivent pas apparaître ici (voir DemarrageTests).
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+_WSGI = ("from projconj.wsgi import application\n"
+         "from django.urls import get_resolver\n"
+         "get_resolver().url_patterns\n")
+
+CIBLES = {
+    "check": ["manage.py", "check"],
+    "wsgi": ["-c", _WSGI],
+}
+
+_LIGNE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+@dataclass
+class Import:
+    module: str
+    propre: int  # microsecondes, hors sous-modules
+    cumule: int  # microsecondes, sous-modules compris
+    profondeur: int
+
+
+@dataclass
+class Demarrage:
+    cible: str
+    duree: float  # secondes, mesurée de l'extérieur (lancement de l'interpréteur compris)
+    imports: list
+
+    @property
+    def modules(self):
+        return {imp.module for imp in self.imports}
+
+    def paquets(self):
+        """Temps par paquet de premier niveau, du plus coûteux au moins coûteux :
+        (paquet, cumulé, propre) en µs.
+
+        Le cumulé d'un paquet ne compte que ses imports qui ne sont pas déjà
+        inclus dans celui d'un module du même paquet plus haut dans l'arbre."""
+        totaux = {}
+        ancetres = []
+        # Un module est écrit après ses sous-imports : à l'envers, chaque parent précède ses enfants
+        for imp in reversed(self.imports):
+            paquet = imp.module.split(".")[0]
+            while ancetres and ancetres[-1][0] >= imp.profondeur:
+                ancetres.pop()
+            cumule, propre = totaux.get(paquet, (0, 0))
+            if all(parent != paquet for _, parent in ancetres):
+                cumule += imp.cumule
+            totaux[paquet] = (cumule, propre + imp.propre)
+            ancetres.append((imp.profondeur, paquet))
+        return sorted(((paquet, cumule, propre) for paquet, (cumule, propre) in totaux.items()),
+                      key=lambda ligne: ligne[1], reverse=True)
+
+
+def analyser(sortie):
+    imports = []
+    for ligne in sortie.splitlines():
+        correspondance = _LIGNE.match(ligne)
+        if correspondance:
+            propre, cumule, retrait, module = correspondance.groups()
+            imports.append(Import(module, int(propre), int(cumule), len(retrait) // 2))
+    return imports
+
+
+def mesurer(cible="wsgi"):
+    """Démarrage à froid de `cible` dans un nouvel interpréteur"""
+    environnement = {**os.environ, "DJANGO_SETTINGS_MODULE": "projconj.settings", "PYTHONDONTWRITEBYTECODE": "1"}
+    debut = time.perf_counter()
+    resultat = subprocess.run([sys.executable, "-X", "importtime", *CIBLES[cible]], cwd=settings.BASE_DIR,
+                              env=environnement, capture_output=True, text=True, check=True)
+    duree = time.perf_counter() - debut
+    return Demarrage(cible, duree, analyser(resultat.stderr))
@@ -0,0 +1,140 @@
+"""
+Diffusion en direct des nouvelles notifications (server-sent events et
+long-polling).
+
+Chaque connexion ouverte s'abonne auprès du diffuseur du processus avec un
+asyncio.Event. À la création d'une NotificationConge, les abonnés de son
+destinataire sont réveillés et relisent la base à partir du dernier
+identifiant reçu ; cette relecture, bornée par un index (destinataire, id),
+garantit l'ordre et l'absence de doublons. Les connexions se réveillent
+aussi toutes les INTERVALLE_REVEIL secondes et relisent alors la base, ce
+qui couvre les notifications créées par un autre processus.
+
+Une connexion inactive n'est pas gratuite. Sous ASGI, les lectures de l'ORM
+asynchrone passent par l'exécuteur « thread sensitive » de la requête :
+chaque flux ouvert garde ce thread et sa connexion à la base jusqu'à sa
+fermeture ; s'y ajoute une requête par flux et par INTERVALLE_REVEIL. Le
+nombre de flux simultanés se dimensionne donc comme des requêtes longues :
+threads du serveur et connexions de la base.
+
+Sous WSGI, Django consomme un itérateur asynchrone en entier avant
+d'envoyer le premier octet : un flux sans fin n'y envoie jamais rien. Les
+pages y utilisent donc directement le long-polling, et le point d'accès
+SSE répond par une seule attente bornée (DELAI_LONG_POLLING), après
+laquelle le navigateur se reconnecte avec Last-Event-ID.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from .models import NotificationConge
+
+
+# Délai de reconnexion du navigateur après la fin d'un flux (millisecondes)
+RETRY_SSE = 3000
+# Délai entre deux battements de cœur SSE / relectures de sécurité (secondes)
+INTERVALLE_REVEIL = 15
+# Durée maximale d'attente d'une requête de long-polling (secondes)
+DELAI_LONG_POLLING = 25
+
+
+class Diffuseur:
+    """Registre des connexions en attente, par utilisateur (pub/sub en mémoire)"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._abonnes = defaultdict(set)
+
+    def abonner(self, user_id):
+        abonnement = (asyncio.get_running_loop(), asyncio.Event())
+        with self._verrou:
+            self._abonnes[user_id].add(abonnement)
+        return abonnement
+
+    def desabonner(self, user_id, abonnement):
+        with self._verrou:
+            abonnes = self._abonnes.get(user_id)
+            if abonnes:
+                abonnes.discard(abonnement)
+                if not abonnes:
+                    del self._abonnes[user_id]
+
+    def publier(self, user_id):
+        """Réveille les connexions de l'utilisateur ; appelable depuis n'importe quel thread"""
+        with self._verrou:
+            abonnes = list(self._abonnes.get(user_id, ()))
+        for boucle, evenement in abonnes:
+            try:
+                boucle.call_soon_threadsafe(evenement.set)
+            except RuntimeError:
+                pass  # boucle déjà fermée, la connexion se désabonnera d'elle-même
+
+    def nombre_connexions(self):
+        with self._verrou:
+            return sum(len(abonnes) for abonnes in self._abonnes.values())
+
+
+diffuseur = Diffuseur()
+
+
+def serialiser_notification(notification):
+    return {
+        "id": notification.pk,
+        "demande": notification.demande_id,
+        "type": notification.type_notification,
+        "titre": notification.titre,
+        "message": notification.message,
+        "lu": notification.lu,
+        "date_creation": notification.date_creation.isoformat(),
+    }
+
+
+async def notifications_depuis(user_id, dernier_id):
+    """Notifications de l'utilisateur postérieures à `dernier_id`, dans l'ordre de création"""
+    return [
+        serialiser_notification(notification) async for notification in
+        NotificationConge.objects.filter(destinataire_id=user_id, id__gt=dernier_id).order_by("id")
+    ]
+
+
+async def attendre_notifications(user_id, dernier_id, delai):
+    """Retourne dès que des notifications plus récentes que `dernier_id` existent,
+    ou une liste vide au bout de `delai` secondes."""
+    abonnement = diffuseur.abonner(user_id)
+    try:
+        # Abonnement avant la lecture : aucune création ne peut passer entre les deux
+        nouvelles = await notifications_depuis(user_id, dernier_id)
+        if not nouvelles:
+            try:
+                await asyncio.wait_for(abonnement[1].wait(), delai)
+            except asyncio.TimeoutError:
+                pass
+            nouvelles = await notifications_depuis(user_id, dernier_id)
+        return nouvelles
+    finally:
+        diffuseur.desabonner(user_id, abonnement)
+
+
+def evenement_sse(donnees):
+    """Événement text/event-stream d'une notification sérialisée"""
+    return f"id: {donnees['id']}\nevent: notification\ndata: {json.dumps(donnees)}\n\n"
+
+
+async def flux_evenements(user_id, dernier_id):
+    """Générateur asynchrone du flux text/event-stream d'un utilisateur"""
+    abonnement = diffuseur.abonner(user_id)
+    evenement = abonnement[1]
+    try:
+        yield f"retry: {RETRY_SSE}\n\n"
+        while True:
+            evenement.clear()
+            for donnees in await notifications_depuis(user_id, dernier_id):
+                dernier_id = donnees["id"]
+                yield evenement_sse(donnees)
+            try:
+                await asyncio.wait_for(evenement.wait(), INTERVALLE_REVEIL)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+    finally:
+        diffuseur.desabonner(user_id, abonnement)
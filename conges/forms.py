@@ -3,6 +3,8 @@ from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from django.core.exceptions import ValidationError
 from datetime import date, timedelta
 from .models import ( User, Direction, Service, Departement, TypeConge, DemandeConge, NotificationConge)
+from .remplacements import collegues, est_disponible
+from .soldes import SoldeInsuffisant, solde_annuel
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -449,21 +451,8 @@ class DemandeCongeForm(forms.ModelForm):
             # Filtrer les types de congé actifs
             self.fields['type_conge'].queryset = TypeConge.objects.filter(actif=True)
             
-            # Filtrer les remplaçants potentiels
-            if self.user.departement:
-                collegues = User.objects.filter(
-                    departement=self.user.departement,
-                    is_active=True
-                ).exclude(id=self.user.id)
-            elif self.user.service:
-                collegues = User.objects.filter(
-                    service=self.user.service,
-                    is_active=True
-                ).exclude(id=self.user.id)
-            else:
-                collegues = User.objects.filter(is_active=True).exclude(id=self.user.id)
-            
-            self.fields['remplacant'].queryset = collegues
+            # Remplaçants potentiels, mêmes candidats que les suggestions (conges.remplacements)
+            self.fields['remplacant'].queryset = collegues(self.user)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -487,6 +476,12 @@ class DemandeCongeForm(forms.ModelForm):
                         f"pour ce type de congé (sauf urgence)"
                     )
 
+        # Le remplaçant ne doit pas être lui-même absent sur la période
+        remplacant = cleaned_data.get('remplacant')
+        if remplacant and date_debut and date_fin and not est_disponible(remplacant.pk, date_debut, date_fin):
+            self.add_error('remplacant', f"{remplacant.get_full_name() or remplacant.username} est absent(e) "
+                                         f"sur tout ou partie de la période")
+
         # Validation du justificatif
         if type_conge and type_conge.necessite_justificatif and not justificatif:
             raise ValidationError("Un justificatif est requis pour ce type de congé")
@@ -496,14 +491,12 @@ class DemandeCongeForm(forms.ModelForm):
             type_conge.nom == TypeConge.Type.ANNUEL and 
             date_debut and date_fin):
             
+            # Contrôle indicatif : la réservation à l'enregistrement (conges.soldes) fait foi
             jours_demandes = self.user.calculer_jours_ouvrables(date_debut, date_fin)
-            solde_restant = self.user.conges_restants()
-            
+            solde_restant = solde_annuel(self.user, date_debut.year).jours_disponibles
+
             if jours_demandes > solde_restant:
-                raise ValidationError(
-                    f"Vous demandez {jours_demandes} jours mais il vous reste "
-                    f"seulement {solde_restant} jours de congé"
-                )
+                raise ValidationError(str(SoldeInsuffisant(jours_demandes, solde_restant)))
 
         return cleaned_data
 
@@ -534,6 +527,9 @@ class TraitementDemandeForm(forms.ModelForm):
         help_text="Commentaire visible par l'employé"
     )
     
+    # Version lue à l'affichage : la décision est refusée si la demande a changé depuis
+    version = forms.IntegerField(widget=forms.HiddenInput, min_value=0)
+
     class Meta:
         model = DemandeConge
         fields = ['statut', 'motif_rejet', 'commentaire_approbateur']
@@ -562,6 +558,7 @@ class TraitementDemandeForm(forms.ModelForm):
             (DemandeConge.Statut.APPROUVE, 'Approuver'),
             (DemandeConge.Statut.REJETE, 'Rejeter'),
         ]
+        self.fields['version'].initial = self.instance.version
 
     def clean(self):
         cleaned_data = super().clean()
@@ -639,25 +636,25 @@ class FiltreDemandesForm(forms.Form):
         self.fields['type_conge'].choices = TYPE_CHOICES
         
         if user:
-            # Filtrer les employés selon les permissions
-            if user.is_admin() or user.is_rh():
-                pass  # Voient tous les employés
-            elif user.is_directeur():
-                self.fields['employe'].queryset = User.objects.filter(
-                    direction=user.direction, is_active=True
-                )
-            elif user.is_chef_service():
-                self.fields['employe'].queryset = User.objects.filter(
-                    service=user.service, is_active=True
-                )
-            elif user.is_chef_departement():
-                self.fields['employe'].queryset = User.objects.filter(
-                    departement=user.departement, is_active=True
-                )
-            elif user.is_manager():
-                self.fields['employe'].queryset = user.equipe.filter(is_active=True)
-            else:
-                self.fields['employe'].queryset = User.objects.filter(id=user.id)
+            # Employés proposés : ceux de la portée de l'utilisateur (voir conges.portees)
+            self.fields['employe'].queryset = User.objects.visible_to(user).filter(is_active=True)
+
+    def filtrer(self, demandes):
+        """Applique les filtres valides au queryset de demandes"""
+        if not self.is_valid():
+            return demandes
+        donnees = self.cleaned_data
+        if donnees.get("date_debut"):
+            demandes = demandes.filter(date_debut__gte=donnees["date_debut"])
+        if donnees.get("date_fin"):
+            demandes = demandes.filter(date_fin__lte=donnees["date_fin"])
+        if donnees.get("statut"):
+            demandes = demandes.filter(statut=donnees["statut"])
+        if donnees.get("type_conge"):
+            demandes = demandes.filter(type_conge__nom=donnees["type_conge"])
+        if donnees.get("employe"):
+            demandes = demandes.filter(employe=donnees["employe"])
+        return demandes
 
 
 class ProfilUtilisateurForm(forms.ModelForm):
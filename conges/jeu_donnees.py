@@ -0,0 +1,128 @@
+"""
+Génération de jeux de données volumineux pour les tests de performance
+et les tests de charge.
+"""
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+
+from .affectations import affecter
+from .circuits import circuit
+from .models import Direction, Service, Departement, User, TypeConge, DemandeConge, NotificationConge
+
+
+class JeuDonnees:
+    """Organisation fictive (direction, service, département, manager, RH)
+    que l'on peut agrandir à volonté avec des employés et des demandes."""
+
+    def __init__(self, mot_de_passe=None, prefixe="perf"):
+        self.prefixe = prefixe
+        self.mot_de_passe_hash = make_password(mot_de_passe) if mot_de_passe else None
+        self.employes = []
+        self.demandes = []
+        self._nb_demandes = {}
+
+        self.direction = Direction.objects.create(nom=f"Direction {prefixe}", code=f"D{prefixe}"[:10])
+        self.service = Service.objects.create(nom=f"Service {prefixe}", code="SRV", direction=self.direction)
+        self.departement = Departement.objects.create(nom=f"Département {prefixe}", code="DEP",
+                                                      service=self.service)
+
+        self.manager = self._creer_utilisateur(f"{prefixe}_manager", User.Role.MANAGER)
+        self.rh = self._creer_utilisateur(f"{prefixe}_rh", User.Role.RH)
+
+        self.type_annuel, _ = TypeConge.objects.get_or_create(
+            nom=TypeConge.Type.ANNUEL,
+            defaults={"approbateur_requis": TypeConge.Approbateur.MANAGER, "delai_prevenance_jours": 0},
+        )
+        self.type_maladie, _ = TypeConge.objects.get_or_create(
+            nom=TypeConge.Type.MALADIE,
+            defaults={"approbateur_requis": TypeConge.Approbateur.RH, "delai_prevenance_jours": 0},
+        )
+
+    def _creer_utilisateur(self, username, role):
+        user = User(
+            username=username, first_name=username.title(), last_name=self.prefixe.title(), role=role,
+            direction=self.direction, service=self.service, departement=self.departement,
+            date_embauche=date(2020, 1, 1),
+        )
+        if self.mot_de_passe_hash:
+            user.password = self.mot_de_passe_hash
+        else:
+            user.set_unusable_password()
+        user.save()
+        return user
+
+    def ajouter_employes(self, nombre, demandes_par_employe=0):
+        """Ajoute `nombre` employés rattachés au manager, avec leurs demandes"""
+        debut = len(self.employes)
+        nouveaux = []
+        for i in range(debut, debut + nombre):
+            user = User(
+                username=f"{self.prefixe}_emp{i}", first_name=f"Employe{i}", last_name=self.prefixe.title(),
+                role=User.Role.EMPLOYE, direction=self.direction, service=self.service,
+                departement=self.departement, manager=self.manager, date_embauche=date(2020, 1, 1),
+                password=self.mot_de_passe_hash or make_password(None),
+            )
+            nouveaux.append(user)
+        nouveaux = User.objects.bulk_create(nouveaux)
+        self.employes.extend(nouveaux)
+        if demandes_par_employe:
+            self.ajouter_demandes(nouveaux, demandes_par_employe)
+        return nouveaux
+
+    def ajouter_demandes(self, employes, nombre):
+        """Ajoute `nombre` demandes (statuts variés) et leurs notifications à chaque employé"""
+        statuts = [DemandeConge.Statut.EN_ATTENTE, DemandeConge.Statut.APPROUVE,
+                   DemandeConge.Statut.REJETE]
+        demandes = []
+        for employe in employes:
+            deja = self._nb_demandes.get(employe.pk, 0)
+            self._nb_demandes[employe.pk] = deja + nombre
+            for i in range(deja, deja + nombre):
+                debut = date.today() + timedelta(days=14 + (i * 7) % 350)
+                statut = statuts[i % len(statuts)]
+                type_conge = self.type_annuel if i % 4 else self.type_maladie
+                reserves = type_conge is self.type_annuel and statut == DemandeConge.Statut.EN_ATTENTE
+                jours = employe.calculer_jours_ouvrables(debut, debut + timedelta(days=1))
+                demandes.append(DemandeConge(
+                    employe=employe,
+                    type_conge=type_conge,
+                    date_debut=debut,
+                    date_fin=debut + timedelta(days=1),
+                    motif_demande=f"Demande {i}",
+                    statut=statut,
+                    approbateur=None if statut == DemandeConge.Statut.EN_ATTENTE else self.manager,
+                    motif_rejet="Effectif insuffisant" if statut == DemandeConge.Statut.REJETE else "",
+                    jours_ouvrables=jours,
+                    circuit=circuit(type_conge.pk, jours),
+                    # Comme une réservation : comptée à l'initialisation du solde (conges.soldes)
+                    jours_reserves=jours if reserves else 0,
+                ))
+        demandes = DemandeConge.objects.bulk_create(demandes)
+        self.demandes.extend(demandes)
+        # bulk_create n'envoie pas de signal : boîtes des approbateurs remplies ici
+        identifiants = [demande.pk for demande in demandes]
+        for debut in range(0, len(identifiants), 2000):
+            affecter(DemandeConge.objects.filter(pk__in=identifiants[debut:debut + 2000]), remplacer=False)
+
+        notifications = []
+        for demande in demandes:
+            if demande.statut == DemandeConge.Statut.EN_ATTENTE:
+                notifications.append(NotificationConge(
+                    demande=demande, destinataire=self.manager,
+                    type_notification=NotificationConge.TypeNotification.NOUVELLE_DEMANDE,
+                    destinataire_type=NotificationConge.Destinataire.APPROBATEUR,
+                    titre="Nouvelle demande de congé", message=demande.motif_demande,
+                ))
+            else:
+                notifications.append(NotificationConge(
+                    demande=demande, destinataire=demande.employe,
+                    type_notification=NotificationConge.TypeNotification.DEMANDE_APPROUVEE
+                    if demande.statut == DemandeConge.Statut.APPROUVE
+                    else NotificationConge.TypeNotification.DEMANDE_REJETEE,
+                    destinataire_type=NotificationConge.Destinataire.EMPLOYE,
+                    titre=f"Demande de congé {demande.get_statut_display().lower()}",
+                    message=demande.motif_demande,
+                ))
+        NotificationConge.objects.bulk_create(notifications)
+        return demandes
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from conges.affectations import reaffecter
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les affectations des demandes en attente à leurs approbateurs possibles "
+            "(AffectationApprobation), qui alimentent les boîtes d'approbation : initialisation des "
+            "demandes existantes, ou reprise après des écritures faites sans signaux. Relançable.")
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+
+        def progression(lues, enregistrees):
+            self.stdout.write(f"  {lues} demandes lues, {enregistrees} affectation(s)")
+
+        enregistrees = reaffecter(progression=progression if options["verbosity"] > 1 else None)
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(f"{enregistrees} affectation(s) enregistrée(s) en {duree:.2f} s"))
@@ -0,0 +1,36 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from conges.archives import ANNEES_CONSERVEES, archivables, archiver, limite_par_defaut
+
+
+class Command(BaseCommand):
+    help = ("Archive les demandes de congé clôturées (approuvées, rejetées, annulées) dont la période s'est "
+            "terminée avant la date limite, avec leur historique et leurs notifications. Traitement par lots ; "
+            "relancer la commande reprend un archivage interrompu.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--avant", type=date.fromisoformat, default=None,
+                            help=f"Date limite AAAA-MM-JJ (par défaut le 1er janvier d'il y a "
+                                 f"{ANNEES_CONSERVEES} ans)")
+        parser.add_argument("--simulation", action="store_true",
+                            help="Compte les demandes à archiver sans rien déplacer")
+
+    def handle(self, *args, **options):
+        limite = options["avant"] or limite_par_defaut()
+        total = archivables(limite).count()
+        self.stdout.write(f"Archivage des demandes clôturées avant le {limite:%d/%m/%Y} : {total} demande(s)")
+        if options["simulation"] or not total:
+            return
+
+        debut = time.perf_counter()
+
+        def progression(archivees):
+            self.stdout.write(f"  {archivees} / {total} demandes archivées")
+
+        archivees = archiver(limite, progression if options["verbosity"] > 1 else None)
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{archivees} demande(s) archivée(s) en {duree:.1f} s ({archivees / duree if duree else 0:.0f} demandes/s)"))
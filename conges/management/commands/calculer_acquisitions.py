@@ -0,0 +1,28 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from conges.acquisitions import TAILLE_LOT, calculer_acquisitions
+
+
+class Command(BaseCommand):
+    help = ("Calcule les droits à congé acquis sur un mois pour tous les employés actifs "
+            "(tâche planifiée, à lancer chaque mois ; relançable)")
+
+    def add_arguments(self, parser):
+        aujourd_hui = date.today()
+        parser.add_argument("--annee", type=int, default=aujourd_hui.year)
+        parser.add_argument("--mois", type=int, default=aujourd_hui.month)
+        parser.add_argument("--taille-lot", type=int, default=TAILLE_LOT,
+                            help="Lignes par requête d'enregistrement")
+
+    def handle(self, *args, **options):
+        if not 1 <= options["mois"] <= 12:
+            raise CommandError("Le mois doit être compris entre 1 et 12")
+        debut = time.perf_counter()
+        with transaction.atomic():
+            nombre = calculer_acquisitions(options["annee"], options["mois"], options["taille_lot"])
+        duree = time.perf_counter() - debut
+        self.stdout.write(f"{options['mois']:02d}/{options['annee']} : {nombre} employés en {duree:.2f} s")
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from conges.calendriers import demandes_concernees, recalculer_jours_ouvrables
+
+
+class Command(BaseCommand):
+    help = ("Calcule les jours ouvrables enregistrés sur les demandes de congé (DemandeConge.jours_ouvrables) "
+            "selon les calendriers de jours fériés : initialisation des demandes existantes, ou recalcul "
+            "limité à un calendrier, une direction ou un employé. Relançable ; seules les valeurs qui "
+            "changent sont écrites.")
+
+    def add_arguments(self, parser):
+        portee = parser.add_mutually_exclusive_group()
+        portee.add_argument("--calendrier", type=int, dest="calendrier_id")
+        portee.add_argument("--direction", type=int, dest="direction_id")
+        portee.add_argument("--employe", type=int, dest="employe_id")
+
+    def handle(self, *args, **options):
+        demandes = demandes_concernees(options["calendrier_id"], options["direction_id"], options["employe_id"])
+        debut = time.perf_counter()
+
+        def progression(lues, modifiees):
+            self.stdout.write(f"  {lues} demandes lues, {modifiees} modifiée(s)")
+
+        modifiees = recalculer_jours_ouvrables(demandes, progression if options["verbosity"] > 1 else None)
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(f"{modifiees} demande(s) mise(s) à jour en {duree:.2f} s"))
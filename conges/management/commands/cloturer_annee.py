@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from conges.cloture import PLAFOND_REPORT, TAILLE_LOT, cloturer_lot, planifier_lots
+
+
+class Command(BaseCommand):
+    help = ("Clôture les soldes de congés d'une année et ouvre l'année suivante avec les reports. "
+            "Traitement par lots en parallèle ; relancer la commande reprend une clôture interrompue.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--annee", type=int, default=date.today().year - 1, help="Année à clôturer")
+        parser.add_argument("--processus", type=int, default=min(4, os.cpu_count() or 1),
+                            help="Processus de traitement des lots (1 = dans ce processus)")
+        parser.add_argument("--taille-lot", type=int, default=TAILLE_LOT, help="Employés par lot")
+        parser.add_argument("--plafond-report", type=int, default=PLAFOND_REPORT,
+                            help="Nombre maximal de jours reportés sur l'année suivante")
+
+    def handle(self, *args, **options):
+        annee = options["annee"]
+        lots = planifier_lots(annee, options["taille_lot"])
+        if not lots:
+            self.stdout.write(f"Clôture {annee} : aucun lot restant.")
+            return
+        total = sum(lot.nombre_employes for lot in lots)
+        self.stdout.write(f"Clôture {annee} : {len(lots)} lots à traiter ({total} employés), "
+                          f"{options['processus']} processus")
+
+        self.debut = time.perf_counter()
+        self.traites = self.lots_faits = 0
+        if options["processus"] > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            # Les processus fils héritent de la configuration (base de test comprise) par fork
+            self.stderr.write(self.style.WARNING("fork indisponible : lots traités dans ce processus"))
+            options["processus"] = 1
+        if options["processus"] <= 1:
+            for lot in lots:
+                self.avancer(lot, cloturer_lot(lot.pk, options["plafond_report"]), len(lots), total)
+        else:
+            # Les processus fils (fork) ouvrent leurs propres connexions
+            connections.close_all()
+            contexte = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(options["processus"], mp_context=contexte) as executeur:
+                futurs = {executeur.submit(cloturer_lot, lot.pk, options["plafond_report"]): lot for lot in lots}
+                for futur in as_completed(futurs):
+                    self.avancer(futurs[futur], futur.result(), len(lots), total)
+
+        duree = time.perf_counter() - self.debut
+        self.stdout.write(self.style.SUCCESS(
+            f"Clôture {annee} terminée : {self.traites} employés en {duree:.1f} s "
+            f"({self.traites / duree if duree else 0:.0f} employés/s)"))
+
+    def avancer(self, lot, traites, nombre_lots, total):
+        self.lots_faits += 1
+        self.traites += lot.nombre_employes
+        ecoule = time.perf_counter() - self.debut
+        debit = self.traites / ecoule if ecoule else 0
+        restant = (total - self.traites) / debit if debit else 0
+        self.stdout.write(f"  lot {self.lots_faits}/{nombre_lots} ({lot.borne_min}-{lot.borne_max}) : "
+                          f"{traites} employés, {debit:.0f} employés/s, fin estimée dans {restant:.0f} s")
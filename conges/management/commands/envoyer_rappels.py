@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from conges.rappels import DELAI_RAPPEL, INTERVALLE_RAPPELS, envoyer_rappels
+
+
+class Command(BaseCommand):
+    help = ("Relance les approbateurs des demandes en attente depuis trop longtemps : "
+            "un rappel récapitulatif par approbateur (tâche planifiée)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delai-heures", type=float, default=DELAI_RAPPEL.total_seconds() / 3600,
+                            help="Ancienneté minimale des demandes en attente à rappeler")
+        parser.add_argument("--intervalle-heures", type=float, default=INTERVALLE_RAPPELS.total_seconds() / 3600,
+                            help="Délai minimal entre deux rappels au même approbateur")
+
+    def handle(self, *args, **options):
+        nombre = envoyer_rappels(delai=timedelta(hours=options["delai_heures"]),
+                                 intervalle=timedelta(hours=options["intervalle_heures"]))
+        self.stdout.write(f"{nombre} rappel(s) envoyé(s)")
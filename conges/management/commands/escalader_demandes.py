@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from conges.circuits import escalader
+
+
+class Command(BaseCommand):
+    help = ("Soumet aux approbateurs d'escalade les demandes dont l'étape d'approbation en cours a dépassé "
+            "son délai (circuits d'approbation, tâche planifiée)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{escalader()} demande(s) escaladée(s)")
@@ -0,0 +1,38 @@
+import multiprocessing
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from conges.taches import DELAI_VISIBILITE, identifiant_travailleur, travailler
+
+
+def _travailleur(numero, jusqu_a_file_vide, delai_visibilite):
+    return travailler(f"{identifiant_travailleur()}/{numero}", jusqu_a_file_vide, delai_visibilite)
+
+
+class Command(BaseCommand):
+    help = ("Exécute les tâches de la file en arrière-plan (exports, acquisitions, rappels). "
+            "Plusieurs instances peuvent tourner en même temps, sur une ou plusieurs machines.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processus", type=int, default=1, help="Travailleurs lancés par cette commande")
+        parser.add_argument("--jusqu-a-file-vide", action="store_true",
+                            help="S'arrêter dès qu'aucune tâche n'est disponible")
+        parser.add_argument("--delai-visibilite", type=int, default=int(DELAI_VISIBILITE.total_seconds()),
+                            help="Secondes sans progression au-delà desquelles une tâche est reprise")
+
+    def handle(self, *args, **options):
+        arguments = (options["jusqu_a_file_vide"], timedelta(seconds=options["delai_visibilite"]))
+        if options["processus"] > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            # Les processus fils héritent de la configuration (base de test comprise) par fork
+            self.stderr.write(self.style.WARNING("fork indisponible : un seul travailleur dans ce processus"))
+            options["processus"] = 1
+        if options["processus"] <= 1:
+            executees = _travailleur(0, *arguments)
+        else:
+            # Les processus fils (fork) ouvrent leurs propres connexions
+            connections.close_all()
+            with multiprocessing.get_context("fork").Pool(options["processus"]) as pool:
+                executees = sum(pool.starmap(_travailleur, [(n, *arguments) for n in range(options["processus"])]))
+        self.stdout.write(self.style.SUCCESS(f"{executees} tâche(s) exécutée(s)."))
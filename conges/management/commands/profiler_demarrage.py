@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from conges.demarrage import CIBLES, mesurer
+
+
+class Command(BaseCommand):
+    help = ("Profil du démarrage à froid (python -X importtime) : durée totale et temps d'import "
+            "par paquet et par module, pour `manage.py check` ou l'application WSGI.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cible", choices=sorted(CIBLES), default="wsgi")
+        parser.add_argument("--top", type=int, default=15, help="Nombre de lignes par tableau")
+        parser.add_argument("--repetitions", type=int, default=3,
+                            help="Mesures successives ; la plus rapide est retenue")
+
+    def handle(self, *args, **options):
+        demarrage = min((mesurer(options["cible"]) for _ in range(options["repetitions"])),
+                        key=lambda mesure: mesure.duree)
+        top = options["top"]
+        total_imports = sum(imp.propre for imp in demarrage.imports)
+
+        self.stdout.write(f"Cible : {demarrage.cible}")
+        self.stdout.write(f"Démarrage à froid : {demarrage.duree * 1000:.0f} ms "
+                          f"(dont imports : {total_imports / 1000:.0f} ms, {len(demarrage.imports)} modules)")
+
+        self.stdout.write("\nPar paquet (ms)       cumulé     propre")
+        for paquet, cumule, propre in demarrage.paquets()[:top]:
+            self.stdout.write(f"  {paquet:<18} {cumule / 1000:>8.1f} {propre / 1000:>10.1f}")
+
+        self.stdout.write("\nModules les plus lents à importer (ms, hors sous-modules)")
+        for imp in sorted(demarrage.imports, key=lambda imp: imp.propre, reverse=True)[:top]:
+            self.stdout.write(f"  {imp.module:<50} {imp.propre / 1000:>8.1f}")
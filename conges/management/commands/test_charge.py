@@ -0,0 +1,97 @@
+import json
+import socketserver
+import threading
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from conges.charge import ClientHTTP, ClientWSGI, lancer_charge, ouvrir_session
+from conges.jeu_donnees import JeuDonnees
+
+
+class ServeurWSGIMultiThread(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class GestionnaireSilencieux(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ("Test de charge des parcours employé et manager sur projconj.wsgi.application, "
+            "à partir d'un jeu de données généré dans une base temporaire")
+
+    MOT_DE_PASSE = "charge-Conges-2024"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["wsgi", "http"], default="wsgi",
+                            help="wsgi : appel direct dans le processus ; http : serveur HTTP local")
+        parser.add_argument("--utilisateurs", type=int, default=10, help="Utilisateurs virtuels simultanés")
+        parser.add_argument("--duree", type=float, default=30, help="Durée du test en secondes")
+        parser.add_argument("--iterations", type=int, default=0,
+                            help="Nombre de parcours par utilisateur (0 = jusqu'à la fin de la durée)")
+        parser.add_argument("--parcours", choices=["employe", "manager", "mixte", "api"], default="mixte",
+                            help="api : lecture paginée de l'API JSON par les managers et RH")
+        parser.add_argument("--employes", type=int, default=200, help="Employés du jeu de données")
+        parser.add_argument("--demandes", type=int, default=10, help="Demandes par employé")
+        parser.add_argument("--json", help="Écrit aussi le rapport au format JSON dans ce fichier")
+
+    def handle(self, *args, **options):
+        # Base de test jetable : le test ne touche jamais la base configurée,
+        # ni le cache partagé (mêmes identifiants que la base de développement).
+        # Tout se passe dans ce processus : un cache en mémoire suffit.
+        nom_origine = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=["localhost", "127.0.0.1"], DEBUG=False,
+                                   CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+                stats = self.executer(options)
+        finally:
+            connection.creation.destroy_test_db(nom_origine, verbosity=0)
+
+        self.stdout.write(stats.rapport())
+        if options["json"]:
+            with open(options["json"], "w") as fichier:
+                json.dump(stats.resume(), fichier, indent=2)
+
+    def executer(self, options):
+        from projconj.wsgi import application
+
+        self.stdout.write(f"Génération du jeu de données ({options['employes']} employés × "
+                          f"{options['demandes']} demandes)...")
+        jeu = JeuDonnees(mot_de_passe=self.MOT_DE_PASSE, prefixe="charge")
+        jeu.ajouter_employes(options["employes"], options["demandes"])
+
+        if options["parcours"] == "api":
+            comptes = {"api": [(u.username, ouvrir_session(u)) for u in (jeu.manager, jeu.rh)]}
+            connection.close()
+        else:
+            connection.close()
+            comptes = {
+                "employe": [(e.username, self.MOT_DE_PASSE) for e in jeu.employes],
+                "manager": [(jeu.manager.username, self.MOT_DE_PASSE), (jeu.rh.username, self.MOT_DE_PASSE)],
+            }
+            if options["parcours"] != "mixte":
+                comptes = {options["parcours"]: comptes[options["parcours"]]}
+
+        serveur = None
+        if options["mode"] == "http":
+            serveur = make_server("127.0.0.1", 0, application, server_class=ServeurWSGIMultiThread,
+                                  handler_class=GestionnaireSilencieux)
+            threading.Thread(target=serveur.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{serveur.server_port}"
+            fabrique_client = lambda: ClientHTTP(url)  # noqa: E731
+        else:
+            fabrique_client = lambda: ClientWSGI(application)  # noqa: E731
+
+        self.stdout.write(f"{options['utilisateurs']} utilisateurs virtuels, mode {options['mode']}...")
+        try:
+            return lancer_charge(fabrique_client, comptes, jeu.type_annuel.pk,
+                                 utilisateurs=options["utilisateurs"], duree=options["duree"],
+                                 iterations=options["iterations"])
+        finally:
+            if serveur:
+                serveur.shutdown()
+                serveur.server_close()
@@ -0,0 +1,228 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='demandeconge',
+            options={'ordering': ['-date_demande'], 'verbose_name': 'Demande de congé', 'verbose_name_plural': 'Demandes de congé'},
+        ),
+        migrations.AlterModelOptions(
+            name='notificationconge',
+            options={'ordering': ['-date_creation'], 'verbose_name': 'Notification', 'verbose_name_plural': 'Notifications'},
+        ),
+        migrations.RenameField(
+            model_name='notificationconge',
+            old_name='employe',
+            new_name='destinataire',
+        ),
+        migrations.RemoveField(
+            model_name='demandeconge',
+            name='manager',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='department',
+        ),
+        migrations.AddField(
+            model_name='demandeconge',
+            name='approbateur',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='demandes_approuvees', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='demandeconge',
+            name='commentaire_approbateur',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='demandeconge',
+            name='instructions_remplacement',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='demandeconge',
+            name='priorite',
+            field=models.CharField(choices=[('NORMALE', 'Normale'), ('URGENTE', 'Urgente'), ('CRITIQUE', 'Critique')], default='NORMALE', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='demandeconge',
+            name='remplacant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='remplacements', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='notificationconge',
+            name='destinataire_type',
+            field=models.CharField(choices=[('EMPLOYE', 'Employé'), ('MANAGER', 'Manager'), ('APPROBATEUR', 'Approbateur')], default='', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='notificationconge',
+            name='titre',
+            field=models.CharField(default='', max_length=200),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='notificationconge',
+            name='type_notification',
+            field=models.CharField(choices=[('NOUVELLE_DEMANDE', 'Nouvelle demande'), ('DEMANDE_APPROUVEE', 'Demande approuvée'), ('DEMANDE_REJETEE', 'Demande rejetée'), ('RAPPEL_APPROBATION', "Rappel d'approbation"), ('DEMANDE_ANNULEE', 'Demande annulée')], default='', max_length=30),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='notificationconge',
+            name='visible_admin',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='typeconge',
+            name='actif',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='typeconge',
+            name='approbateur_requis',
+            field=models.CharField(choices=[('MANAGER', 'Manager direct'), ('SECRETAIRE', 'Secrétaire'), ('RH', 'Ressources Humaines'), ('CHEF_DEPT', 'Chef de département'), ('CHEF_SERV', 'Chef de service'), ('DIRECTEUR', 'Directeur')], default='MANAGER', help_text='Qui peut approuver ce type de congé', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='typeconge',
+            name='delai_prevenance_jours',
+            field=models.PositiveSmallIntegerField(default=7, help_text='Délai de préavis en jours'),
+        ),
+        migrations.AddField(
+            model_name='typeconge',
+            name='duree_max_jours',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Durée maximale en jours (optionnel)', null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='date_embauche',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='manager',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='equipe', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='notifications_app',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='notifications_email',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='demandeconge',
+            name='statut',
+            field=models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('APPROUVE', 'Approuvé'), ('REJETE', 'Rejeté'), ('ANNULE', 'Annulé')], default='EN_ATTENTE', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='typeconge',
+            name='nom',
+            field=models.CharField(choices=[('ANNUEL', 'Congé annuel'), ('MALADIE', 'Congé maladie'), ('MATERNITE', 'Congé maternité'), ('PATERNITE', 'Congé paternité'), ('FORMATION', 'Formation'), ('SANS_SOLDE', 'Congé sans solde'), ('DEUIL', 'Congé de deuil'), ('EXCEPTIONNEL', 'Congé exceptionnel')], max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='role',
+            field=models.CharField(choices=[('EMP', 'Employé'), ('MAN', 'Manager'), ('CHF_DEPT', 'Chef de Département'), ('CHF_SERV', 'Chef de Service'), ('DIR', 'Directeur'), ('SEC', 'Secrétaire'), ('RH', 'Ressources Humaines'), ('ADM', 'Administrateur')], default='EMP', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='Departement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('code', models.CharField(max_length=10)),
+                ('description', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('chef_departement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='departement_dirige', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Département',
+                'verbose_name_plural': 'Départements',
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='departement',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='employes', to='conges.departement'),
+        ),
+        migrations.CreateModel(
+            name='Direction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('directeur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='direction_dirigee', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Direction',
+                'verbose_name_plural': 'Directions',
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='direction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='employes', to='conges.direction'),
+        ),
+        migrations.CreateModel(
+            name='HistoriqueConge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=50)),
+                ('ancien_statut', models.CharField(blank=True, max_length=20)),
+                ('nouveau_statut', models.CharField(blank=True, max_length=20)),
+                ('commentaire', models.TextField(blank=True)),
+                ('date_action', models.DateTimeField(auto_now_add=True)),
+                ('demande', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historique', to='conges.demandeconge')),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Historique de congé',
+                'verbose_name_plural': 'Historique des congés',
+                'ordering': ['-date_action'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Service',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('code', models.CharField(max_length=10)),
+                ('description', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('chef_service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='service_dirige', to=settings.AUTH_USER_MODEL)),
+                ('direction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='services', to='conges.direction')),
+            ],
+            options={
+                'verbose_name': 'Service',
+                'verbose_name_plural': 'Services',
+                'unique_together': {('nom', 'direction')},
+            },
+        ),
+        migrations.AddField(
+            model_name='departement',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='departements', to='conges.service'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='service',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='employes', to='conges.service'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='departement',
+            unique_together={('nom', 'service')},
+        ),
+    ]
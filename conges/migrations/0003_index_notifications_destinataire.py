@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0002_synchronisation_modeles'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificationconge',
+            index=models.Index(fields=['destinataire', 'id'], name='notif_destinataire_id_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0003_index_notifications_destinataire'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='demandeconge',
+            index=models.Index(fields=['date_demande'], name='demande_date_demande_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='demandeconge',
+            index=models.Index(fields=['date_traitement'], name='demande_date_traitement_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationconge',
+            index=models.Index(fields=['destinataire', 'date_creation'], name='notif_destinataire_date_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:33
+
+import conges.stockage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0004_index_validateurs_http'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='demandeconge',
+            name='justificatif',
+            field=models.FileField(blank=True, null=True, storage=conges.stockage.stockage_justificatifs, upload_to='justificatifs/'),
+        ),
+    ]
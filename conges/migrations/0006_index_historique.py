@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0005_stockage_justificatifs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historiqueconge',
+            index=models.Index(fields=['demande', 'date_action'], name='historique_demande_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historiqueconge',
+            index=models.Index(fields=['utilisateur', 'date_action'], name='historique_utilisateur_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0006_index_historique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandeconge',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
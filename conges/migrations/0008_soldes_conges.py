@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:40
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def reserver_demandes_en_attente(apps, schema_editor):
+    """Les demandes annuelles déjà en attente réservent leurs jours ouvrables"""
+    import holidays
+
+    DemandeConge = apps.get_model('conges', 'DemandeConge')
+    en_attente = DemandeConge.objects.filter(statut='EN_ATTENTE', type_conge__nom='ANNUEL')
+    a_modifier = []
+    for demande in en_attente.only('id', 'date_debut', 'date_fin').iterator():
+        feries = holidays.BI(years=demande.date_debut.year)
+        jour, jours = demande.date_debut, 0
+        while jour <= demande.date_fin:
+            if jour.weekday() < 5 and jour not in feries:
+                jours += 1
+            jour += timedelta(days=1)
+        demande.jours_reserves = jours
+        a_modifier.append(demande)
+    DemandeConge.objects.bulk_update(a_modifier, ['jours_reserves'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0007_version_demande'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandeconge',
+            name='jours_reserves',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='SoldeConge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveSmallIntegerField()),
+                ('jours_droits', models.PositiveIntegerField()),
+                ('jours_pris', models.PositiveIntegerField(default=0)),
+                ('jours_reserves', models.PositiveIntegerField(default=0)),
+                ('employe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='soldes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Solde de congés',
+                'verbose_name_plural': 'Soldes de congés',
+                'constraints': [models.UniqueConstraint(fields=('employe', 'annee'), name='solde_employe_annee_unique')],
+            },
+        ),
+        migrations.RunPython(reserver_demandes_en_attente, migrations.RunPython.noop),
+    ]
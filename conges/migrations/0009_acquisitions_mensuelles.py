@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0008_soldes_conges'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcquisitionMensuelle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveSmallIntegerField()),
+                ('mois', models.PositiveSmallIntegerField()),
+                ('jours_acquis', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('jours_cumules', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('date_calcul', models.DateTimeField(auto_now=True)),
+                ('employe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='acquisitions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Acquisition mensuelle',
+                'verbose_name_plural': 'Acquisitions mensuelles',
+                'ordering': ['annee', 'mois'],
+                'constraints': [models.UniqueConstraint(fields=('employe', 'annee', 'mois'), name='acquisition_employe_mois_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0009_acquisitions_mensuelles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soldeconge',
+            name='date_cloture',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='soldeconge',
+            name='jours_reportes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='LotCloture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveSmallIntegerField()),
+                ('borne_min', models.BigIntegerField()),
+                ('borne_max', models.BigIntegerField()),
+                ('nombre_employes', models.PositiveIntegerField()),
+                ('date_traitement', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Lot de clôture annuelle',
+                'verbose_name_plural': 'Lots de clôture annuelle',
+                'ordering': ['annee', 'borne_min'],
+                'constraints': [models.UniqueConstraint(fields=('annee', 'borne_min'), name='lot_cloture_unique')],
+            },
+        ),
+    ]
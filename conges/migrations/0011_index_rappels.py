@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0010_cloture_annuelle'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='demandeconge',
+            index=models.Index(fields=['statut', 'date_demande'], name='demande_statut_date_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0011_index_rappels'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('parametres', models.JSONField(blank=True, default=dict)),
+                ('priorite', models.SmallIntegerField(default=0, help_text='Les plus grandes valeurs passent en premier')),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('TERMINEE', 'Terminée'), ('ECHOUEE', 'Échouée')], default='EN_ATTENTE', max_length=20)),
+                ('disponible_a', models.DateTimeField(default=django.utils.timezone.now)),
+                ('travailleur', models.CharField(blank=True, max_length=100)),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('tentatives_max', models.PositiveSmallIntegerField(default=3)),
+                ('progression', models.PositiveSmallIntegerField(default=0)),
+                ('message', models.CharField(blank=True, max_length=200)),
+                ('resultat', models.JSONField(blank=True, null=True)),
+                ('erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('cree_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='taches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tâche',
+                'verbose_name_plural': 'Tâches',
+                'ordering': ['-date_creation'],
+                'indexes': [models.Index(fields=['statut', '-priorite', 'disponible_a'], name='tache_file_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:06
+
+import conges.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0013_index_recherche_admin'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', conges.models.UtilisateurManager()),
+            ],
+        ),
+    ]
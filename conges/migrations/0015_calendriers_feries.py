@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def creer_calendrier_par_defaut(apps, schema_editor):
+    """Calendrier burundais, jusqu'ici le seul appliqué, par défaut pour toutes les directions"""
+    CalendrierFeries = apps.get_model('conges', 'CalendrierFeries')
+    CalendrierFeries.objects.get_or_create(code='BI', defaults={'nom': 'Burundi', 'pays': 'BI', 'par_defaut': True})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0014_gestionnaire_utilisateurs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendrierFeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('pays', models.CharField(blank=True, max_length=2)),
+                ('par_defaut', models.BooleanField(default=False, help_text='Appliqué aux directions sans calendrier')),
+            ],
+            options={
+                'verbose_name': 'Calendrier des jours fériés',
+                'verbose_name_plural': 'Calendriers des jours fériés',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('par_defaut', True)), fields=('par_defaut',), name='calendrier_unique_par_defaut')],
+            },
+        ),
+        migrations.AddField(
+            model_name='direction',
+            name='calendrier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='directions', to='conges.calendrierferies'),
+        ),
+        migrations.CreateModel(
+            name='JourFerie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('libelle', models.CharField(max_length=100)),
+                ('type_jour', models.CharField(choices=[('FERIE', 'Jour férié'), ('FERMETURE', "Fermeture de l'entreprise")], default='FERIE', max_length=10)),
+                ('calendrier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jours', to='conges.calendrierferies')),
+            ],
+            options={
+                'verbose_name': 'Jour férié',
+                'verbose_name_plural': 'Jours fériés',
+                'ordering': ['date'],
+                'unique_together': {('calendrier', 'date')},
+            },
+        ),
+        migrations.RunPython(creer_calendrier_par_defaut, migrations.RunPython.noop),
+    ]
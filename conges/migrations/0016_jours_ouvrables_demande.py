@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0015_calendriers_feries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandeconge',
+            name='jours_ouvrables',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
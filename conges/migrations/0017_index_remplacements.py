@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0016_jours_ouvrables_demande'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='demandeconge',
+            index=models.Index(fields=['employe', 'statut', 'date_fin', 'date_debut'], name='demande_employe_periode_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='demandeconge',
+            index=models.Index(fields=['remplacant', 'statut', 'date_fin'], name='demande_remplacant_idx'),
+        ),
+    ]
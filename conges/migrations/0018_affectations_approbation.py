@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0017_index_remplacements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AffectationApprobation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('priorite', models.CharField(choices=[('NORMALE', 'Normale'), ('URGENTE', 'Urgente'), ('CRITIQUE', 'Critique')], max_length=20)),
+                ('date_demande', models.DateTimeField()),
+                ('approbateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='affectations_approbation', to=settings.AUTH_USER_MODEL)),
+                ('demande', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='affectations', to='conges.demandeconge')),
+                ('type_conge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='conges.typeconge')),
+            ],
+            options={
+                'verbose_name': "Affectation d'approbation",
+                'verbose_name_plural': "Affectations d'approbation",
+                'indexes': [models.Index(fields=['approbateur', 'date_demande'], name='affectation_boite_idx'), models.Index(fields=['approbateur', 'type_conge', 'priorite', 'date_demande'], name='affectation_compteurs_idx')],
+                'constraints': [models.UniqueConstraint(fields=('demande', 'approbateur'), name='affectation_unique')],
+            },
+        ),
+    ]
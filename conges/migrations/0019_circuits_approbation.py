@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def circuit_des_demandes_en_attente(apps, schema_editor):
+    """Demandes en attente : circuit d'une seule étape, l'approbateur requis de leur type"""
+    TypeConge = apps.get_model('conges', 'TypeConge')
+    DemandeConge = apps.get_model('conges', 'DemandeConge')
+    for type_id, requis in TypeConge.objects.values_list('pk', 'approbateur_requis'):
+        DemandeConge.objects.filter(type_conge_id=type_id, statut='EN_ATTENTE').update(
+            circuit=[{'approbateur': requis}])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0018_affectations_approbation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EtapeApprobation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordre', models.PositiveSmallIntegerField()),
+                ('approbateur', models.CharField(choices=[('MANAGER', 'Manager direct'), ('SECRETAIRE', 'Secrétaire'), ('RH', 'Ressources Humaines'), ('CHEF_DEPT', 'Chef de département'), ('CHEF_SERV', 'Chef de service'), ('DIRECTEUR', 'Directeur')], max_length=20)),
+                ('seuil_jours', models.PositiveSmallIntegerField(default=0, help_text="L'étape ne s'applique qu'au-delà de ce nombre de jours ouvrables (0 : toujours)")),
+                ('escalade_apres_jours', models.PositiveSmallIntegerField(blank=True, help_text="Sans décision après ce délai, la demande est aussi soumise à l'approbateur d'escalade", null=True)),
+                ('escalade_vers', models.CharField(blank=True, choices=[('MANAGER', 'Manager direct'), ('SECRETAIRE', 'Secrétaire'), ('RH', 'Ressources Humaines'), ('CHEF_DEPT', 'Chef de département'), ('CHEF_SERV', 'Chef de service'), ('DIRECTEUR', 'Directeur')], max_length=20)),
+            ],
+            options={
+                'verbose_name': "Étape d'approbation",
+                'verbose_name_plural': "Étapes d'approbation",
+                'ordering': ['type_conge', 'ordre'],
+            },
+        ),
+        migrations.AddField(
+            model_name='affectationapprobation',
+            name='escalade',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='demandeconge',
+            name='circuit',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='demandeconge',
+            name='escalade_a',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='demandeconge',
+            name='escaladee',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='demandeconge',
+            name='etape',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='demandeconge',
+            index=models.Index(fields=['statut', 'escalade_a'], name='demande_escalade_idx'),
+        ),
+        migrations.AddField(
+            model_name='etapeapprobation',
+            name='type_conge',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='etapes', to='conges.typeconge'),
+        ),
+        migrations.AddConstraint(
+            model_name='etapeapprobation',
+            constraint=models.UniqueConstraint(fields=('type_conge', 'ordre'), name='etape_type_ordre_unique'),
+        ),
+        migrations.RunPython(circuit_des_demandes_en_attente, migrations.RunPython.noop),
+    ]
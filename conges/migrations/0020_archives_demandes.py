@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:43
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0019_circuits_approbation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandeArchivee',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date_debut', models.DateField()),
+                ('date_fin', models.DateField()),
+                ('motif_demande', models.TextField()),
+                ('justificatif', models.CharField(blank=True, max_length=100)),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('APPROUVE', 'Approuvé'), ('REJETE', 'Rejeté'), ('ANNULE', 'Annulé')], max_length=20)),
+                ('priorite', models.CharField(choices=[('NORMALE', 'Normale'), ('URGENTE', 'Urgente'), ('CRITIQUE', 'Critique')], max_length=20)),
+                ('date_demande', models.DateTimeField()),
+                ('jours_ouvrables', models.PositiveIntegerField(default=0)),
+                ('circuit', models.JSONField(default=list)),
+                ('date_traitement', models.DateTimeField(blank=True, null=True)),
+                ('motif_rejet', models.TextField(blank=True)),
+                ('commentaire_approbateur', models.TextField(blank=True)),
+                ('instructions_remplacement', models.TextField(blank=True)),
+                ('historique', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('notifications', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('date_archivage', models.DateTimeField(auto_now_add=True)),
+                ('approbateur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('employe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demandes_archivees', to=settings.AUTH_USER_MODEL)),
+                ('remplacant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('type_conge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='conges.typeconge')),
+            ],
+            options={
+                'verbose_name': 'Demande archivée',
+                'verbose_name_plural': 'Demandes archivées',
+                'ordering': ['-date_demande'],
+                'indexes': [models.Index(fields=['employe', 'date_debut'], name='archive_employe_debut_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conges', '0020_archives_demandes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationconge',
+            name='echeance',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationconge',
+            constraint=models.UniqueConstraint(condition=models.Q(('echeance__isnull', False)), fields=('demande', 'destinataire', 'echeance'), name='rappel_unique_par_echeance'),
+        ),
+    ]
@@ -1,9 +1,12 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models.functions import Coalesce
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import date, timedelta
-import holidays
 from django.utils import timezone
 
+from .stockage import stockage_justificatifs
+
 
 class Direction(models.Model):
     """Représente une direction de l'entreprise"""
@@ -12,6 +15,9 @@ class Direction(models.Model):
     description = models.TextField(blank=True)
     directeur = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, blank=True, 
                                  related_name='direction_dirigee')
+    # Jours fériés applicables aux employés de la direction ; à défaut, le calendrier par défaut
+    calendrier = models.ForeignKey('CalendrierFeries', on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='directions')
     date_creation = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -60,6 +66,70 @@ class Departement(models.Model):
         unique_together = ['nom', 'service']
 
 
+class CalendrierFeries(models.Model):
+    """Calendrier des jours non travaillés d'un site : jours fériés légaux du
+    pays (paquet holidays) et jours propres à l'entreprise (JourFerie)"""
+    nom = models.CharField(max_length=100, unique=True)
+    code = models.CharField(max_length=10, unique=True)
+    # Code pays ISO 3166-1 (BI, RW, CD, …) ; vide : uniquement les jours saisis
+    pays = models.CharField(max_length=2, blank=True)
+    par_defaut = models.BooleanField(default=False,
+                                     help_text="Appliqué aux directions sans calendrier")
+
+    def __str__(self):
+        return self.nom
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        import holidays
+
+        self.pays = self.pays.upper()
+        if self.pays and self.pays not in holidays.list_supported_countries():
+            raise ValidationError({'pays': "Pays non pris en charge par le calendrier des jours fériés"})
+
+    class Meta:
+        verbose_name = "Calendrier des jours fériés"
+        verbose_name_plural = "Calendriers des jours fériés"
+        constraints = [
+            models.UniqueConstraint(fields=['par_defaut'], condition=models.Q(par_defaut=True),
+                                    name='calendrier_unique_par_defaut'),
+        ]
+
+
+class JourFerie(models.Model):
+    """Jour non travaillé propre à un calendrier (fermeture, férié local, …)"""
+    class Type(models.TextChoices):
+        FERIE = "FERIE", "Jour férié"
+        FERMETURE = "FERMETURE", "Fermeture de l'entreprise"
+
+    calendrier = models.ForeignKey(CalendrierFeries, on_delete=models.CASCADE, related_name='jours')
+    date = models.DateField()
+    libelle = models.CharField(max_length=100)
+    type_jour = models.CharField(max_length=10, choices=Type.choices, default=Type.FERIE)
+
+    def __str__(self):
+        return f"{self.date:%d/%m/%Y} - {self.libelle}"
+
+    class Meta:
+        verbose_name = "Jour férié"
+        verbose_name_plural = "Jours fériés"
+        ordering = ['date']
+        unique_together = ['calendrier', 'date']
+
+
+class UtilisateurQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Utilisateurs que `user` peut voir (voir conges.portees)"""
+        from .portees import TOUT, portee
+
+        visibles = portee(user)
+        return self if visibles == TOUT else self.filter(pk__in=visibles)
+
+
+class UtilisateurManager(UserManager.from_queryset(UtilisateurQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     class Role(models.TextChoices):
         EMPLOYE = "EMP", "Employé"
@@ -104,6 +174,14 @@ class User(AbstractUser):
         blank=True
     )
 
+    objects = UtilisateurManager()
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Recherche par nom (admin)
+            models.Index(fields=['last_name', 'first_name'], name='user_nom_idx'),
+        ]
+
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_role_display()})"
 
@@ -118,7 +196,7 @@ class User(AbstractUser):
         return self.role == self.Role.CHEF_DEPT
 
     def is_chef_service(self):
-        return self.role == self.Role.CHEF_SERV
+        return self.role == self.Role.CHEF_SERVICE
 
     def is_directeur(self):
         return self.role == self.Role.DIRECTEUR
@@ -178,26 +256,21 @@ class User(AbstractUser):
     def conges_consommes_annee(self, annee=None):
         if annee is None:
             annee = date.today().year
-        conges_approuves = DemandeConge.objects.filter(
-            employe=self,
-            statut=DemandeConge.Statut.APPROUVE,
-            date_debut__year=annee
-        )
-        total_jours = sum(self.calculer_jours_ouvrables(c.date_debut, c.date_fin) for c in conges_approuves)
-        return total_jours
+        filtre = {"employe": self, "statut": DemandeConge.Statut.APPROUVE, "date_debut__year": annee}
+        # Demandes courantes et archivées (conges.archives), en une requête
+        archivees = (DemandeArchivee.objects.filter(**filtre).order_by().values("employe")
+                     .annotate(total=models.Sum('jours_ouvrables')).values("total"))
+        return DemandeConge.objects.filter(**filtre).aggregate(total=(
+            Coalesce(models.Sum('jours_ouvrables'), 0) + Coalesce(models.Subquery(archivees), 0)))['total']
 
     def conges_restants(self):
         return self.jours_conges_annuels - self.conges_consommes_annee()
 
     def calculer_jours_ouvrables(self, date_debut, date_fin):
-        jours_total = 0
-        current_date = date_debut
-        jours_feries = holidays.BI(years=current_date.year)
-        while current_date <= date_fin:
-            if current_date.weekday() < 5 and current_date not in jours_feries:
-                jours_total += 1
-            current_date += timedelta(days=1)
-        return jours_total
+        """Jours ouvrables de la période, selon le calendrier de la direction de l'employé"""
+        from .calendriers import calendrier_employe
+
+        return calendrier_employe(self).jours_ouvrables(date_debut, date_fin)
 
 
 class TypeConge(models.Model):
@@ -234,30 +307,83 @@ class TypeConge(models.Model):
     def __str__(self):
         return self.get_nom_display()
 
-    def get_approbateurs_possibles(self, employe):
-        """Retourne la liste des utilisateurs pouvant approuver ce type de congé pour cet employé"""
+    def get_approbateurs_possibles(self, employe, approbateur_requis=None):
+        """Retourne la liste des utilisateurs pouvant approuver ce type de congé pour cet employé
+        (au niveau `approbateur_requis`, par défaut celui du type)"""
         approbateurs = []
+        requis = approbateur_requis or self.approbateur_requis
         
-        if self.approbateur_requis == self.Approbateur.MANAGER:
+        if requis == self.Approbateur.MANAGER:
             if employe.manager:
                 approbateurs.append(employe.manager)
-        elif self.approbateur_requis == self.Approbateur.SECRETAIRE:
+        elif requis == self.Approbateur.SECRETAIRE:
             approbateurs.extend(User.objects.filter(role=User.Role.SECRETAIRE))
-        elif self.approbateur_requis == self.Approbateur.RH:
+        elif requis == self.Approbateur.RH:
             approbateurs.extend(User.objects.filter(role=User.Role.RH))
-        elif self.approbateur_requis == self.Approbateur.CHEF_DEPT:
+        elif requis == self.Approbateur.CHEF_DEPT:
             if employe.departement and employe.departement.chef_departement:
                 approbateurs.append(employe.departement.chef_departement)
-        elif self.approbateur_requis == self.Approbateur.CHEF_SERV:
+        elif requis == self.Approbateur.CHEF_SERV:
             if employe.service and employe.service.chef_service:
                 approbateurs.append(employe.service.chef_service)
-        elif self.approbateur_requis == self.Approbateur.DIRECTEUR:
+        elif requis == self.Approbateur.DIRECTEUR:
             if employe.direction and employe.direction.directeur:
                 approbateurs.append(employe.direction.directeur)
         
         return approbateurs
 
 
+class EtapeApprobation(models.Model):
+    """Étape du circuit d'approbation d'un type de congé (voir conges.circuits)"""
+    type_conge = models.ForeignKey(TypeConge, on_delete=models.CASCADE, related_name='etapes')
+    ordre = models.PositiveSmallIntegerField()
+    approbateur = models.CharField(max_length=20, choices=TypeConge.Approbateur.choices)
+    seuil_jours = models.PositiveSmallIntegerField(
+        default=0, help_text="L'étape ne s'applique qu'au-delà de ce nombre de jours ouvrables (0 : toujours)")
+    escalade_apres_jours = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        help_text="Sans décision après ce délai, la demande est aussi soumise à l'approbateur d'escalade")
+    escalade_vers = models.CharField(max_length=20, choices=TypeConge.Approbateur.choices, blank=True)
+
+    def __str__(self):
+        return f"{self.type_conge} : étape {self.ordre} ({self.get_approbateur_display()})"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if bool(self.escalade_apres_jours) != bool(self.escalade_vers):
+            raise ValidationError("Le délai et l'approbateur d'escalade vont ensemble")
+
+    class Meta:
+        ordering = ['type_conge', 'ordre']
+        constraints = [
+            models.UniqueConstraint(fields=['type_conge', 'ordre'], name='etape_type_ordre_unique'),
+        ]
+        verbose_name = "Étape d'approbation"
+        verbose_name_plural = "Étapes d'approbation"
+
+
+class DemandeCongeQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Demandes des employés que `user` peut voir (voir conges.portees)"""
+        from .portees import TOUT, portee
+
+        visibles = portee(user)
+        return self if visibles == TOUT else self.filter(employe_id__in=visibles)
+
+    def a_traiter_par(self, user):
+        """Demandes que `user` peut traiter : celles qu'il voit s'il est manager,
+        RH ou administrateur, et celles dont il approuve l'étape en cours
+        (voir conges.affectations)"""
+        from .portees import TOUT, portee
+
+        affectee = models.Exists(AffectationApprobation.objects.filter(demande=models.OuterRef("pk"),
+                                                                       approbateur=user))
+        if not (user.is_manager() or user.is_rh() or user.is_admin()):
+            return self.filter(affectee)
+        visibles = portee(user)
+        return self if visibles == TOUT else self.filter(models.Q(employe_id__in=visibles) | affectee)
+
+
 class DemandeConge(models.Model):
     class Statut(models.TextChoices):
         EN_ATTENTE = 'EN_ATTENTE', 'En attente'
@@ -275,11 +401,26 @@ class DemandeConge(models.Model):
     date_debut = models.DateField()
     date_fin = models.DateField()
     motif_demande = models.TextField()
-    justificatif = models.FileField(upload_to='justificatifs/', blank=True, null=True)
+    justificatif = models.FileField(upload_to='justificatifs/', storage=stockage_justificatifs,
+                                    blank=True, null=True)
 
     statut = models.CharField(max_length=20, choices=Statut.choices, default=Statut.EN_ATTENTE)
     priorite = models.CharField(max_length=20, choices=Priorite.choices, default=Priorite.NORMALE)
     date_demande = models.DateTimeField(auto_now_add=True)
+    # Incrémentée à chaque transition de statut (voir conges.transitions)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # Jours réservés sur le solde annuel tant que la demande est en attente
+    jours_reserves = models.PositiveIntegerField(default=0, editable=False)
+    # Jours ouvrables de la période selon le calendrier de l'employé, calculés à
+    # l'enregistrement et recalculés quand le calendrier change (conges.calendriers)
+    jours_ouvrables = models.PositiveIntegerField(default=0, editable=False)
+    # Circuit d'approbation fixé à la soumission et indice de l'étape en
+    # cours ; échéance d'escalade de cette étape, effacée une fois escaladée
+    # (voir conges.circuits)
+    circuit = models.JSONField(default=list, editable=False)
+    etape = models.PositiveSmallIntegerField(default=0, editable=False)
+    escalade_a = models.DateTimeField(null=True, blank=True, editable=False)
+    escaladee = models.BooleanField(default=False, editable=False)
 
     # Traitement de la demande
     approbateur = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, 
@@ -293,10 +434,26 @@ class DemandeConge(models.Model):
                                   related_name='remplacements')
     instructions_remplacement = models.TextField(blank=True)
 
+    objects = DemandeCongeQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date_demande']
         verbose_name = "Demande de congé"
         verbose_name_plural = "Demandes de congé"
+        indexes = [
+            # Tri par défaut et validateurs HTTP (date de dernière modification)
+            models.Index(fields=['date_demande'], name='demande_date_demande_idx'),
+            models.Index(fields=['date_traitement'], name='demande_date_traitement_idx'),
+            # Demandes en attente depuis longtemps (conges.rappels)
+            models.Index(fields=['statut', 'date_demande'], name='demande_statut_date_idx'),
+            # Absences et charge de remplacement sur une période (conges.remplacements). Pas
+            # d'index partiel : les statuts sont des paramètres de la requête, que SQLite ne
+            # peut pas comparer à la condition de l'index.
+            models.Index(fields=['employe', 'statut', 'date_fin', 'date_debut'], name='demande_employe_periode_idx'),
+            models.Index(fields=['remplacant', 'statut', 'date_fin'], name='demande_remplacant_idx'),
+            # Étapes dont le délai d'escalade est dépassé (conges.circuits)
+            models.Index(fields=['statut', 'escalade_a'], name='demande_escalade_idx'),
+        ]
 
     def clean(self):
         from django.core.exceptions import ValidationError
@@ -312,22 +469,80 @@ class DemandeConge(models.Model):
                 if self.priorite != self.Priorite.URGENTE:
                     raise ValidationError(f"Un préavis de {self.type_conge.delai_prevenance_jours} jours est requis")
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'date_debut', 'date_fin', 'employe'} & set(update_fields):
+            self.jours_ouvrables = self.employe.calculer_jours_ouvrables(self.date_debut, self.date_fin)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'jours_ouvrables'}
+        if self._state.adding and not self.circuit:
+            from .circuits import circuit, echeance_escalade
+            self.circuit = circuit(self.type_conge_id, self.jours_ouvrables)
+            self.escalade_a = echeance_escalade(self.circuit[0], timezone.now())
+        super().save(*args, **kwargs)
+
     def nombre_jours_demandes(self):
-        return self.employe.calculer_jours_ouvrables(self.date_debut, self.date_fin)
+        if self.pk is None:
+            return self.employe.calculer_jours_ouvrables(self.date_debut, self.date_fin)
+        return self.jours_ouvrables
 
     def peut_etre_approuve(self):
         if self.type_conge.nom == TypeConge.Type.ANNUEL:
             return self.nombre_jours_demandes() <= self.employe.conges_restants()
         return True
 
+    def etape_en_cours(self):
+        """Étape du circuit en attente de décision ; le seul approbateur du type
+        pour une demande sans circuit enregistré"""
+        if self.etape < len(self.circuit):
+            return self.circuit[self.etape]
+        return {"approbateur": self.type_conge.approbateur_requis}
+
+    def est_derniere_etape(self):
+        return self.etape + 1 >= len(self.circuit)
+
     def get_approbateurs_possibles(self):
-        """Retourne la liste des approbateurs possibles pour cette demande"""
-        return self.type_conge.get_approbateurs_possibles(self.employe)
+        """Retourne la liste des approbateurs possibles pour cette demande, à l'étape en cours"""
+        return self.type_conge.get_approbateurs_possibles(self.employe, self.etape_en_cours()["approbateur"])
 
     def __str__(self):
         return f"{self.employe.get_full_name()} - {self.type_conge} ({self.date_debut} au {self.date_fin})"
 
 
+class AffectationApprobation(models.Model):
+    """Approbateur possible d'une demande en attente (voir conges.affectations).
+
+    Table dérivée de DemandeConge.get_approbateurs_possibles() : remplie à la
+    soumission et à chaque étape du circuit, vidée à la sortie de l'attente,
+    recalculée quand l'organigramme change. Le type, la priorité et la date
+    de la demande y sont recopiés pour que la boîte d'un approbateur se lise
+    sur ses index.
+    """
+    demande = models.ForeignKey(DemandeConge, on_delete=models.CASCADE, related_name='affectations')
+    approbateur = models.ForeignKey(User, on_delete=models.CASCADE, related_name='affectations_approbation')
+    type_conge = models.ForeignKey(TypeConge, on_delete=models.CASCADE, related_name='+')
+    priorite = models.CharField(max_length=20, choices=DemandeConge.Priorite.choices)
+    date_demande = models.DateTimeField()
+    # Approbateur ajouté par l'escalade de l'étape en cours
+    escalade = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Demande {self.demande_id} → {self.approbateur_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['demande', 'approbateur'], name='affectation_unique'),
+        ]
+        indexes = [
+            # Boîte d'approbation : liste par ancienneté, compteurs par type et priorité
+            models.Index(fields=['approbateur', 'date_demande'], name='affectation_boite_idx'),
+            models.Index(fields=['approbateur', 'type_conge', 'priorite', 'date_demande'],
+                         name='affectation_compteurs_idx'),
+        ]
+        verbose_name = "Affectation d'approbation"
+        verbose_name_plural = "Affectations d'approbation"
+
+
 class NotificationConge(models.Model):
     class TypeNotification(models.TextChoices):
         NOUVELLE_DEMANDE = 'NOUVELLE_DEMANDE', 'Nouvelle demande'
@@ -355,6 +570,8 @@ class NotificationConge(models.Model):
     
     # Pour éviter la surcharge admin
     visible_admin = models.BooleanField(default=False)
+    # Tranche d'envoi d'un rappel d'approbation (conges.rappels)
+    echeance = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.get_type_notification_display()} pour {self.destinataire.username} - {'Lu' if self.lu else 'Non lu'}"
@@ -369,6 +586,15 @@ class NotificationConge(models.Model):
         ordering = ['-date_creation']
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
+        indexes = [
+            # Lecture incrémentale « notifications postérieures au dernier id reçu »
+            models.Index(fields=['destinataire', 'id'], name='notif_destinataire_id_idx'),
+            models.Index(fields=['destinataire', 'date_creation'], name='notif_destinataire_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['demande', 'destinataire', 'echeance'],
+                                    condition=models.Q(echeance__isnull=False), name='rappel_unique_par_echeance'),
+        ]
 
     @classmethod
     def creer_notifications(cls, demande, type_notification, exclure_admin=True):
@@ -424,8 +650,26 @@ class NotificationConge(models.Model):
         return notifications_creees
 
 
+class HistoriqueQuerySet(models.QuerySet):
+    def chronologie_demande(self, demande_id):
+        """Historique complet d'une demande, du plus ancien au plus récent, en une requête"""
+        return (self.filter(demande_id=demande_id)
+                .select_related("utilisateur")
+                .order_by("date_action", "id"))
+
+    def chronologie_utilisateur(self, user_id):
+        """Actions effectuées par un utilisateur, les plus récentes d'abord, en une requête"""
+        return (self.filter(utilisateur_id=user_id)
+                .select_related("demande__employe", "demande__type_conge")
+                .order_by("-date_action", "-id"))
+
+
 class HistoriqueConge(models.Model):
-    """Historique des actions sur les demandes de congé"""
+    """Historique des actions sur les demandes de congé.
+
+    Journal en ajout seul, alimenté par conges.audit : une entrée enregistrée
+    n'est jamais modifiée.
+    """
     demande = models.ForeignKey(DemandeConge, on_delete=models.CASCADE, related_name='historique')
     utilisateur = models.ForeignKey(User, on_delete=models.CASCADE)
     action = models.CharField(max_length=50)
@@ -433,11 +677,194 @@ class HistoriqueConge(models.Model):
     nouveau_statut = models.CharField(max_length=20, blank=True)
     commentaire = models.TextField(blank=True)
     date_action = models.DateTimeField(auto_now_add=True)
-    
+
+    objects = HistoriqueQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.action} par {self.utilisateur.username} le {self.date_action}"
-    
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("L'historique est en ajout seul : une entrée ne peut pas être modifiée")
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-date_action']
+        indexes = [
+            # Chronologies par demande et par utilisateur (HistoriqueQuerySet)
+            models.Index(fields=['demande', 'date_action'], name='historique_demande_date_idx'),
+            models.Index(fields=['utilisateur', 'date_action'], name='historique_utilisateur_idx'),
+        ]
         verbose_name = "Historique de congé"
-        verbose_name_plural = "Historique des congés"
\ No newline at end of file
+        verbose_name_plural = "Historique des congés"
+
+
+class DemandeArchiveeQuerySet(models.QuerySet):
+    # Même portée que les demandes courantes (conges.portees)
+    visible_to = DemandeCongeQuerySet.visible_to
+
+
+class DemandeArchivee(models.Model):
+    """Demande de congé clôturée, sortie des tables courantes (voir conges.archives).
+
+    Garde l'identifiant de la demande d'origine. Son historique et ses
+    notifications y sont recopiés en listes JSON : une demande archivée se
+    lit en une ligne, et les tables courantes ne portent plus ces lignes.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    employe = models.ForeignKey(User, on_delete=models.CASCADE, related_name='demandes_archivees')
+    type_conge = models.ForeignKey(TypeConge, on_delete=models.CASCADE, related_name='+')
+    date_debut = models.DateField()
+    date_fin = models.DateField()
+    motif_demande = models.TextField()
+    # Nom du fichier dans le stockage des justificatifs, qui n'est pas déplacé
+    justificatif = models.CharField(max_length=100, blank=True)
+    statut = models.CharField(max_length=20, choices=DemandeConge.Statut.choices)
+    priorite = models.CharField(max_length=20, choices=DemandeConge.Priorite.choices)
+    date_demande = models.DateTimeField()
+    jours_ouvrables = models.PositiveIntegerField(default=0)
+    circuit = models.JSONField(default=list)
+    approbateur = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    date_traitement = models.DateTimeField(null=True, blank=True)
+    motif_rejet = models.TextField(blank=True)
+    commentaire_approbateur = models.TextField(blank=True)
+    remplacant = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    instructions_remplacement = models.TextField(blank=True)
+
+    historique = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    notifications = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    date_archivage = models.DateTimeField(auto_now_add=True)
+
+    objects = DemandeArchiveeQuerySet.as_manager()
+
+    def __str__(self):
+        return f"Demande archivée {self.pk} ({self.date_debut} au {self.date_fin})"
+
+    class Meta:
+        ordering = ['-date_demande']
+        indexes = [
+            # Demandes archivées d'un employé, jours consommés d'une année
+            models.Index(fields=['employe', 'date_debut'], name='archive_employe_debut_idx'),
+        ]
+        verbose_name = "Demande archivée"
+        verbose_name_plural = "Demandes archivées"
+
+
+class SoldeConge(models.Model):
+    """Solde de congés annuels d'un employé pour une année.
+
+    Les jours des demandes en attente y sont réservés par un UPDATE
+    conditionnel (voir conges.soldes) : des demandes simultanées ne peuvent
+    pas dépasser ensemble le solde.
+    """
+    employe = models.ForeignKey(User, on_delete=models.CASCADE, related_name='soldes')
+    annee = models.PositiveSmallIntegerField()
+    jours_droits = models.PositiveIntegerField()
+    jours_pris = models.PositiveIntegerField(default=0)
+    jours_reserves = models.PositiveIntegerField(default=0)
+    # Clôture annuelle (voir conges.cloture) : jours reportés de l'année
+    # précédente, inclus dans jours_droits, et date de clôture de cette année
+    jours_reportes = models.PositiveIntegerField(default=0)
+    date_cloture = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.employe.username} {self.annee} : {self.jours_disponibles} jours disponibles"
+
+    @property
+    def jours_disponibles(self):
+        return self.jours_droits - self.jours_pris - self.jours_reserves
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employe', 'annee'], name='solde_employe_annee_unique'),
+        ]
+        verbose_name = "Solde de congés"
+        verbose_name_plural = "Soldes de congés"
+
+
+class AcquisitionMensuelle(models.Model):
+    """Droits à congé annuel acquis par un employé au cours d'un mois (voir conges.acquisitions)"""
+    employe = models.ForeignKey(User, on_delete=models.CASCADE, related_name='acquisitions')
+    annee = models.PositiveSmallIntegerField()
+    mois = models.PositiveSmallIntegerField()
+    jours_acquis = models.DecimalField(max_digits=5, decimal_places=2)
+    # Total acquis depuis le début de l'année, ce mois compris
+    jours_cumules = models.DecimalField(max_digits=6, decimal_places=2)
+    date_calcul = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.employe.username} {self.mois:02d}/{self.annee} : {self.jours_acquis} jours"
+
+    class Meta:
+        ordering = ['annee', 'mois']
+        constraints = [
+            models.UniqueConstraint(fields=['employe', 'annee', 'mois'], name='acquisition_employe_mois_unique'),
+        ]
+        verbose_name = "Acquisition mensuelle"
+        verbose_name_plural = "Acquisitions mensuelles"
+
+
+class LotCloture(models.Model):
+    """Lot d'employés (plage d'identifiants) de la clôture d'une année.
+
+    Un lot est traité dans sa propre transaction, qui renseigne aussi
+    date_traitement : une clôture interrompue reprend aux lots restants.
+    """
+    annee = models.PositiveSmallIntegerField()
+    borne_min = models.BigIntegerField()
+    borne_max = models.BigIntegerField()
+    nombre_employes = models.PositiveIntegerField()
+    date_traitement = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Clôture {self.annee} : employés {self.borne_min} à {self.borne_max}"
+
+    class Meta:
+        ordering = ['annee', 'borne_min']
+        constraints = [
+            models.UniqueConstraint(fields=['annee', 'borne_min'], name='lot_cloture_unique'),
+        ]
+        verbose_name = "Lot de clôture annuelle"
+        verbose_name_plural = "Lots de clôture annuelle"
+
+
+class Tache(models.Model):
+    """Travail en arrière-plan de la file d'attente en base (voir conges.taches)"""
+    class Statut(models.TextChoices):
+        EN_ATTENTE = 'EN_ATTENTE', 'En attente'
+        EN_COURS = 'EN_COURS', 'En cours'
+        TERMINEE = 'TERMINEE', 'Terminée'
+        ECHOUEE = 'ECHOUEE', 'Échouée'
+
+    nom = models.CharField(max_length=100)
+    parametres = models.JSONField(default=dict, blank=True)
+    priorite = models.SmallIntegerField(default=0, help_text="Les plus grandes valeurs passent en premier")
+    statut = models.CharField(max_length=20, choices=Statut.choices, default=Statut.EN_ATTENTE)
+
+    # Prise en charge : une tâche EN_COURS dont disponible_a est dépassé est
+    # considérée comme abandonnée par son travailleur et peut être reprise.
+    disponible_a = models.DateTimeField(default=timezone.now)
+    travailleur = models.CharField(max_length=100, blank=True)
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    tentatives_max = models.PositiveSmallIntegerField(default=3)
+
+    progression = models.PositiveSmallIntegerField(default=0)
+    message = models.CharField(max_length=200, blank=True)
+    resultat = models.JSONField(null=True, blank=True)
+    erreur = models.TextField(blank=True)
+
+    cree_par = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='taches')
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.nom} #{self.pk} ({self.get_statut_display()})"
+
+    class Meta:
+        ordering = ['-date_creation']
+        indexes = [
+            # Recherche de la prochaine tâche à prendre en charge
+            models.Index(fields=['statut', '-priorite', 'disponible_a'], name='tache_file_idx'),
+        ]
+        verbose_name = "Tâche"
+        verbose_name_plural = "Tâches"
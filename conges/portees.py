@@ -0,0 +1,106 @@
+"""
+Portées de visibilité : quels employés (et donc quelles demandes) un
+utilisateur peut voir.
+
+Règles, par rôle :
+- RH et administrateurs : tout le monde ;
+- directeur / chef de service / chef de département : les employés de sa
+  direction / son service / son département ;
+- manager : son équipe directe ;
+- dans tous les cas, l'utilisateur lui-même.
+
+La portée d'un utilisateur est compilée une fois en liste d'identifiants
+d'employés et mise en cache ; elle s'applique ensuite comme un seul
+prédicat indexé (employe_id IN (…) ou id IN (…)) par
+DemandeConge.objects.visible_to() et User.objects.visible_to().
+
+Les portées en cache sont versionnées par une génération de l'organigramme,
+incrémentée (via les signaux) à chaque changement d'organisation : création
+ou suppression d'un utilisateur, modification de son rôle, de son
+rattachement ou de son manager, modification des directions, services et
+départements. Les écritures qui ne passent pas par save()/delete()
+(QuerySet.update) doivent appeler invalider_portees() elles-mêmes.
+"""
+import time
+
+from django.core.cache import cache
+
+# Sentinelle mise en cache pour « aucune restriction »
+TOUT = "*"
+DUREE_PORTEES = 24 * 3600
+
+_CLE_GENERATION = "conges:generation:organisation"
+
+# Champs de User dont dépendent les portées
+CHAMPS_ORGANISATION = ("role", "direction_id", "service_id", "departement_id", "manager_id", "is_active")
+
+
+def generation_organisation():
+    valeur = cache.get(_CLE_GENERATION)
+    if valeur is None:
+        # Horodatée, comme conges.cache.generation : pas de réutilisation d'un numéro après éviction
+        cache.add(_CLE_GENERATION, time.time_ns(), None)
+        valeur = cache.get(_CLE_GENERATION)
+    return valeur
+
+
+def invalider_portees():
+    try:
+        cache.incr(_CLE_GENERATION)
+    except ValueError:
+        cache.set(_CLE_GENERATION, time.time_ns(), None)
+
+
+def portee(user):
+    """Identifiants des employés visibles par `user` (frozenset), ou TOUT"""
+    # Mémorisée aussi sur l'instance : plusieurs visible_to() d'une même requête HTTP
+    generation = generation_organisation()
+    memoire = getattr(user, "_portee", None)
+    if memoire and memoire[0] == generation:
+        return memoire[1]
+
+    cle = f"conges:portee:{user.pk}:{generation}"
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = compiler(user)
+        cache.set(cle, valeur if valeur == TOUT else sorted(valeur), DUREE_PORTEES)
+    valeur = valeur if valeur == TOUT else frozenset(valeur)
+    user._portee = (generation, valeur)
+    return valeur
+
+
+def compiler(user):
+    """Portée calculée en base : au plus une requête"""
+    from .models import User
+
+    if user.is_rh() or user.is_admin() or user.is_superuser:
+        return TOUT
+    if user.is_directeur() and user.direction_id:
+        filtre = {"direction_id": user.direction_id}
+    elif user.is_chef_service() and user.service_id:
+        filtre = {"service_id": user.service_id}
+    elif user.is_chef_departement() and user.departement_id:
+        filtre = {"departement_id": user.departement_id}
+    elif user.is_manager():
+        filtre = {"manager_id": user.pk}
+    else:
+        return {user.pk}
+    return set(User.objects.filter(**filtre).values_list("pk", flat=True)) | {user.pk}
+
+
+def _organisation(user):
+    # Sans charger les champs différés (only/defer)
+    return tuple(vars(user).get(champ) for champ in CHAMPS_ORGANISATION)
+
+
+def memoriser_organisation(user):
+    user._organisation_lue = _organisation(user)
+
+
+def organisation_modifiee(user, created, update_fields=None):
+    if created:
+        return True
+    if update_fields is not None and not {champ.removesuffix("_id") for champ in CHAMPS_ORGANISATION} & {
+            champ.removesuffix("_id") for champ in update_fields}:
+        return False
+    return getattr(user, "_organisation_lue", None) != _organisation(user)
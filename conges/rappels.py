@@ -0,0 +1,115 @@
+"""
+Rappels d'approbation (RAPPEL_APPROBATION) pour les demandes en attente.
+
+Les demandes en retard sont lues par l'index (statut, date_demande) : le
+coût d'un passage dépend du nombre de demandes en retard, pas de la taille
+de la table. Leurs approbateurs sont lus en une requête dans
+AffectationApprobation (conges.affectations) : ce sont ceux de la boîte
+d'approbation, escalade comprise. Chaque approbateur reçoit un seul rappel
+récapitulatif par passage ; un approbateur déjà relancé depuis moins de
+`intervalle` n'est pas relancé.
+
+Chaque rappel porte son échéance, le début de la tranche d'`intervalle`
+où il est envoyé. La contrainte d'unicité (demande, destinataire,
+échéance) écarte le doublon de deux passages simultanés, que la lecture
+des rappels récents ne voit pas tant que l'autre n'est pas validé.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalider_utilisateurs
+from .diffusion import diffuseur
+from .models import AffectationApprobation, DemandeConge, NotificationConge, User
+
+DELAI_RAPPEL = timedelta(hours=getattr(settings, "CONGES_DELAI_RAPPEL_HEURES", 48))
+INTERVALLE_RAPPELS = timedelta(hours=24)
+# Demandes détaillées dans le message d'un rappel
+DEMANDES_PAR_RAPPEL = 10
+
+EPOQUE = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def approbateurs_par_demande(demandes):
+    """{demande.pk: [ids des approbateurs]} en une requête, d'après les
+    affectations de l'étape en cours (voir conges.affectations)"""
+    resultat = {demande.pk: [] for demande in demandes}
+    affectations = AffectationApprobation.objects.filter(demande_id__in=resultat).order_by()
+    for demande_id, approbateur_id in affectations.values_list("demande_id", "approbateur_id"):
+        resultat[demande_id].append(approbateur_id)
+    return resultat
+
+
+def echeance(maintenant, intervalle=INTERVALLE_RAPPELS):
+    """Début de la tranche d'`intervalle` contenant `maintenant`"""
+    tranches = (maintenant - EPOQUE) // intervalle
+    return EPOQUE + tranches * intervalle
+
+
+def envoyer_rappels(delai=DELAI_RAPPEL, intervalle=INTERVALLE_RAPPELS, maintenant=None):
+    """Crée un rappel récapitulatif par approbateur ayant des demandes en
+    attente depuis plus de `delai`. Retourne le nombre de rappels créés."""
+    maintenant = maintenant or timezone.now()
+    en_retard = list(
+        DemandeConge.objects.filter(statut=DemandeConge.Statut.EN_ATTENTE, date_demande__lt=maintenant - delai)
+        .select_related("type_conge", "employe")
+        .order_by("date_demande")
+    )
+    if not en_retard:
+        return 0
+
+    approbateurs = approbateurs_par_demande(en_retard)
+    demandes_par_approbateur = defaultdict(list)
+    for demande in en_retard:
+        for approbateur_id in approbateurs[demande.pk]:
+            demandes_par_approbateur[approbateur_id].append(demande)
+
+    # Dans la transaction : deux passages simultanés ne relancent pas deux fois
+    with transaction.atomic():
+        deja_relances = set(NotificationConge.objects.filter(
+            destinataire_id__in=demandes_par_approbateur,
+            type_notification=NotificationConge.TypeNotification.RAPPEL_APPROBATION,
+            date_creation__gte=maintenant - intervalle,
+        ).values_list("destinataire_id", flat=True))
+        # Comme creer_notifications : pas de rappel aux administrateurs
+        administrateurs = set(User.objects.filter(pk__in=demandes_par_approbateur, role=User.Role.ADMIN)
+                              .values_list("pk", flat=True))
+        rappels = [
+            _rappel(approbateur_id, demandes, maintenant, echeance(maintenant, intervalle))
+            for approbateur_id, demandes in demandes_par_approbateur.items()
+            if approbateur_id not in deja_relances and approbateur_id not in administrateurs
+        ]
+        # Le rappel d'un passage concurrent déjà validé est ignoré
+        NotificationConge.objects.bulk_create(rappels, ignore_conflicts=True)
+        # bulk_create ne déclenche pas les signaux (cache et diffusion en direct)
+        destinataires = [rappel.destinataire_id for rappel in rappels]
+        transaction.on_commit(lambda: _signaler(destinataires))
+    return len(rappels)
+
+
+def _rappel(approbateur_id, demandes, maintenant, echeance_rappel):
+    lignes = [
+        f"- {d.employe.get_full_name() or d.employe.username} : {d.type_conge} du {d.date_debut} au {d.date_fin} "
+        f"(en attente depuis {(maintenant - d.date_demande).days} jours)"
+        for d in demandes[:DEMANDES_PAR_RAPPEL]
+    ]
+    if len(demandes) > DEMANDES_PAR_RAPPEL:
+        lignes.append(f"… et {len(demandes) - DEMANDES_PAR_RAPPEL} autres")
+    return NotificationConge(
+        demande=demandes[0],  # la plus ancienne
+        destinataire_id=approbateur_id,
+        type_notification=NotificationConge.TypeNotification.RAPPEL_APPROBATION,
+        destinataire_type=NotificationConge.Destinataire.APPROBATEUR,
+        titre=f"Rappel : {len(demandes)} demande(s) de congé en attente de votre décision",
+        message="\n".join(lignes),
+        echeance=echeance_rappel,
+    )
+
+
+def _signaler(destinataires):
+    invalider_utilisateurs(*destinataires)
+    for destinataire_id in destinataires:
+        diffuseur.publier(destinataire_id)
@@ -0,0 +1,64 @@
+"""
+Suggestion de remplaçants pour une demande de congé.
+
+Les candidats sont les collègues actifs de la direction de l'employé (voir
+collegues()) qui n'ont aucune demande en attente ou approuvée chevauchant la période. Ils
+sont classés par proximité dans l'organigramme (même département, même
+service, même direction), puis par charge de remplacement (remplacements
+en cours ou à venir déjà acceptés), puis par nom.
+
+Le tout est une seule requête. Les chevauchements sont cherchés par
+NOT EXISTS sur l'index (employe, statut, date_fin, date_debut), et la
+charge par un sous-comptage sur l'index (remplacant, statut, date_fin) :
+le coût dépend du nombre de candidats, pas du volume de demandes. Ces
+index ne sont pas partiels (voir DemandeConge.Meta) : le filtre sur les
+demandes actives porte sur leur colonne statut.
+"""
+from datetime import date
+
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import DemandeConge, User
+
+STATUTS_ACTIFS = (DemandeConge.Statut.EN_ATTENTE, DemandeConge.Statut.APPROUVE)
+SUGGESTIONS_DEFAUT = 10
+
+MEME_DEPARTEMENT, MEME_SERVICE, MEME_DIRECTION = 0, 1, 2
+
+
+def absences(date_debut, date_fin):
+    """Demandes actives chevauchant [date_debut, date_fin]"""
+    return DemandeConge.objects.filter(statut__in=STATUTS_ACTIFS, date_fin__gte=date_debut, date_debut__lte=date_fin)
+
+
+def est_disponible(user_id, date_debut, date_fin):
+    return not absences(date_debut, date_fin).filter(employe_id=user_id).exists()
+
+
+def collegues(employe):
+    """Remplaçants possibles : collègues actifs du plus large rattachement
+    connu de l'employé (direction, à défaut service, à défaut département)"""
+    actifs = User.objects.filter(is_active=True).exclude(pk=employe.pk)
+    for champ in ("direction_id", "service_id", "departement_id"):
+        if getattr(employe, champ):
+            return actifs.filter(**{champ: getattr(employe, champ)})
+    return actifs
+
+
+def suggerer_remplacants(employe, date_debut, date_fin, limite=SUGGESTIONS_DEFAUT):
+    """Collègues disponibles sur toute la période, annotés de `proximite` et `charge`, les meilleurs d'abord"""
+    proximite = Case(
+        *(When(**{champ: valeur}, then=Value(rang)) for champ, valeur, rang in (
+            ("departement_id", employe.departement_id, MEME_DEPARTEMENT),
+            ("service_id", employe.service_id, MEME_SERVICE),
+        ) if valeur),
+        default=Value(MEME_DIRECTION), output_field=IntegerField(),
+    )
+    charge = (DemandeConge.objects.filter(remplacant_id=OuterRef("pk"), statut__in=STATUTS_ACTIFS,
+                                          date_fin__gte=date.today())
+              .order_by().values("remplacant_id").annotate(nombre=Count("pk")).values("nombre"))
+    return (collegues(employe)
+            .filter(~Exists(absences(date_debut, date_fin).filter(employe_id=OuterRef("pk"))))
+            .annotate(proximite=proximite, charge=Coalesce(Subquery(charge), 0))
+            .order_by("proximite", "charge", "last_name", "first_name", "pk")[:limite])
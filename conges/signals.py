@@ -0,0 +1,183 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .affectations import ROLES, affecter, demandes_concernees
+from .audit import enregistrer_transition, memoriser_statut
+from .cache import invalider_utilisateurs
+from .calendriers import invalider_calendriers
+from .diffusion import diffuseur
+from .models import (CalendrierFeries, Departement, DemandeConge, Direction, EtapeApprobation, JourFerie,
+                     NotificationConge, Service, SoldeConge, TypeConge, User)
+from .portees import CHAMPS_ORGANISATION, invalider_portees, memoriser_organisation, organisation_modifiee
+from .simulation import invalider_types
+from .soldes import solder_reservation
+from .taches import mettre_en_file
+
+# Champs d'une demande dont dépendent ses approbateurs
+CHAMPS_AFFECTATION = {"statut", "type_conge", "type_conge_id", "employe", "employe_id", "priorite"}
+# Champs de User qui désignent les responsables de l'employé
+CHAMPS_RESPONSABLES = ("manager_id", "direction_id", "service_id", "departement_id")
+UNITES = {Direction: "direction_id", Service: "service_id", Departement: "departement_id"}
+
+
+def _reaffecter(criteres):
+    # Recalcul en arrière-plan des approbateurs des demandes en attente
+    # concernées (conges.affectations), s'il y en a
+    if demandes_concernees(**criteres).exists():
+        mettre_en_file("affecter_approbateurs", criteres)
+
+
+@receiver(post_save, sender=NotificationConge)
+def diffuser_notification(sender, instance, created, **kwargs):
+    """Réveille les connexions SSE / long-polling du destinataire une fois la notification validée"""
+    if created:
+        destinataire_id = instance.destinataire_id
+        transaction.on_commit(lambda: diffuseur.publier(destinataire_id))
+
+
+@receiver([post_save, post_delete], sender=DemandeConge)
+def invalider_cache_demande(sender, instance, **kwargs):
+    # Après validation : une lecture concurrente ne peut pas remettre en cache l'état précédent
+    employe_id = instance.employe_id
+    transaction.on_commit(lambda: invalider_utilisateurs(employe_id))
+
+
+@receiver([post_save, post_delete], sender=NotificationConge)
+def invalider_cache_notification(sender, instance, **kwargs):
+    destinataire_id = instance.destinataire_id
+    transaction.on_commit(lambda: invalider_utilisateurs(destinataire_id))
+
+
+@receiver([post_save, post_delete], sender=SoldeConge)
+def invalider_cache_solde(sender, instance, **kwargs):
+    # Soldes en cache pour la simulation de demandes (conges.simulation)
+    employe_id = instance.employe_id
+    transaction.on_commit(lambda: invalider_utilisateurs(employe_id))
+
+
+@receiver(post_save, sender=User)
+def invalider_cache_droits(sender, instance, created, update_fields=None, **kwargs):
+    # Droits annuels : base d'un solde pas encore créé (conges.soldes)
+    if not created and (update_fields is None or "jours_conges_annuels" in update_fields):
+        user_id = instance.pk
+        transaction.on_commit(lambda: invalider_utilisateurs(user_id))
+
+
+@receiver([post_save, post_delete], sender=TypeConge)
+@receiver([post_save, post_delete], sender=EtapeApprobation)
+def invalider_cache_types(sender, **kwargs):
+    # Types en cache pour la simulation, et règles des circuits d'approbation (conges.circuits)
+    transaction.on_commit(invalider_types)
+
+
+@receiver(post_init, sender=DemandeConge)
+def memoriser_statut_demande(sender, instance, **kwargs):
+    memoriser_statut(instance)
+
+
+@receiver(post_save, sender=DemandeConge)
+def journaliser_transition(sender, instance, created, using, raw=False, **kwargs):
+    if not raw:
+        enregistrer_transition(instance, created, using=using)
+
+
+@receiver(post_save, sender=DemandeConge)
+def affecter_demande(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Boîtes des approbateurs (conges.affectations) : à la soumission, et
+    # quand l'administration modifie une demande. Les transitions passent par
+    # un UPDATE et retirent elles-mêmes la demande.
+    if raw:
+        return
+    demande = DemandeConge.objects.filter(pk=instance.pk)
+    if created:
+        if instance.statut == DemandeConge.Statut.EN_ATTENTE:
+            affecter(demande, remplacer=False)
+    elif update_fields is None or CHAMPS_AFFECTATION & set(update_fields):
+        affecter(demande)
+
+
+@receiver(post_delete, sender=DemandeConge)
+def liberer_reservation(sender, instance, **kwargs):
+    # Suppression d'une demande en attente (administration) : ses jours redeviennent disponibles
+    if instance.statut == DemandeConge.Statut.EN_ATTENTE and instance.jours_reserves:
+        solder_reservation(instance.employe_id, instance.date_debut.year, instance.jours_reserves,
+                           consommer=False)
+
+
+@receiver(post_init, sender=User)
+def memoriser_organisation_utilisateur(sender, instance, **kwargs):
+    memoriser_organisation(instance)
+
+
+@receiver(post_save, sender=User)
+def invalider_portees_utilisateur(sender, instance, created, update_fields=None, **kwargs):
+    # Les connexions (last_login) et autres modifications du profil ne touchent pas aux portées
+    if organisation_modifiee(instance, created, update_fields):
+        lue = dict(zip(CHAMPS_ORGANISATION, instance._organisation_lue))
+        if not created and lue["direction_id"] != instance.direction_id:
+            # Changement de direction, donc peut-être de calendrier de jours fériés
+            mettre_en_file("recalculer_jours_ouvrables", {"employe_id": instance.pk})
+        # Approbateurs des demandes en attente (conges.affectations) : ceux de
+        # l'employé, et tous si l'utilisateur entre dans un rôle dont les
+        # titulaires approuvent (ou en sort)
+        if not created and any(lue[champ] != getattr(instance, champ) for champ in CHAMPS_RESPONSABLES):
+            _reaffecter({"employe_id": instance.pk})
+        if (created or lue["role"] != instance.role) and {lue["role"], instance.role} & set(ROLES.values()):
+            _reaffecter({})
+        memoriser_organisation(instance)
+        transaction.on_commit(invalider_portees)
+
+
+@receiver(post_delete, sender=User)
+@receiver([post_save, post_delete], sender=Direction)
+@receiver([post_save, post_delete], sender=Service)
+@receiver([post_save, post_delete], sender=Departement)
+def invalider_portees_organisation(sender, **kwargs):
+    transaction.on_commit(invalider_portees)
+
+
+@receiver([post_save, post_delete], sender=Direction)
+@receiver([post_save, post_delete], sender=Service)
+@receiver([post_save, post_delete], sender=Departement)
+def reaffecter_unite(sender, instance, raw=False, **kwargs):
+    # Responsable d'une direction, d'un service ou d'un département peut-être changé
+    if raw or kwargs.get("created"):
+        return
+    # À la suppression, les employés sont détachés sans signal (SET_NULL) :
+    # toutes les demandes en attente
+    _reaffecter({UNITES[sender]: instance.pk} if kwargs["signal"] is post_save else {})
+
+
+@receiver(post_init, sender=Direction)
+def memoriser_calendrier_direction(sender, instance, **kwargs):
+    # Sans charger le champ s'il est différé (only/defer)
+    instance._calendrier_lu = vars(instance).get("calendrier_id")
+
+
+@receiver([post_save, post_delete], sender=CalendrierFeries)
+@receiver([post_save, post_delete], sender=JourFerie)
+@receiver([post_save, post_delete], sender=Direction)
+def invalider_calendriers_modifies(sender, instance, raw=False, **kwargs):
+    if sender is Direction and kwargs["signal"] is post_save and not kwargs["created"]:
+        calendrier_lu, instance._calendrier_lu = instance._calendrier_lu, vars(instance).get("calendrier_id")
+        if calendrier_lu == instance._calendrier_lu:
+            # Nom, directeur… : ni l'attribution des calendriers ni les jours ouvrables ne changent
+            return
+    transaction.on_commit(invalider_calendriers)
+    if raw:
+        return
+    # Jours ouvrables enregistrés sur les demandes : recalculés en arrière-plan,
+    # la tâche étant validée avec la modification
+    if sender is JourFerie:
+        parametres = {"calendrier_id": instance.calendrier_id}
+    elif sender is Direction and kwargs["signal"] is post_save:
+        if kwargs["created"]:
+            return
+        # Calendrier de la direction changé
+        parametres = {"direction_id": instance.pk}
+    else:
+        # Pays, calendrier par défaut, suppressions : les directions concernées
+        # passent au calendrier par défaut sans signal (SET_NULL)
+        parametres = {}
+    mettre_en_file("recalculer_jours_ouvrables", parametres)
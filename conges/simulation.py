@@ -0,0 +1,128 @@
+"""
+Simulation de demandes de congé (« et si je posais ces dates ? »), pour le
+formulaire de création : jours ouvrables, solde projeté et conflits de
+plusieurs périodes candidates, sans rien enregistrer.
+
+Tout est calculé en mémoire à partir de données en cache :
+- les calendriers de jours fériés (conges.calendriers) ;
+- les types de congé actifs, versionnés par une génération incrémentée à
+  chaque modification d'un type ;
+- la situation de l'employé (soldes par année, demandes en attente ou
+  approuvées non terminées), versionnée par sa génération (conges.cache),
+  incrémentée à chaque écriture sur ses demandes ou ses soldes.
+
+Une simulation sur cache chaud ne fait aucune requête ; le résultat reste
+indicatif, la réservation à l'enregistrement (conges.soldes) fait foi.
+"""
+import time
+from datetime import date, timedelta
+
+from django.core.cache import cache
+
+from .cache import DUREE_FRAGMENTS, cle_fragment, generation
+from .calendriers import calendrier_employe
+from .models import DemandeConge, SoldeConge, TypeConge
+from .soldes import soldes_initiaux
+
+_CLE_GENERATION_TYPES = "conges:generation:types_conge"
+
+STATUTS_ACTIFS = (DemandeConge.Statut.EN_ATTENTE, DemandeConge.Statut.APPROUVE)
+
+
+def generation_types():
+    valeur = cache.get(_CLE_GENERATION_TYPES)
+    if valeur is None:
+        cache.add(_CLE_GENERATION_TYPES, time.time_ns(), None)
+        valeur = cache.get(_CLE_GENERATION_TYPES)
+    return valeur
+
+
+def invalider_types():
+    try:
+        cache.incr(_CLE_GENERATION_TYPES)
+    except ValueError:
+        cache.set(_CLE_GENERATION_TYPES, time.time_ns(), None)
+
+
+def types_conge():
+    """Types de congé actifs par identifiant : une requête, en cache ensuite"""
+    cle = f"conges:types_conge:{generation_types()}"
+    types = cache.get(cle)
+    if types is None:
+        types = {ligne["id"]: ligne for ligne in TypeConge.objects.filter(actif=True).values(
+            "id", "nom", "duree_max_jours", "delai_prevenance_jours", "necessite_justificatif")}
+        cache.set(cle, types, DUREE_FRAGMENTS)
+    return types
+
+
+def situation(employe):
+    """Soldes par année et demandes actives non terminées de l'employé : deux requêtes, en cache ensuite"""
+    cle = cle_fragment("simulation", employe.pk, generation(employe.pk))
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = {
+            "soldes": {annee: (droits, pris, reserves) for annee, droits, pris, reserves in
+                       SoldeConge.objects.filter(employe=employe).values_list(
+                           "annee", "jours_droits", "jours_pris", "jours_reserves")},
+            "demandes": list(DemandeConge.objects.filter(
+                employe=employe, statut__in=STATUTS_ACTIFS, date_fin__gte=date.today()).order_by(
+                "date_debut").values_list("pk", "date_debut", "date_fin", "statut")),
+        }
+        cache.set(cle, valeur, DUREE_FRAGMENTS)
+    return valeur, cle
+
+
+def _solde(employe, donnees, cle, annee):
+    """(droits, pris, réservés) de l'année ; une ligne pas encore créée est
+    calculée comme à sa création (conges.soldes) et ajoutée au cache"""
+    solde = donnees["soldes"].get(annee)
+    if solde is None:
+        initial = soldes_initiaux([employe], annee)[employe.pk]
+        solde = donnees["soldes"][annee] = (initial.jours_droits, initial.jours_pris, initial.jours_reserves)
+        cache.set(cle, donnees, DUREE_FRAGMENTS)
+    return solde
+
+
+def simuler(employe, periodes, urgent=False):
+    """Résultat de chaque période candidate (date_debut, date_fin, type_conge_id).
+
+    Les périodes sont des alternatives : chacune est évaluée seule, contre
+    le solde et les demandes actuels de l'employé.
+    """
+    calendrier = calendrier_employe(employe)
+    types = types_conge()
+    donnees, cle = situation(employe)
+    aujourd_hui = date.today()
+
+    resultats = []
+    for date_debut, date_fin, type_id in periodes:
+        type_conge = types.get(type_id)
+        erreurs = []
+        if type_conge is None:
+            erreurs.append("Type de congé inconnu ou inactif")
+        if date_fin < date_debut:
+            erreurs.append("La date de fin doit être postérieure à la date de début")
+        jours = calendrier.jours_ouvrables(date_debut, date_fin)
+        resultat = {"date_debut": date_debut, "date_fin": date_fin, "type_conge": type_id,
+                    "jours_ouvrables": jours, "solde": None, "erreurs": erreurs,
+                    "conflits": [{"demande": pk, "date_debut": debut, "date_fin": fin, "statut": statut}
+                                 for pk, debut, fin, statut in donnees["demandes"]
+                                 if debut <= date_fin and fin >= date_debut]}
+        if type_conge is not None:
+            if type_conge["duree_max_jours"] and jours > type_conge["duree_max_jours"]:
+                erreurs.append(f"Durée maximale : {type_conge['duree_max_jours']} jours")
+            delai = type_conge["delai_prevenance_jours"]
+            if not urgent and date_debut - aujourd_hui < timedelta(days=delai):
+                erreurs.append(f"Un préavis de {delai} jours est requis pour ce type de congé (sauf urgence)")
+            if type_conge["nom"] == TypeConge.Type.ANNUEL:
+                droits, pris, reserves = _solde(employe, donnees, cle, date_debut.year)
+                disponible = droits - pris - reserves
+                resultat["solde"] = {"annee": date_debut.year, "disponible": disponible,
+                                     "projete": disponible - jours}
+                if jours > disponible:
+                    erreurs.append(f"Vous demandez {jours} jours mais il vous reste "
+                                   f"seulement {max(disponible, 0)} jours de congé")
+        if resultat["conflits"]:
+            erreurs.append("La période chevauche une demande en attente ou approuvée")
+        resultats.append(resultat)
+    return resultats
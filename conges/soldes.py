@@ -0,0 +1,165 @@
+"""
+Soldes de congés annuels et réservation des jours en attente.
+
+Chaque employé a une ligne SoldeConge par année (année de début des
+demandes). À la création d'une demande de congé annuel, ses jours ouvrables
+sont réservés par un seul UPDATE conditionnel sur cette ligne :
+
+    UPDATE solde SET jours_reserves = jours_reserves + n
+    WHERE employe = … AND annee = … AND jours_reserves <= jours_droits - jours_pris - n
+
+Deux demandes simultanées ne peuvent donc pas dépasser ensemble le solde ;
+seule la ligne concernée est verrouillée, le temps de l'UPDATE. À
+l'approbation les jours réservés deviennent des jours pris ; au rejet ou à
+l'annulation ils sont libérés (voir conges.transitions).
+
+Quand les jours ouvrables des demandes sont recalculés (changement de
+calendrier, conges.calendriers), reconcilier_soldes() recalcule les jours
+pris et réservés des lignes concernées à partir des demandes.
+"""
+import logging
+
+from django.db.models import F, Q, Sum
+from django.db.models.functions import ExtractYear
+
+from .models import DemandeArchivee, DemandeConge, SoldeConge, TypeConge
+
+logger = logging.getLogger(__name__)
+
+
+class SoldeInsuffisant(Exception):
+    def __init__(self, jours_demandes, jours_disponibles):
+        self.jours_demandes = jours_demandes
+        self.jours_disponibles = jours_disponibles
+        super().__init__(f"Vous demandez {jours_demandes} jours mais il vous reste "
+                         f"seulement {max(jours_disponibles, 0)} jours de congé")
+
+
+def solde_annuel(employe, annee):
+    """Solde de l'employé pour l'année, en lecture seule : la ligne
+    enregistrée, à défaut une ligne non enregistrée calculée depuis ses
+    demandes de congé annuel existantes (validation de formulaire, affichage)."""
+    solde = SoldeConge.objects.filter(employe=employe, annee=annee).first()
+    if solde is not None:
+        return solde
+    return soldes_initiaux([employe], annee)[employe.pk]
+
+
+def initialiser_solde(employe, annee):
+    """Ligne de solde enregistrée de l'employé, créée à la première
+    utilisation à partir de ses demandes de congé annuel existantes."""
+    solde = SoldeConge.objects.filter(employe=employe, annee=annee).first()
+    if solde is not None:
+        return solde
+    initial = soldes_initiaux([employe], annee)[employe.pk]
+    solde, _ = SoldeConge.objects.get_or_create(
+        employe=employe, annee=annee,
+        defaults={"jours_droits": initial.jours_droits, "jours_pris": initial.jours_pris,
+                  "jours_reserves": initial.jours_reserves},
+    )
+    return solde
+
+
+def soldes_initiaux(employes, annee):
+    """Lignes de solde (non enregistrées) calculées depuis les demandes
+    existantes, par identifiant d'employé ; une requête quel que soit le
+    nombre d'employés."""
+    par_id = {employe.pk: employe for employe in employes}
+    demandes = DemandeConge.objects.filter(employe_id__in=par_id, date_debut__year=annee,
+                                           type_conge__nom=TypeConge.Type.ANNUEL).order_by()
+    totaux = demandes.filter(statut__in=[DemandeConge.Statut.APPROUVE, DemandeConge.Statut.EN_ATTENTE]).values(
+        "employe_id").annotate(
+        pris=Sum("jours_ouvrables", filter=Q(statut=DemandeConge.Statut.APPROUVE)),
+        reserves=Sum("jours_reserves", filter=Q(statut=DemandeConge.Statut.EN_ATTENTE)),
+    )
+    par_employe = {ligne["employe_id"]: ligne for ligne in totaux}
+    return {
+        pk: SoldeConge(employe_id=pk, annee=annee, jours_droits=employe.jours_conges_annuels,
+                       jours_pris=par_employe.get(pk, {}).get("pris") or 0,
+                       jours_reserves=par_employe.get(pk, {}).get("reserves") or 0)
+        for pk, employe in par_id.items()
+    }
+
+
+def reserver(demande):
+    """Réserve les jours ouvrables d'une nouvelle demande de congé annuel.
+
+    Lève SoldeInsuffisant sans rien modifier si le solde ne suffit pas. À
+    appeler dans la transaction qui enregistre la demande.
+    """
+    if demande.type_conge.nom != TypeConge.Type.ANNUEL:
+        return
+    jours = demande.employe.calculer_jours_ouvrables(demande.date_debut, demande.date_fin)
+    if not jours:
+        return
+    annee = demande.date_debut.year
+    ligne = SoldeConge.objects.filter(employe_id=demande.employe_id, annee=annee)
+    modifiees = _reserver(ligne, jours)
+    if not modifiees:
+        # Ligne absente (première demande de l'année) ou solde insuffisant
+        solde = initialiser_solde(demande.employe, annee)
+        modifiees = _reserver(ligne, jours)
+        if not modifiees:
+            solde.refresh_from_db()
+            raise SoldeInsuffisant(jours, solde.jours_disponibles)
+    demande.jours_reserves = jours
+
+
+def _reserver(ligne, jours):
+    return ligne.filter(jours_reserves__lte=F("jours_droits") - F("jours_pris") - jours).update(
+        jours_reserves=F("jours_reserves") + jours)
+
+
+def solder_reservation(employe_id, annee, jours, consommer):
+    """Libère `jours` réservés ; les compte comme pris si `consommer` (approbation).
+
+    Sans ligne pour l'année, il n'y a rien à faire : la ligne sera calculée
+    depuis les demandes à sa création. Une ligne dont la réservation est
+    inférieure à `jours` n'est pas modifiée : l'écart est journalisé
+    (avertissement) sans bloquer la transition ; reconcilier_soldes() permet de remettre
+    la ligne d'accord avec les demandes.
+    """
+    valeurs = {"jours_reserves": F("jours_reserves") - jours}
+    if consommer:
+        valeurs["jours_pris"] = F("jours_pris") + jours
+    ligne = SoldeConge.objects.filter(employe_id=employe_id, annee=annee)
+    modifiees = ligne.filter(jours_reserves__gte=jours).update(**valeurs)
+    if not modifiees and ligne.exists():
+        logger.warning("Moins de %s jours réservés sur le solde %s de l'employé %s ; solde non modifié",
+                       jours, annee, employe_id)
+    return modifiees
+
+
+def reconcilier_soldes(paires):
+    """Recalcule jours_pris et jours_reserves des lignes de solde existantes
+    des couples (employe_id, annee) de `paires` à partir des demandes de congé
+    annuel, archivées comprises : trois lectures et une mise à jour groupée.
+    Retourne les identifiants des employés dont une ligne a changé."""
+    employes, annees = {employe_id for employe_id, _ in paires}, {annee for _, annee in paires}
+    soldes = [solde for solde in SoldeConge.objects.filter(employe_id__in=employes, annee__in=annees)
+              if (solde.employe_id, solde.annee) in paires]
+    if not soldes:
+        return set()
+
+    totaux = {}
+    for modele, agregats in (
+            (DemandeConge, {"pris": Sum("jours_ouvrables", filter=Q(statut=DemandeConge.Statut.APPROUVE)),
+                            "reserves": Sum("jours_reserves", filter=Q(statut=DemandeConge.Statut.EN_ATTENTE))}),
+            (DemandeArchivee, {"pris": Sum("jours_ouvrables", filter=Q(statut=DemandeConge.Statut.APPROUVE))})):
+        lignes = (modele.objects.filter(employe_id__in=employes, date_debut__year__in=annees,
+                                        type_conge__nom=TypeConge.Type.ANNUEL)
+                  .order_by().annotate(annee=ExtractYear("date_debut")).values("employe_id", "annee")
+                  .annotate(**agregats))
+        for ligne in lignes:
+            total = totaux.setdefault((ligne["employe_id"], ligne["annee"]), {"pris": 0, "reserves": 0})
+            total["pris"] += ligne["pris"] or 0
+            total["reserves"] += ligne.get("reserves") or 0
+
+    modifies = []
+    for solde in soldes:
+        total = totaux.get((solde.employe_id, solde.annee), {"pris": 0, "reserves": 0})
+        if (solde.jours_pris, solde.jours_reserves) != (total["pris"], total["reserves"]):
+            solde.jours_pris, solde.jours_reserves = total["pris"], total["reserves"]
+            modifies.append(solde)
+    SoldeConge.objects.bulk_update(modifies, ["jours_pris", "jours_reserves"], batch_size=500)
+    return {solde.employe_id for solde in modifies}
@@ -0,0 +1,248 @@
+"""
+Stockage des justificatifs adressé par contenu.
+
+- GestionnaireTeleversementJustificatif : gestionnaire d'upload qui calcule
+  l'empreinte SHA-256 au fil des morceaux reçus, contrôle le type réel du
+  fichier (signature des premiers octets) et la taille dès qu'ils sont
+  connus, et abandonne le fichier sans le lire en entier en cas d'échec.
+- StockageJustificatifs : stockage fichier où le nom est dérivé de
+  l'empreinte ; un document déjà présent (même certificat médical déposé
+  deux fois) n'est pas réécrit.
+- servir_fichier : téléchargement en streaming avec prise en charge des
+  requêtes partielles (Range) et de la revalidation (ETag = empreinte).
+"""
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+
+TAILLE_MAX_JUSTIFICATIF = getattr(settings, "JUSTIFICATIF_TAILLE_MAX", 5 * 1024 * 1024)
+
+# Signature (premiers octets) -> (extension, type MIME)
+TYPES_JUSTIFICATIF = [
+    (b"%PDF-", ".pdf", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", ".png", "image/png"),
+    (b"\xff\xd8\xff", ".jpg", "image/jpeg"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", ".doc", "application/msword"),
+    (b"PK\x03\x04", ".docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+]
+LONGUEUR_SIGNATURE = max(len(signature) for signature, _, _ in TYPES_JUSTIFICATIF)
+
+TAILLE_MORCEAU = 64 * 1024
+
+
+def detecter_type(entete):
+    for signature, extension, type_mime in TYPES_JUSTIFICATIF:
+        if entete.startswith(signature):
+            return extension, type_mime
+    return None
+
+
+class GestionnaireTeleversementJustificatif(FileUploadHandler):
+    """Gestionnaire d'upload pour le champ justificatif ; les autres champs
+    fichier sont laissés aux gestionnaires suivants.
+
+    Les refus sont ajoutés à request.erreurs_televersement.
+    """
+
+    champ = "justificatif"
+    MESSAGE_FORMAT = "Format de justificatif non pris en charge (PDF, JPEG, PNG ou Word uniquement)"
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.actif = False
+        self.requete_trop_volumineuse = False
+        if request is not None:
+            request.erreurs_televersement = []
+
+    def signaler(self, message):
+        if self.request is not None:
+            self.request.erreurs_televersement.append(message)
+
+    def refuser(self, message):
+        self.signaler(message)
+        raise SkipFile(message)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Corps de requête déjà trop gros : inutile de lire le fichier
+        self.requete_trop_volumineuse = content_length > TAILLE_MAX_JUSTIFICATIF + TAILLE_MORCEAU
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.actif = field_name == self.champ
+        if not self.actif:
+            return
+        if self.requete_trop_volumineuse:
+            self.refuser(self.message_taille())
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset,
+                                          self.content_type_extra)
+        self.hachage = hashlib.sha256()
+        self.entete = b""
+        self.type = None
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.actif:
+            return raw_data
+        if start + len(raw_data) > TAILLE_MAX_JUSTIFICATIF:
+            self.refuser(self.message_taille())
+        if self.type is None:
+            self.entete += raw_data[:LONGUEUR_SIGNATURE]
+            if len(self.entete) >= LONGUEUR_SIGNATURE:
+                self.type = detecter_type(self.entete)
+                if self.type is None:
+                    self.refuser(self.MESSAGE_FORMAT)
+        self.hachage.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.actif:
+            return None
+        self.actif = False
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.empreinte = self.hachage.hexdigest()
+        self.type = self.type or detecter_type(self.entete)
+        if self.type is None:
+            # Fichier plus court qu'une signature. SkipFile n'est plus possible à
+            # ce stade : le fichier est rendu, l'erreur invalidera le formulaire.
+            self.signaler(self.MESSAGE_FORMAT)
+            self.type = (os.path.splitext(self.file_name or "")[1].lower(), "application/octet-stream")
+        self.file.extension, self.file.content_type = self.type
+        return self.file
+
+    def message_taille(self):
+        return f"Le justificatif dépasse la taille maximale de {TAILLE_MAX_JUSTIFICATIF // (1024 * 1024)} Mo"
+
+
+class StockageJustificatifs(FileSystemStorage):
+    """Fichiers nommés par leur empreinte SHA-256 : justificatifs/ab/abcdef….pdf"""
+
+    dossier = "justificatifs"
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif ne dépend que du contenu (voir _save)
+        return name
+
+    def _save(self, name, content):
+        empreinte = getattr(content, "empreinte", None)
+        if empreinte is None:
+            hachage = hashlib.sha256()
+            for morceau in content.chunks():
+                hachage.update(morceau)
+            empreinte = hachage.hexdigest()
+            content.seek(0)
+        extension = getattr(content, "extension", None) or os.path.splitext(name)[1].lower()
+        nom = f"{self.dossier}/{empreinte[:2]}/{empreinte}{extension}"
+        if self.exists(nom):
+            return nom  # déjà stocké : déduplication
+
+        # Écriture directe plutôt que FileSystemStorage._save : sur un nom déjà
+        # pris, celui-ci redemande un nom à get_available_name(), qui rend le
+        # même, et boucle sans fin. O_EXCL : un seul des envois concurrents
+        # d'un même contenu écrit le fichier.
+        chemin = self.path(nom)
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        try:
+            fd = os.open(chemin, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        except FileExistsError:
+            return nom  # écrit entre-temps par un envoi concurrent du même contenu
+        try:
+            with os.fdopen(fd, "wb") as fichier:
+                for morceau in content.chunks():
+                    fichier.write(morceau)
+        except BaseException:
+            os.unlink(chemin)
+            raise
+        if self.file_permissions_mode is not None:
+            os.chmod(chemin, self.file_permissions_mode)
+        return nom
+
+
+_stockage = StockageJustificatifs()
+
+
+def stockage_justificatifs():
+    return _stockage
+
+
+def empreinte_depuis_nom(nom):
+    return os.path.splitext(os.path.basename(nom))[0]
+
+
+def servir_fichier(request, fichier, nom_telechargement):
+    """Réponse de téléchargement d'un FieldFile stocké par StockageJustificatifs"""
+    etag = f'"{empreinte_depuis_nom(fichier.name)}"'
+    reponse = get_conditional_response(request, etag=etag)
+    if reponse is None:
+        chemin = fichier.path
+        taille = os.path.getsize(chemin)
+        plage = _plage_demandee(request, etag, taille)
+        if plage == "invalide":
+            reponse = HttpResponse(status=416)
+            reponse["Content-Range"] = f"bytes */{taille}"
+        elif plage:
+            debut, fin = plage
+            reponse = StreamingHttpResponse(_lire_plage(chemin, debut, fin), status=206,
+                                            content_type=_type_mime(chemin))
+            reponse["Content-Range"] = f"bytes {debut}-{fin}/{taille}"
+            reponse["Content-Length"] = str(fin - debut + 1)
+        else:
+            # FileResponse utilise wsgi.file_wrapper (sendfile) quand le serveur le propose
+            reponse = FileResponse(open(chemin, "rb"), as_attachment=True, filename=nom_telechargement,
+                                   content_type=_type_mime(chemin))
+    reponse["ETag"] = etag
+    reponse["Accept-Ranges"] = "bytes"
+    # Contenu immuable (adressé par son empreinte), mais personnel
+    patch_cache_control(reponse, private=True, max_age=365 * 24 * 3600, immutable=True)
+    return reponse
+
+
+def _type_mime(chemin):
+    extension = os.path.splitext(chemin)[1]
+    for _, ext, type_mime in TYPES_JUSTIFICATIF:
+        if ext == extension:
+            return type_mime
+    return "application/octet-stream"
+
+
+def _plage_demandee(request, etag, taille):
+    """(début, fin) inclusifs pour une requête Range à plage unique, None pour
+    une réponse complète, "invalide" pour une plage non satisfaisable."""
+    entete = request.headers.get("Range", "")
+    if not entete or request.method != "GET":
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != etag:
+        return None
+    correspondance = re.fullmatch(r"bytes=(\d*)-(\d*)", entete.strip())
+    if not correspondance or correspondance.groups() == ("", ""):
+        return None  # plages multiples ou syntaxe inconnue : réponse complète
+    debut, fin = correspondance.groups()
+    if debut == "":
+        debut, fin = max(0, taille - int(fin)), taille - 1  # suffixe : les N derniers octets
+    else:
+        debut, fin = int(debut), min(int(fin) if fin else taille - 1, taille - 1)
+    if debut > fin or debut >= taille:
+        return "invalide"
+    return debut, fin
+
+
+def _lire_plage(chemin, debut, fin):
+    with open(chemin, "rb") as fichier:
+        fichier.seek(debut)
+        restant = fin - debut + 1
+        while restant > 0:
+            morceau = fichier.read(min(TAILLE_MORCEAU, restant))
+            if not morceau:
+                break
+            restant -= len(morceau)
+            yield morceau
@@ -0,0 +1,139 @@
+"""
+File de tâches en arrière-plan, stockée dans la base de l'application
+(modèle Tache), sans courtier externe.
+
+- mettre_en_file() enregistre une tâche ; les vues n'attendent pas son
+  exécution et suivent son état par une lecture de sa ligne.
+- Les travailleurs (commande lancer_taches) prennent en charge les tâches
+  par priorité décroissante avec un UPDATE conditionnel : une tâche n'est
+  prise que par un seul travailleur, sans verrou de table.
+- Une prise en charge vaut pour un délai de visibilité, prolongé à chaque
+  progression() ; passé ce délai, un travailleur arrêté en cours de route
+  est considéré comme perdu et la tâche est reprise par un autre.
+- Une tâche en échec est retentée avec un délai croissant, jusqu'à
+  tentatives_max.
+
+Les fonctions exécutables sont déclarées avec le décorateur @tache("nom")
+(voir conges.travaux) et reçoivent le contexte d'exécution puis les
+paramètres de la tâche ; leur valeur de retour (sérialisable en JSON) est
+enregistrée comme résultat.
+"""
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tache
+
+Statut = Tache.Statut
+
+TACHES = {}
+DELAI_VISIBILITE = timedelta(minutes=5)
+ATTENTE_FILE_VIDE = 1.0  # secondes entre deux recherches quand la file est vide
+CANDIDATS = 10  # tâches examinées par tentative de prise en charge
+
+
+class TachePerdue(Exception):
+    """La prise en charge a expiré et la tâche a été reprise par un autre travailleur"""
+
+
+def tache(nom):
+    """Décorateur : rend la fonction exécutable par la file sous ce nom"""
+    def enregistrer(fonction):
+        TACHES[nom] = fonction
+        return fonction
+    return enregistrer
+
+
+def mettre_en_file(nom, parametres=None, priorite=0, tentatives_max=3, cree_par=None):
+    if nom not in TACHES:
+        raise ValueError(f"Tâche inconnue : {nom}")
+    return Tache.objects.create(nom=nom, parametres=parametres or {}, priorite=priorite,
+                                tentatives_max=tentatives_max, cree_par=cree_par)
+
+
+def identifiant_travailleur():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def prendre_tache(travailleur, delai_visibilite=DELAI_VISIBILITE):
+    """Prend en charge la prochaine tâche disponible, ou retourne None"""
+    maintenant = timezone.now()
+    candidats = (Tache.objects.filter(statut__in=[Statut.EN_ATTENTE, Statut.EN_COURS], disponible_a__lte=maintenant)
+                 .order_by("-priorite", "disponible_a").values_list("pk", "statut", "disponible_a")[:CANDIDATS])
+    for pk, statut, disponible_a in candidats:
+        # Compare-and-swap sur l'état lu : un seul travailleur gagne
+        prise = Tache.objects.filter(pk=pk, statut=statut, disponible_a=disponible_a).update(
+            statut=Statut.EN_COURS, travailleur=travailleur, disponible_a=maintenant + delai_visibilite,
+            tentatives=F("tentatives") + 1)
+        if prise:
+            return Tache.objects.get(pk=pk)
+    return None
+
+
+class Contexte:
+    """Passé aux fonctions de tâche : identité de la tâche et suivi de progression"""
+
+    def __init__(self, tache, delai_visibilite=DELAI_VISIBILITE):
+        self.tache = tache
+        self.delai_visibilite = delai_visibilite
+
+    def progression(self, pourcentage, message=""):
+        """Enregistre l'avancement et prolonge la prise en charge"""
+        if not _verrou(self.tache).update(progression=max(0, min(int(pourcentage), 100)), message=message[:200],
+                                          disponible_a=timezone.now() + self.delai_visibilite):
+            raise TachePerdue()
+
+
+def _verrou(tache):
+    # Les écritures de fin ne s'appliquent que si ce travailleur détient encore la tâche
+    return Tache.objects.filter(pk=tache.pk, statut=Statut.EN_COURS, travailleur=tache.travailleur)
+
+
+def delai_nouvelle_tentative(tentatives):
+    return timedelta(seconds=30 * 2 ** (tentatives - 1))
+
+
+def executer_tache(tache, delai_visibilite=DELAI_VISIBILITE):
+    fonction = TACHES.get(tache.nom)
+    try:
+        if fonction is None:
+            raise LookupError(f"Tâche inconnue : {tache.nom}")
+        if tache.tentatives > tache.tentatives_max:
+            raise RuntimeError("Travailleur perdu à chaque tentative")
+        resultat = fonction(Contexte(tache, delai_visibilite), **tache.parametres)
+    except TachePerdue:
+        return
+    except Exception:
+        erreur = traceback.format_exc()
+        maintenant = timezone.now()
+        if fonction is not None and tache.tentatives < tache.tentatives_max:
+            _verrou(tache).update(statut=Statut.EN_ATTENTE, erreur=erreur,
+                                  disponible_a=maintenant + delai_nouvelle_tentative(tache.tentatives))
+        else:
+            _verrou(tache).update(statut=Statut.ECHOUEE, erreur=erreur, date_fin=maintenant)
+        return
+    _verrou(tache).update(statut=Statut.TERMINEE, resultat=resultat, progression=100, date_fin=timezone.now())
+
+
+def travailler(travailleur=None, jusqu_a_file_vide=False, delai_visibilite=DELAI_VISIBILITE):
+    """Boucle d'un travailleur ; retourne le nombre de tâches exécutées"""
+    travailleur = travailleur or identifiant_travailleur()
+    executees = 0
+    while True:
+        # Comme entre deux requêtes HTTP ; pas à l'intérieur d'une transaction de l'appelant
+        if not connection.in_atomic_block:
+            close_old_connections()
+        tache_prise = prendre_tache(travailleur, delai_visibilite)
+        if tache_prise is None:
+            if jusqu_a_file_vide:
+                return executees
+            time.sleep(ATTENTE_FILE_VIDE)
+            continue
+        executer_tache(tache_prise, delai_visibilite)
+        executees += 1
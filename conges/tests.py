@@ -1,3 +1,1500 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.admin import site
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .acquisitions import calculer_acquisitions
+from .affectations import reaffecter
+from .archives import archiver
+from .audit import Action
+from .calendriers import calendrier_employe
+from .circuits import escalader
+from .demarrage import mesurer as mesurer_demarrage
+from .cloture import cloturer_lot, planifier_lots
+from .diffusion import attendre_notifications, diffuseur
+from .forms import DemandeCongeForm
+from .jeu_donnees import JeuDonnees
+from .models import (AcquisitionMensuelle, AffectationApprobation, CalendrierFeries, DemandeArchivee, DemandeConge,
+                     Direction, EtapeApprobation, HistoriqueConge, JourFerie, LotCloture, NotificationConge, Service,
+                     SoldeConge, Tache, TypeConge, User)
+from .portees import generation_organisation, portee
+from .rappels import envoyer_rappels
+from .remplacements import suggerer_remplacants
+from .soldes import SoldeInsuffisant, initialiser_solde, reserver, solde_annuel, solder_reservation
+from .stockage import StockageJustificatifs, stockage_justificatifs
+from .taches import executer_tache, mettre_en_file, prendre_tache, tache, travailler
+from .transitions import ConflitTransition, TransitionInvalide, effectuer_transition
+
+
+# Nombre maximal de requêtes SQL autorisé par vue, quelle que soit la volumétrie.
+# Augmenter un budget doit rester une décision consciente.
+BUDGETS_REQUETES = {
+    "dashboard": 4,
+    "creer_demande_conge (GET)": 4,
+    # POST : transaction (2), insertion groupée du journal d'audit (1),
+    # réservation du solde (1), chargement des calendriers de jours fériés
+    # (2, conges.calendriers) et des règles des circuits d'approbation (1,
+    # conges.circuits), en cache ensuite, et affectation aux approbateurs
+    # (2, conges.affectations) comprises
+    "creer_demande_conge (POST)": 17,
+    "liste_demandes": 6,
+    # Managers : compilation de la portée (conges.portees), en cache ensuite
+    "liste_demandes (filtrée)": 8,
+    "traiter_demande (GET)": 4,
+    # Retrait de la boîte des approbateurs compris
+    "traiter_demande (POST)": 10,
+    "boite_approbation": 4,
+    "notifications": 4,
+    "marquer_notification_lue": 4,
+    # API : session et utilisateur, puis une requête par page (par niveau pour l'organigramme)
+    "api_demandes": 3,
+    "api_demandes (champs liés, filtrée)": 6,
+    "api_notifications": 3,
+    # Plus le contrôle de la ligne de l'année (à défaut, solde calculé)
+    "api_soldes": 4,
+    "api_organisation": 5,
+    # Cache froid : calendriers (2), types de congé (1), soldes et demandes de
+    # l'employé (2) ; l'utilisateur seulement ensuite
+    "api_simulation": 7,
+    "api_remplacants": 3,
+    "api_archives": 3,
+}
+
+
+def normaliser_sql(sql):
+    """Remplace les littéraux d'une requête pour regrouper les requêtes identiques"""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(\.\d+)?\b", "?", sql)
+    return re.sub(r"\bIN \([?, ]+\)", "IN (...)", sql)
+
+
+def decrire_requetes(requetes):
+    """Résumé lisible des requêtes capturées, les doublons (N+1) en premier"""
+    compteur = Counter(normaliser_sql(q["sql"]) for q in requetes)
+    lignes = [f"{nb}x {sql}" for sql, nb in compteur.most_common() if nb > 1]
+    if lignes:
+        lignes.insert(0, "Requêtes dupliquées :")
+    lignes.append("Toutes les requêtes :")
+    lignes.extend(f"  {q['sql']}" for q in requetes)
+    return "\n".join(lignes)
+
+
+class BudgetRequetesTests(TestCase):
+    """Chaque vue est exécutée à deux volumétries : le nombre de requêtes doit
+    rester identique et ne pas dépasser le budget déclaré."""
+
+    PETITE_ECHELLE = (2, 2)  # (employés, demandes par employé)
+    GRANDE_ECHELLE = (10, 6)
+
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.jeu.ajouter_employes(*self.PETITE_ECHELLE)
+        self.employe = self.jeu.employes[0]
+
+    def agrandir(self):
+        nb_employes, nb_demandes = self.GRANDE_ECHELLE
+        self.jeu.ajouter_demandes(self.jeu.employes, nb_demandes - self.PETITE_ECHELLE[1])
+        self.jeu.ajouter_employes(nb_employes - self.PETITE_ECHELLE[0], nb_demandes)
+
+    def mesurer(self, appel):
+        # Mesure du chemin sans cache (le pire cas), travail différé au commit compris
+        cache.clear()
+        with CaptureQueriesContext(connection) as contexte, self.captureOnCommitCallbacks(execute=True):
+            reponse = appel()
+        self.assertLess(reponse.status_code, 400)
+        return contexte.captured_queries
+
+    def assertBudgetRequetes(self, nom, appel, preparer=None):
+        """Mesure `appel` avant et après agrandissement du jeu de données.
+        `preparer` (facultatif) est rappelé avant chaque mesure."""
+        if preparer:
+            preparer()
+        petite = self.mesurer(appel)
+        self.agrandir()
+        if preparer:
+            preparer()
+        grande = self.mesurer(appel)
+
+        budget = BUDGETS_REQUETES[nom]
+        if len(grande) != len(petite):
+            self.fail(f"{nom} : {len(petite)} requêtes à petite échelle, {len(grande)} à grande "
+                      f"échelle (chargement ligne par ligne ?)\n{decrire_requetes(grande)}")
+        if len(grande) > budget:
+            self.fail(f"{nom} : {len(grande)} requêtes pour un budget de {budget}\n"
+                      f"{decrire_requetes(grande)}")
+
+    def test_dashboard(self):
+        self.client.force_login(self.employe)
+        self.assertBudgetRequetes("dashboard", lambda: self.client.get(reverse("dashboard")))
+
+    def test_creer_demande_conge_get(self):
+        self.client.force_login(self.employe)
+        self.assertBudgetRequetes("creer_demande_conge (GET)",
+                                  lambda: self.client.get(reverse("creer_demande_conge")))
+
+    def test_creer_demande_conge_post(self):
+        self.client.force_login(self.employe)
+        debut = date.today() + timedelta(days=400)
+        donnees = {
+            "type_conge": self.jeu.type_annuel.pk,
+            "date_debut": debut,
+            "date_fin": debut,
+            "motif_demande": "Vacances",
+            "priorite": DemandeConge.Priorite.NORMALE,
+        }
+
+        def appel():
+            reponse = self.client.post(reverse("creer_demande_conge"), donnees)
+            self.assertRedirects(reponse, reverse("dashboard"), fetch_redirect_response=False)
+            return reponse
+
+        # Régime établi : la ligne de solde de l'année existe déjà
+        self.assertBudgetRequetes("creer_demande_conge (POST)", appel,
+                                  preparer=lambda: initialiser_solde(self.employe, debut.year))
+
+    def test_liste_demandes(self):
+        self.client.force_login(self.jeu.rh)
+        self.assertBudgetRequetes("liste_demandes", lambda: self.client.get(reverse("liste_demandes")))
+
+    def test_liste_demandes_filtree(self):
+        self.client.force_login(self.jeu.manager)
+        filtres = {"statut": DemandeConge.Statut.EN_ATTENTE, "employe": self.employe.pk}
+        self.assertBudgetRequetes("liste_demandes (filtrée)",
+                                  lambda: self.client.get(reverse("liste_demandes"), filtres))
+
+    def test_traiter_demande_get(self):
+        self.client.force_login(self.jeu.manager)
+        demande = self.jeu.demandes[0]
+        self.assertBudgetRequetes("traiter_demande (GET)",
+                                  lambda: self.client.get(reverse("traiter_demande", args=[demande.pk])))
+
+    def test_traiter_demande_post(self):
+        self.client.force_login(self.jeu.rh)
+        demande = self.jeu.demandes[0]
+
+        versions = []
+
+        def remettre_en_attente():
+            DemandeConge.objects.filter(pk=demande.pk).update(statut=DemandeConge.Statut.EN_ATTENTE)
+            versions.append(DemandeConge.objects.values_list("version", flat=True).get(pk=demande.pk))
+
+        def appel():
+            reponse = self.client.post(reverse("traiter_demande", args=[demande.pk]),
+                                       {"statut": DemandeConge.Statut.APPROUVE, "version": versions[-1]})
+            self.assertRedirects(reponse, reverse("liste_demandes"), fetch_redirect_response=False)
+            return reponse
+
+        self.assertBudgetRequetes("traiter_demande (POST)", appel, preparer=remettre_en_attente)
+        demande.refresh_from_db()
+        self.assertEqual((demande.statut, demande.version), (DemandeConge.Statut.APPROUVE, versions[-1] + 1))
+
+    def test_boite_approbation(self):
+        self.client.force_login(self.jeu.manager)
+        self.assertBudgetRequetes("boite_approbation", lambda: self.client.get(reverse("boite_approbation")))
+
+    def test_notifications(self):
+        self.client.force_login(self.jeu.manager)
+        self.assertBudgetRequetes("notifications", lambda: self.client.get(reverse("notifications")))
+
+    def test_marquer_notification_lue(self):
+        self.client.force_login(self.jeu.manager)
+        notification = NotificationConge.objects.filter(destinataire=self.jeu.manager).first()
+
+        def marquer_non_lue():
+            NotificationConge.objects.filter(pk=notification.pk).update(lu=False)
+
+        self.assertBudgetRequetes(
+            "marquer_notification_lue",
+            lambda: self.client.get(reverse("marquer_notification_lue", args=[notification.pk])),
+            preparer=marquer_non_lue,
+        )
+
+    def test_api_demandes(self):
+        self.client.force_login(self.jeu.rh)
+        self.assertBudgetRequetes("api_demandes", lambda: self.client.get(reverse("api_demandes")))
+
+    def test_api_demandes_champs_lies(self):
+        self.client.force_login(self.jeu.manager)
+        parametres = {"champs": "id,type,employe.nom,approbateur.nom,remplacant.id",
+                      "statut": DemandeConge.Statut.APPROUVE, "employe": self.employe.pk}
+        self.assertBudgetRequetes("api_demandes (champs liés, filtrée)",
+                                  lambda: self.client.get(reverse("api_demandes"), parametres))
+
+    def test_api_notifications(self):
+        self.client.force_login(self.jeu.manager)
+        self.assertBudgetRequetes("api_notifications", lambda: self.client.get(
+            reverse("api_notifications"), {"champs": "id,titre,demande.statut"}))
+
+    def test_api_soldes(self):
+        self.client.force_login(self.jeu.rh)
+        self.assertBudgetRequetes("api_soldes", lambda: self.client.get(
+            reverse("api_soldes"), {"employe": self.employe.pk}),
+            preparer=lambda: initialiser_solde(self.employe, date.today().year))
+
+    def test_api_organisation(self):
+        self.client.force_login(self.employe)
+        self.assertBudgetRequetes("api_organisation", lambda: self.client.get(reverse("api_organisation")))
+
+    def test_api_remplacants(self):
+        self.client.force_login(self.employe)
+        debut = date.today() + timedelta(days=30)
+        self.assertBudgetRequetes("api_remplacants", lambda: self.client.get(
+            reverse("api_remplacants"), {"date_debut": debut, "date_fin": debut + timedelta(days=4)}))
+
+    def test_api_archives(self):
+        self.client.force_login(self.jeu.rh)
+        self.assertBudgetRequetes("api_archives", lambda: self.client.get(
+            reverse("api_archives"), {"champs": "id,type,employe.nom,approbateur.nom"}),
+            preparer=lambda: archiver(date.max))
+
+    def test_api_simulation(self):
+        self.client.force_login(self.employe)
+        debut = date.today() + timedelta(days=30)
+        periodes = [f"{debut + timedelta(days=7 * n)},{debut + timedelta(days=7 * n + 4)},{self.jeu.type_annuel.pk}"
+                    for n in range(5)]
+        self.assertBudgetRequetes("api_simulation", lambda: self.client.get(
+            reverse("api_simulation"), {"periode": periodes}),
+            preparer=lambda: initialiser_solde(self.employe, debut.year))
+
+
+class AdminListesTests(TestCase):
+    """Listes de l'admin : même nombre de requêtes quel que soit le volume"""
+
+    BUDGET = 8
+
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.jeu.ajouter_employes(2, 2)
+        self.admin = User.objects.create_superuser("admin_test", "admin@example.com", "secret")
+        self.client.force_login(self.admin)
+        mettre_en_file("envoyer_rappels", cree_par=self.admin)
+
+    def compter(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as contexte:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return contexte.captured_queries
+
+    def test_listes_en_requetes_fixes(self):
+        urls = [reverse(f"admin:conges_{modele._meta.model_name}_changelist")
+                for modele in site._registry if modele._meta.app_label == "conges"]
+        petite = {url: self.compter(url) for url in urls}
+        self.jeu.ajouter_employes(8, 6)
+        calculer_acquisitions(date.today().year, 1)
+        mettre_en_file("envoyer_rappels", cree_par=self.jeu.rh)
+        for url in urls:
+            grande = self.compter(url)
+            self.assertEqual(len(grande), len(petite[url]), f"{url}\n{decrire_requetes(grande)}")
+            self.assertLessEqual(len(grande), self.BUDGET, f"{url}\n{decrire_requetes(grande)}")
+
+    def test_total_estime_sans_comptage(self):
+        url = reverse("admin:conges_demandeconge_changelist")
+        DemandeConge.objects.filter(pk=self.jeu.demandes[0].pk).update(
+            date_demande=timezone.now() - timedelta(days=800))
+        with mock.patch("conges.admin.SEUIL_COMPTAGE_ESTIME", 1):
+            requetes = [q["sql"] for q in self.compter(url)]
+            self.assertFalse([sql for sql in requetes if "COUNT(" in sql.upper()], requetes)
+            # Années de la hiérarchie de dates déduites des bornes, sans DISTINCT sur la table
+            self.assertFalse([sql for sql in requetes if "DISTINCT" in sql.upper()], requetes)
+            # Une liste filtrée reste comptée exactement
+            filtree = [q["sql"] for q in self.compter(url + "?statut__exact=EN_ATTENTE")]
+            self.assertTrue([sql for sql in filtree if "COUNT(" in sql.upper()], filtree)
+
+    def test_decision_et_journal_en_lecture_seule(self):
+        demande = self.jeu.demandes[0]
+        url = reverse("admin:conges_demandeconge_change", args=[demande.pk])
+        formulaire = self.client.get(url).context["adminform"].form
+        for champ in ("statut", "approbateur", "date_traitement"):
+            self.assertNotIn(champ, formulaire.fields)
+        historique = HistoriqueConge.objects.create(demande=demande, utilisateur=self.admin, action=Action.CREATION)
+        url = reverse("admin:conges_historiqueconge_delete", args=[historique.pk])
+        self.assertEqual(self.client.post(url, {"post": "yes"}).status_code, 403)
+        self.assertTrue(HistoriqueConge.objects.filter(pk=historique.pk).exists())
+
+    def test_autocompletion_sans_requete_par_ligne(self):
+        url = reverse("admin:autocomplete")
+        parametres = {"app_label": "conges", "model_name": "departement", "field_name": "service"}
+        petite = self.compter(url + "?" + urlencode(parametres))
+        for numero in range(5):
+            Service.objects.create(nom=f"Service {numero}", code=f"S{numero}", direction=self.jeu.direction)
+        self.assertEqual(len(self.compter(url + "?" + urlencode(parametres))), len(petite))
+
+
+class PorteesTests(TestCase):
+    def setUp(self):
+        cache.clear()  # portées d'un test précédent, mêmes identifiants
+        self.jeu = JeuDonnees()
+        self.jeu.ajouter_employes(2, 2)
+        self.autre = JeuDonnees(prefixe="autre")
+        self.autre.ajouter_employes(2, 2)
+
+    def test_liste_demandes_limitee_a_la_portee(self):
+        self.client.force_login(self.jeu.manager)
+        demandes = self.client.get(reverse("liste_demandes")).context["demandes"]
+        self.assertEqual({d.employe_id for d in demandes}, {e.pk for e in self.jeu.employes})
+        autre_demande = self.autre.demandes[0]
+        self.assertEqual(self.client.get(reverse("traiter_demande", args=[autre_demande.pk])).status_code, 404)
+
+        self.client.force_login(self.jeu.rh)
+        self.assertEqual(len(self.client.get(reverse("liste_demandes")).context["demandes"]),
+                         DemandeConge.objects.count())
+
+    def test_portee_compilee_une_fois(self):
+        visibles = set(User.objects.visible_to(self.jeu.manager).values_list("pk", flat=True))
+        self.assertEqual(visibles, {self.jeu.manager.pk} | {e.pk for e in self.jeu.employes})
+        manager = User.objects.get(pk=self.jeu.manager.pk)
+        with self.assertNumQueries(1):  # la liste, sans recalcul de la portée
+            list(DemandeConge.objects.visible_to(manager))
+
+    def test_invalidation_sur_changement_d_organisation(self):
+        muté = self.autre.employes[0]
+        self.assertNotIn(muté.pk, portee(self.jeu.manager))
+        with self.captureOnCommitCallbacks(execute=True):
+            muté.manager = self.jeu.manager
+            muté.save()
+        self.assertIn(muté.pk, portee(User.objects.get(pk=self.jeu.manager.pk)))
+
+        # Une connexion (last_login) ne touche pas à l'organisation
+        generation = generation_organisation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(muté)
+        self.assertEqual(generation_organisation(), generation)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.jeu.ajouter_employes(3, 4)
+        self.employe = self.jeu.employes[0]
+
+    def test_pagination_par_curseur(self):
+        self.client.force_login(self.jeu.rh)
+        ids, curseur = [], None
+        while True:
+            parametres = {"limite": 5, "champs": "id"}
+            if curseur:
+                parametres["curseur"] = curseur
+            reponse = self.client.get(reverse("api_demandes"), parametres).json()
+            ids.extend(demande["id"] for demande in reponse["resultats"])
+            curseur = reponse["suivant"]
+            if not curseur:
+                break
+        self.assertEqual(ids, list(DemandeConge.objects.order_by("-pk").values_list("pk", flat=True)))
+
+    def test_champs_choisis_et_portee_employe(self):
+        self.client.force_login(self.employe)
+        reponse = self.client.get(reverse("api_demandes"), {"champs": "id,employe.nom,approbateur.id"}).json()
+        self.assertEqual(len(reponse["resultats"]), 4)
+        for demande in reponse["resultats"]:
+            self.assertEqual(set(demande), {"id", "employe", "approbateur"})
+            self.assertEqual(demande["employe"]["nom"], self.employe.get_full_name() or self.employe.username)
+
+        autre = DemandeConge.objects.exclude(employe=self.employe).first()
+        self.assertEqual(self.client.get(reverse("api_demande", args=[autre.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("api_soldes"), {"employe": autre.employe_id}).status_code, 403)
+
+    def test_soldes_sans_ligne_enregistree(self):
+        self.client.force_login(self.employe)
+        annee = date.today().year
+        attendu = solde_annuel(self.employe, annee)
+        self.assertFalse(SoldeConge.objects.filter(employe=self.employe, annee=annee).exists())
+        resultats = self.client.get(reverse("api_soldes"), {"champs": "id,annee,jours_disponibles"}).json()["resultats"]
+        self.assertEqual(resultats, [{"id": None, "annee": annee, "jours_disponibles": attendu.jours_disponibles}])
+
+        initialiser_solde(self.employe, annee)
+        resultats = self.client.get(reverse("api_soldes"), {"annee": annee}).json()["resultats"]
+        self.assertEqual(len(resultats), 1)
+        self.assertEqual(resultats[0]["jours_disponibles"], attendu.jours_disponibles)
+
+    def test_erreurs(self):
+        self.assertEqual(self.client.get(reverse("api_demandes")).status_code, 401)
+        self.client.force_login(self.jeu.rh)
+        self.assertEqual(self.client.get(reverse("api_demandes"), {"champs": "id,mot_de_passe"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_demandes"), {"curseur": "@@"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_demandes"), {"statut": "INCONNU"}).status_code, 400)
+
+    def test_organigramme(self):
+        self.client.force_login(self.employe)
+        directions = self.client.get(reverse("api_organisation")).json()["directions"]
+        self.assertEqual(directions[0]["services"][0]["departements"][0]["id"], self.jeu.departement.pk)
+
+    def test_simulation(self):
+        cache.clear()
+        self.client.force_login(self.employe)
+        existante = DemandeConge.objects.filter(employe=self.employe, statut=DemandeConge.Statut.EN_ATTENTE).first()
+        annuel = self.jeu.type_annuel.pk
+        periodes = [f"{existante.date_debut},{existante.date_fin},{annuel}",
+                    f"{existante.date_fin + timedelta(days=10)},{existante.date_fin + timedelta(days=400)},{annuel}"]
+        resultats = self.client.get(reverse("api_simulation"), {"periode": periodes}).json()["resultats"]
+
+        self.assertEqual(resultats[0]["jours_ouvrables"], existante.jours_ouvrables)
+        self.assertEqual([conflit["demande"] for conflit in resultats[0]["conflits"]], [existante.pk])
+        solde = solde_annuel(self.employe, existante.date_debut.year)
+        self.assertEqual(resultats[0]["solde"]["disponible"], solde.jours_disponibles)
+        self.assertEqual(resultats[0]["solde"]["projete"], solde.jours_disponibles - existante.jours_ouvrables)
+        self.assertFalse(resultats[1]["conflits"])
+        self.assertTrue(any("il vous reste" in erreur for erreur in resultats[1]["erreurs"]))
+
+        # Cache chaud : l'utilisateur seulement (session en cache)
+        with self.assertNumQueries(1):
+            self.client.get(reverse("api_simulation"), {"periode": periodes})
+        # Une nouvelle demande invalide la situation en cache
+        with self.captureOnCommitCallbacks(execute=True):
+            DemandeConge.objects.create(
+                employe=self.employe, type_conge=self.jeu.type_maladie, motif_demande="Examen",
+                date_debut=existante.date_fin + timedelta(days=20), date_fin=existante.date_fin + timedelta(days=21))
+        resultats = self.client.get(reverse("api_simulation"), {"periode": periodes}).json()["resultats"]
+        self.assertEqual(len(resultats[1]["conflits"]), 1)
+
+        self.assertEqual(self.client.get(reverse("api_simulation"), {"periode": "2024-07-01"}).status_code, 400)
+
+
+class NotificationsDirectTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.jeu.ajouter_employes(1, 3)
+        self.employe = self.jeu.employes[0]
+
+    def creer_notification(self):
+        return NotificationConge.objects.create(
+            demande=self.jeu.demandes[0], destinataire=self.employe,
+            type_notification=NotificationConge.TypeNotification.DEMANDE_APPROUVEE,
+            destinataire_type=NotificationConge.Destinataire.EMPLOYE,
+            titre="Demande de congé approuvée", message="Bonne nouvelle",
+        )
+
+    def test_long_polling_repond_immediatement_si_notification_plus_recente(self):
+        dernier = NotificationConge.objects.filter(destinataire=self.employe).order_by("id").last()
+        nouvelle = self.creer_notification()
+        self.client.force_login(self.employe)
+        reponse = self.client.get(reverse("attente_notifications"), {"depuis": dernier.pk})
+        self.assertEqual(reponse.json()["dernier_id"], nouvelle.pk)
+        self.assertEqual([n["id"] for n in reponse.json()["notifications"]], [nouvelle.pk])
+
+    def test_flux_borne_sous_wsgi(self):
+        dernier = NotificationConge.objects.filter(destinataire=self.employe).order_by("id").last()
+        nouvelle = self.creer_notification()
+        self.client.force_login(self.employe)
+        reponse = self.client.get(reverse("flux_notifications"), HTTP_LAST_EVENT_ID=str(dernier.pk))
+        self.assertFalse(reponse.streaming)
+        self.assertEqual(reponse["Content-Type"], "text/event-stream")
+        self.assertIn(f"id: {nouvelle.pk}\nevent: notification\n", reponse.content.decode())
+        # Les pages passent directement au long-polling
+        self.assertContains(self.client.get(reverse("notifications")), "var fluxSse = false;")
+
+    def test_tableau_de_bord_transmet_le_dernier_id_rendu(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        derniere = self.creer_notification()
+        NotificationConge.objects.filter(pk=derniere.pk).update(lu=True)
+        self.client.force_login(self.employe)
+        for _ in range(2):  # rendu, puis fragments en cache
+            reponse = self.client.get(reverse("dashboard"))
+            self.assertContains(reponse, f'var dernierId = "{derniere.pk}";')
+
+    async def test_creation_reveille_les_connexions_du_destinataire(self):
+        dernier = await NotificationConge.objects.filter(destinataire=self.employe).order_by("id").alast()
+        attente = asyncio.create_task(attendre_notifications(self.employe.pk, dernier.pk, delai=10))
+        while not diffuseur.nombre_connexions():
+            await asyncio.sleep(0.01)
+
+        def creer_et_valider():
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.creer_notification()
+
+        nouvelle = await sync_to_async(creer_et_valider)()
+        nouvelles = await asyncio.wait_for(attente, 2)
+        self.assertEqual([n["id"] for n in nouvelles], [nouvelle.pk])
+        self.assertEqual(diffuseur.nombre_connexions(), 0)
+
+
+class CacheTableauDeBordTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.jeu = JeuDonnees()
+        self.jeu.ajouter_employes(1, 3)
+        self.employe = self.jeu.employes[0]
+        self.client.force_login(self.employe)
+
+    def requetes_metier(self):
+        """Requêtes du tableau de bord hors session et authentification"""
+        with CaptureQueriesContext(connection) as contexte:
+            reponse = self.client.get(reverse("dashboard"))
+        self.assertEqual(reponse.status_code, 200)
+        return [q["sql"] for q in contexte.captured_queries
+                if "conges_demandeconge" in q["sql"] or "conges_notificationconge" in q["sql"]]
+
+    def test_visite_repetee_sans_orm(self):
+        self.assertTrue(self.requetes_metier())
+        self.assertEqual(self.requetes_metier(), [])
+
+    def test_ecriture_invalide_le_cache(self):
+        self.requetes_metier()
+        demande = self.jeu.demandes[0]
+        demande.motif_demande = "Modifiée"
+        with self.captureOnCommitCallbacks(execute=True):
+            demande.save()
+        self.assertEqual(len(self.requetes_metier()), 2)
+
+    def test_invalidation_depuis_un_autre_processus(self):
+        # Worker de tâches ou commande : autre processus, même cache
+        self.requetes_metier()
+        subprocess.run([sys.executable, "-c", "import django; django.setup(); "
+                        f"from conges.cache import invalider_utilisateurs; invalider_utilisateurs({self.employe.pk})"],
+                       check=True, env=dict(os.environ, DJANGO_SETTINGS_MODULE="projconj.settings"))
+        self.assertEqual(len(self.requetes_metier()), 2)
+
+
+class RequetesConditionnellesTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.jeu.ajouter_employes(2, 3)
+
+    def test_liste_demandes_304_tant_que_rien_ne_change(self):
+        self.client.force_login(self.jeu.rh)
+        etag = self.client.get(reverse("liste_demandes"))["ETag"]
+
+        with CaptureQueriesContext(connection) as contexte:
+            reponse = self.client.get(reverse("liste_demandes"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 304)
+        self.assertFalse([q for q in contexte.captured_queries if "JOIN" in q["sql"]])
+
+        demande = self.jeu.demandes[0]
+        demande.statut = DemandeConge.Statut.APPROUVE
+        demande.date_traitement = timezone.now()
+        demande.save()
+        self.assertEqual(self.client.get(reverse("liste_demandes"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_liste_demandes_suit_les_etapes_intermediaires(self):
+        self.client.force_login(self.jeu.rh)
+        etag = self.client.get(reverse("liste_demandes"))["ETag"]
+        # Approbation d'une étape intermédiaire : ni statut ni date ne changent
+        DemandeConge.objects.filter(pk=self.jeu.demandes[0].pk).update(etape=F("etape") + 1,
+                                                                       version=F("version") + 1)
+        self.assertEqual(self.client.get(reverse("liste_demandes"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_tableau_de_bord_suit_le_role(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        employe = self.jeu.employes[0]
+        self.client.force_login(employe)
+        etag = self.client.get(reverse("dashboard"))["ETag"]
+        self.assertEqual(self.client.get(reverse("dashboard"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Le menu affiche la liste des demandes à un manager
+        User.objects.filter(pk=employe.pk).update(role=User.Role.MANAGER)
+        reponse = self.client.get(reverse("dashboard"), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(reponse, reverse("liste_demandes"))
+
+    def test_notification_lue_change_le_validateur(self):
+        self.client.force_login(self.jeu.manager)
+        etag = self.client.get(reverse("notifications"))["ETag"]
+        self.assertEqual(self.client.get(reverse("notifications"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        NotificationConge.objects.filter(destinataire=self.jeu.manager).first().marquer_comme_lu()
+        self.assertEqual(self.client.get(reverse("notifications"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class JustificatifsTests(TestCase):
+    PDF = b"%PDF-1.4\n" + bytes(range(256)) * 40
+
+    def setUp(self):
+        # Portées en cache d'un test à l'autre, mêmes identifiants
+        cache.clear()
+        self.addCleanup(cache.clear)
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        reglages = override_settings(MEDIA_ROOT=dossier.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.media = dossier.name
+        self.jeu = JeuDonnees()
+        self.employes = self.jeu.ajouter_employes(2)
+
+    def deposer(self, employe, contenu, nom="certificat.pdf"):
+        self.client.force_login(employe)
+        debut = date.today() + timedelta(days=400)
+        return self.client.post(reverse("creer_demande_conge"), {
+            "type_conge": self.jeu.type_maladie.pk,
+            "date_debut": debut,
+            "date_fin": debut,
+            "motif_demande": "Certificat",
+            "priorite": DemandeConge.Priorite.NORMALE,
+            "justificatif": SimpleUploadedFile(nom, contenu),
+        })
+
+    def test_meme_contenu_stocke_une_seule_fois(self):
+        for employe in self.employes:
+            self.assertEqual(self.deposer(employe, self.PDF).status_code, 302)
+        noms = set(DemandeConge.objects.filter(justificatif__startswith="justificatifs/")
+                   .values_list("justificatif", flat=True))
+        self.assertEqual(len(noms), 1)
+        nom = noms.pop()
+        self.assertTrue(nom.endswith(".pdf"))
+        fichiers = [f for _, _, noms_fichiers in os.walk(self.media) for f in noms_fichiers]
+        self.assertEqual(fichiers, [os.path.basename(nom)])
+
+    def test_type_refuse_sans_enregistrement(self):
+        reponse = self.deposer(self.employes[0], b"MZ\x90\x00" * 100, nom="certificat.pdf")
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn("justificatif", reponse.context["form"].errors)
+        self.assertFalse(DemandeConge.objects.filter(justificatif__startswith="justificatifs/").exists())
+
+    def test_telechargement_partiel_et_revalidation(self):
+        self.deposer(self.employes[0], self.PDF)
+        demande = DemandeConge.objects.exclude(justificatif="").exclude(justificatif=None).get()
+        url = reverse("telecharger_justificatif", args=[demande.pk])
+
+        self.client.force_login(self.jeu.rh)
+        reponse = self.client.get(url, HTTP_RANGE="bytes=5-14")
+        self.assertEqual(reponse.status_code, 206)
+        self.assertEqual(reponse["Content-Range"], f"bytes 5-14/{len(self.PDF)}")
+        self.assertEqual(b"".join(reponse.streaming_content), self.PDF[5:15])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=reponse["ETag"]).status_code, 304)
+
+        self.client.force_login(self.employes[1])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_telechargement_hors_portee(self):
+        self.deposer(self.employes[0], self.PDF)
+        demande = DemandeConge.objects.exclude(justificatif="").exclude(justificatif=None).get()
+        url = reverse("telecharger_justificatif", args=[demande.pk])
+
+        self.client.force_login(self.jeu.manager)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Manager d'un autre service
+        self.client.force_login(JeuDonnees(prefixe="autre").manager)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_envois_concurrents_du_meme_contenu(self):
+        stockage = stockage_justificatifs()
+        nom = stockage.save("certificat.pdf", ContentFile(self.PDF))
+        # Second envoi ayant passé exists() avant l'écriture du premier
+        with mock.patch.object(StockageJustificatifs, "exists", return_value=False):
+            self.assertEqual(stockage.save("certificat.pdf", ContentFile(self.PDF)), nom)
+        with stockage.open(nom) as fichier:
+            self.assertEqual(fichier.read(), self.PDF)
+
+
+class JournalAuditTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.employe = self.jeu.ajouter_employes(1)[0]
+
+    def creer_demande(self):
+        debut = date.today() + timedelta(days=30)
+        return DemandeConge.objects.create(employe=self.employe, type_conge=self.jeu.type_annuel,
+                                           date_debut=debut, date_fin=debut, motif_demande="Audit")
+
+    def test_transitions_ecrites_en_une_insertion_au_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks, transaction.atomic():
+            demande = self.creer_demande()
+            demande.statut = DemandeConge.Statut.APPROUVE
+            demande.approbateur = self.jeu.manager
+            demande.save()
+            demande.save()  # sans changement de statut : pas d'entrée
+            self.assertFalse(HistoriqueConge.objects.exists())
+
+        with CaptureQueriesContext(connection) as contexte:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(len([q for q in contexte.captured_queries if "conges_historiqueconge" in q["sql"]]), 1)
+
+        with self.assertNumQueries(1):
+            chronologie = [(h.action, h.utilisateur.username)
+                           for h in HistoriqueConge.objects.chronologie_demande(demande.pk)]
+        self.assertEqual(chronologie, [(Action.CREATION, self.employe.username),
+                                       (Action.APPROBATION, self.jeu.manager.username)])
+
+    def test_transaction_annulee_sans_entree(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.creer_demande()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            demande = self.creer_demande()
+        self.assertEqual(list(HistoriqueConge.objects.values_list("demande_id", flat=True)), [demande.pk])
+
+
+class JournalAuditTransactionsTests(TransactionTestCase):
+    def test_transaction_suivante_apres_annulation(self):
+        jeu = JeuDonnees()
+        employe = jeu.ajouter_employes(1, 0)[0]
+        debut = date.today() + timedelta(days=30)
+
+        def creer_demande():
+            return DemandeConge.objects.create(employe=employe, type_conge=jeu.type_annuel, date_debut=debut,
+                                               date_fin=debut, motif_demande="Audit")
+
+        # Même niveau (aucun point de sauvegarde) dans deux transactions successives
+        try:
+            with transaction.atomic():
+                creer_demande()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with transaction.atomic():
+            demande = creer_demande()
+        self.assertEqual(list(HistoriqueConge.objects.values_list("demande_id", flat=True)), [demande.pk])
+
+
+def en_parallele(fonction, nombre):
+    """Exécute fonction(i) dans `nombre` threads démarrés ensemble ; retourne les résultats"""
+    depart = threading.Barrier(nombre)
+    resultats = [None] * nombre
+
+    def executer(i):
+        try:
+            depart.wait()
+            resultats[i] = fonction(i)
+        except Exception as erreur:
+            resultats[i] = erreur
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=executer, args=(i,)) for i in range(nombre)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultats
+
+
+class TransitionsTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.jeu.ajouter_employes(1, 1)
+        self.demande = self.jeu.demandes[0]
+
+    def test_decision_perimee_refusee(self):
+        copie = DemandeConge.objects.get(pk=self.demande.pk)
+        effectuer_transition(self.demande, DemandeConge.Statut.APPROUVE, self.jeu.manager)
+        with self.assertRaises(ConflitTransition) as conflit:
+            effectuer_transition(copie, DemandeConge.Statut.REJETE, self.jeu.rh, motif_rejet="Non")
+        self.assertEqual(conflit.exception.statut_actuel, DemandeConge.Statut.APPROUVE)
+        self.assertIn(self.jeu.manager.get_full_name() or self.jeu.manager.username, str(conflit.exception))
+
+    def test_transition_hors_machine_a_etats(self):
+        self.demande.statut = DemandeConge.Statut.APPROUVE
+        with self.assertRaises(TransitionInvalide):
+            effectuer_transition(self.demande, DemandeConge.Statut.REJETE, self.jeu.rh)
+
+
+class TransitionsConcurrentesTests(TransactionTestCase):
+    APPROBATEURS = 8
+
+    def test_un_seul_approbateur_gagne(self):
+        jeu = JeuDonnees()
+        jeu.ajouter_employes(1, 1)
+        demande_id = jeu.demandes[0].pk
+        approbateurs = [jeu.manager, jeu.rh] * (self.APPROBATEURS // 2)
+        decisions = [DemandeConge.Statut.APPROUVE, DemandeConge.Statut.REJETE] * (self.APPROBATEURS // 2)
+
+        # Chaque approbateur a lu la demande avant que quiconque ne décide
+        copies = [DemandeConge.objects.get(pk=demande_id) for _ in range(self.APPROBATEURS)]
+
+        def decider(i):
+            with transaction.atomic():
+                return effectuer_transition(copies[i], decisions[i], approbateurs[i], motif_rejet="Non")
+
+        resultats = en_parallele(decider, self.APPROBATEURS)
+        gagnants = [r for r in resultats if isinstance(r, DemandeConge)]
+        self.assertEqual(len(gagnants), 1, resultats)
+        self.assertTrue(all(isinstance(r, ConflitTransition) for r in resultats if r not in gagnants), resultats)
+
+        demande = DemandeConge.objects.get(pk=demande_id)
+        self.assertEqual((demande.statut, demande.version), (gagnants[0].statut, 1))
+        self.assertEqual(HistoriqueConge.objects.filter(demande_id=demande_id).count(), 1)
+
+
+class ReservationSoldeTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.employe = self.jeu.ajouter_employes(1)[0]
+        self.debut = date(date.today().year + 1, 3, 2)  # lundi
+
+    def demande(self, jours_calendaires=1):
+        return DemandeConge(employe=self.employe, type_conge=self.jeu.type_annuel, date_debut=self.debut,
+                            date_fin=self.debut + timedelta(days=jours_calendaires - 1), motif_demande="Solde")
+
+    def solde(self):
+        return SoldeConge.objects.get(employe=self.employe, annee=self.debut.year)
+
+    def test_reservation_liberee_au_rejet_et_consommee_a_l_approbation(self):
+        rejetee, approuvee = self.demande(2), self.demande(3)
+        for demande in (rejetee, approuvee):
+            reserver(demande)
+            demande.save()
+        self.assertEqual(self.solde().jours_reserves, 5)
+
+        effectuer_transition(rejetee, DemandeConge.Statut.REJETE, self.jeu.manager, motif_rejet="Non")
+        effectuer_transition(approuvee, DemandeConge.Statut.APPROUVE, self.jeu.manager)
+        solde = self.solde()
+        self.assertEqual((solde.jours_reserves, solde.jours_pris), (0, 3))
+
+    def test_solde_insuffisant(self):
+        self.employe.jours_conges_annuels = 2
+        self.employe.save()
+        with self.assertRaises(SoldeInsuffisant):
+            reserver(self.demande(3))
+        self.assertEqual(self.solde().jours_reserves, 0)
+
+    def test_validation_du_formulaire_sans_ecriture(self):
+        form = DemandeCongeForm({
+            "type_conge": self.jeu.type_annuel.pk, "date_debut": self.debut, "date_fin": self.debut,
+            "motif_demande": "Vacances", "priorite": DemandeConge.Priorite.NORMALE,
+        }, user=self.employe)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertFalse(SoldeConge.objects.filter(employe=self.employe).exists())
+        self.assertEqual(solde_annuel(self.employe, self.debut.year).jours_disponibles,
+                         self.employe.jours_conges_annuels)
+        self.assertFalse(SoldeConge.objects.filter(employe=self.employe).exists())
+
+    def test_reservation_introuvable_journalisee(self):
+        # Sans ligne de solde, la réservation n'existe encore que sur la demande
+        with self.assertNoLogs("conges.soldes", "WARNING"):
+            self.assertEqual(solder_reservation(self.employe.pk, self.debut.year, 2, consommer=True), 0)
+        demande = self.demande(2)
+        reserver(demande)
+        with self.assertLogs("conges.soldes", "WARNING"):
+            self.assertEqual(solder_reservation(self.employe.pk, self.debut.year, 5, consommer=True), 0)
+        self.assertEqual((self.solde().jours_reserves, self.solde().jours_pris), (2, 0))
+
+
+class ReservationsConcurrentesTests(TransactionTestCase):
+    def test_demandes_simultanees_sans_depassement(self):
+        jeu = JeuDonnees()
+        employe = jeu.ajouter_employes(1)[0]
+        employe.jours_conges_annuels = 10
+        employe.save()
+        debut = date(date.today().year + 1, 3, 2)
+        fin = debut + timedelta(days=2)
+        jours = employe.calculer_jours_ouvrables(debut, fin)
+
+        def demander(i):
+            demande = DemandeConge(employe=employe, type_conge=jeu.type_annuel, date_debut=debut,
+                                   date_fin=fin, motif_demande=f"Demande {i}")
+            with transaction.atomic():
+                reserver(demande)
+                demande.save()
+            return demande
+
+        resultats = en_parallele(demander, 8)
+        acceptees = [r for r in resultats if isinstance(r, DemandeConge)]
+        self.assertEqual(len(acceptees), 10 // jours, resultats)
+        self.assertTrue(all(isinstance(r, SoldeInsuffisant) for r in resultats if r not in acceptees), resultats)
+        solde = SoldeConge.objects.get(employe=employe, annee=debut.year)
+        self.assertEqual(solde.jours_reserves, len(acceptees) * jours)
+        self.assertEqual(DemandeConge.objects.filter(employe=employe).count(), len(acceptees))
+
+
+class AcquisitionsTests(TestCase):
+    def test_prorata_et_requetes_independantes_du_nombre_d_employes(self):
+        jeu = JeuDonnees()
+        ancien, arrive_le_16, futur = jeu.ajouter_employes(3)
+        User = type(ancien)
+        User.objects.filter(pk=arrive_le_16.pk).update(date_embauche=date(2025, 4, 16), jours_conges_annuels=24)
+        User.objects.filter(pk=futur.pk).update(date_embauche=date(2025, 7, 1))
+
+        with CaptureQueriesContext(connection) as petite:
+            calculer_acquisitions(2025, 4, taille_lot=1000)
+        acquis = {a.employe_id: (a.jours_acquis, a.jours_cumules)
+                  for a in AcquisitionMensuelle.objects.filter(annee=2025, mois=4)}
+        self.assertEqual(acquis[ancien.pk], (Decimal("1.75"), Decimal("7.00")))
+        self.assertEqual(acquis[arrive_le_16.pk], (Decimal("1.00"), Decimal("1.00")))
+        self.assertNotIn(futur.pk, acquis)
+
+        jeu.ajouter_employes(100)
+        with CaptureQueriesContext(connection) as grande:
+            calculer_acquisitions(2025, 4, taille_lot=1000)
+        self.assertEqual(len(grande), len(petite))
+        self.assertEqual(AcquisitionMensuelle.objects.filter(annee=2025, mois=4).count(), 104)
+
+        # Relancé, le calcul retire les lignes des employés désactivés depuis
+        User.objects.filter(pk=ancien.pk).update(is_active=False)
+        calculer_acquisitions(2025, 4, taille_lot=1000)
+        self.assertFalse(AcquisitionMensuelle.objects.filter(annee=2025, mois=4, employe=ancien).exists())
+        self.assertEqual(AcquisitionMensuelle.objects.filter(annee=2025, mois=4).count(), 103)
+
+
+class ClotureAnnuelleTests(TransactionTestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.employes = self.jeu.ajouter_employes(5)
+        self.annee = date.today().year - 1
+        premier, second = self.employes[:2]
+        # 21 droits - 19 pris : 2 jours reportés ; le second n'a rien pris (report plafonné à 5)
+        SoldeConge.objects.create(employe=premier, annee=self.annee, jours_droits=21, jours_pris=19)
+        # Demande déjà réservée sur l'année suivante : la ligne existante est complétée
+        SoldeConge.objects.create(employe=second, annee=self.annee + 1, jours_droits=21, jours_reserves=3)
+
+    def cloturer(self, **options):
+        call_command("cloturer_annee", annee=self.annee, taille_lot=2, stdout=io.StringIO(), **options)
+
+    def verifier_soldes(self):
+        soldes = {(s.employe_id, s.annee): s for s in SoldeConge.objects.all()}
+        premier, second = self.employes[:2]
+        self.assertEqual(soldes[premier.pk, self.annee + 1].jours_droits, 23)
+        suivant = soldes[second.pk, self.annee + 1]
+        self.assertEqual((suivant.jours_droits, suivant.jours_reportes, suivant.jours_reserves), (26, 5, 3))
+        for employe in self.employes:
+            self.assertIsNotNone(soldes[employe.pk, self.annee].date_cloture)
+        self.assertFalse(LotCloture.objects.filter(date_traitement__isnull=True).exists())
+
+    def test_reprise_apres_interruption(self):
+        lots = planifier_lots(self.annee, taille_lot=2)
+        cloturer_lot(lots[0].pk)  # puis interruption
+        self.cloturer(processus=1)
+        self.verifier_soldes()
+        self.assertEqual(LotCloture.objects.count(), len(lots))
+        self.cloturer(processus=1)  # sans effet une fois terminée
+        self.verifier_soldes()
+
+    def test_lots_en_parallele(self):
+        self.cloturer(processus=2)
+        self.verifier_soldes()
+
+    def test_sans_fork_dans_ce_processus(self):
+        with mock.patch("multiprocessing.get_all_start_methods", return_value=["spawn"]), \
+                mock.patch("conges.management.commands.cloturer_annee.ProcessPoolExecutor") as executeur:
+            self.cloturer(processus=2, stderr=io.StringIO())
+        executeur.assert_not_called()
+        self.verifier_soldes()
+
+    def test_jours_reserves_non_reportes(self):
+        troisieme = self.employes[2]
+        # 21 - 14 pris - 4 réservés : 3 jours reportés, sous le plafond
+        SoldeConge.objects.create(employe=troisieme, annee=self.annee, jours_droits=21, jours_pris=14,
+                                  jours_reserves=4)
+        self.cloturer(processus=1)
+        self.assertEqual(SoldeConge.objects.get(employe=troisieme, annee=self.annee + 1).jours_reportes, 3)
+
+    def test_employes_reactives_rattrapes(self):
+        premier_utilisateur = User.objects.order_by("pk").first()
+        absents = [premier_utilisateur, self.employes[2]]
+        User.objects.filter(pk__in=[u.pk for u in absents]).update(is_active=False)
+        self.cloturer(processus=1)
+        lots = LotCloture.objects.count()
+        self.assertFalse(SoldeConge.objects.filter(employe__in=absents, annee=self.annee).exists())
+
+        User.objects.filter(pk__in=[u.pk for u in absents]).update(is_active=True)
+        self.cloturer(processus=1)
+        self.verifier_soldes()
+        self.assertEqual(SoldeConge.objects.filter(employe__in=absents, annee=self.annee,
+                                                   date_cloture__isnull=False).count(), 2)
+        # Lot rouvert pour l'employé dans une plage existante, nouveau lot avant la première
+        self.assertEqual(LotCloture.objects.count(), lots + 1)
+        self.assertEqual(SoldeConge.objects.filter(annee=self.annee, date_cloture__isnull=False).count(),
+                         User.objects.filter(is_active=True).count())
+
+
+class RappelsApprobationTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+
+    def vieillir_demandes_en_attente(self):
+        DemandeConge.objects.filter(statut=DemandeConge.Statut.EN_ATTENTE).update(
+            date_demande=timezone.now() - timedelta(days=5))
+
+    def rappels(self):
+        return NotificationConge.objects.filter(type_notification=NotificationConge.TypeNotification.RAPPEL_APPROBATION)
+
+    def test_un_rappel_par_approbateur_et_par_intervalle(self):
+        self.jeu.ajouter_employes(2, 4)
+        self.vieillir_demandes_en_attente()
+        with CaptureQueriesContext(connection) as petite:
+            envoyer_rappels()
+        # Demandes annuelles au manager, maladie au vivier RH
+        self.assertEqual(sorted(self.rappels().values_list("destinataire_id", flat=True)),
+                         sorted([self.jeu.manager.pk, self.jeu.rh.pk]))
+        self.assertEqual(envoyer_rappels(), 0)
+
+        self.rappels().delete()
+        self.jeu.ajouter_employes(10, 8)
+        self.vieillir_demandes_en_attente()
+        with CaptureQueriesContext(connection) as grande:
+            self.assertEqual(envoyer_rappels(), 2)
+        self.assertEqual(len(grande), len(petite))
+
+    def test_demandes_recentes_ignorees(self):
+        self.jeu.ajouter_employes(2, 4)
+        self.assertEqual(envoyer_rappels(), 0)
+
+    def test_approbateurs_de_la_boite_d_approbation(self):
+        self.jeu.ajouter_employes(1, 1)
+        self.vieillir_demandes_en_attente()
+        demande = DemandeConge.objects.filter(statut=DemandeConge.Statut.EN_ATTENTE).first()
+        directeur = User.objects.create_user("rappels_directeur", role=User.Role.DIRECTEUR)
+        AffectationApprobation.objects.create(demande=demande, approbateur=directeur,
+                                              type_conge=demande.type_conge, priorite=demande.priorite,
+                                              date_demande=demande.date_demande, escalade=True)
+        envoyer_rappels()
+        self.assertTrue(self.rappels().filter(destinataire=directeur).exists())
+
+    def test_passage_concurrent_sans_doublon(self):
+        self.jeu.ajouter_employes(1, 1)
+        self.vieillir_demandes_en_attente()
+        envoyer_rappels()
+        # Rappels d'un passage concurrent, invisibles à la lecture des rappels récents
+        self.rappels().update(date_creation=timezone.now() - timedelta(days=2))
+        rappels = self.rappels().count()
+        envoyer_rappels()
+        self.assertEqual(self.rappels().count(), rappels)
+
+
+@tache("tests_echec")
+def _tache_en_echec(contexte):
+    raise ValueError("échec volontaire")
+
+
+class FileTachesTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees(mot_de_passe="secret")
+        self.jeu.ajouter_employes(3, 2)
+        self.client.login(username=self.jeu.manager.username, password="secret")
+
+    def test_priorite_puis_anciennete(self):
+        basse = mettre_en_file("envoyer_rappels")
+        haute = mettre_en_file("envoyer_rappels", priorite=5)
+        self.assertEqual(prendre_tache("t1").pk, haute.pk)
+        self.assertEqual(prendre_tache("t2").pk, basse.pk)
+        self.assertIsNone(prendre_tache("t3"))
+
+    def test_nouvelles_tentatives_puis_echec(self):
+        tache_echec = mettre_en_file("tests_echec", tentatives_max=2)
+        executer_tache(prendre_tache("t1"))
+        tache_echec.refresh_from_db()
+        self.assertEqual((tache_echec.statut, tache_echec.tentatives), (Tache.Statut.EN_ATTENTE, 1))
+        self.assertIsNone(prendre_tache("t1"))  # délai avant nouvelle tentative
+
+        Tache.objects.update(disponible_a=timezone.now())
+        executer_tache(prendre_tache("t1"))
+        tache_echec.refresh_from_db()
+        self.assertEqual(tache_echec.statut, Tache.Statut.ECHOUEE)
+        self.assertIn("échec volontaire", tache_echec.erreur)
+
+    def test_reprise_apres_delai_de_visibilite(self):
+        mettre_en_file("envoyer_rappels")
+        perdue = prendre_tache("t1", delai_visibilite=timedelta(0))
+        reprise = prendre_tache("t2")
+        self.assertEqual((reprise.pk, reprise.tentatives), (perdue.pk, 2))
+        executer_tache(perdue)  # le premier travailleur n'écrit plus rien
+        executer_tache(reprise)
+        reprise.refresh_from_db()
+        self.assertEqual((reprise.statut, reprise.travailleur), (Tache.Statut.TERMINEE, "t2"))
+
+    def test_export_en_arriere_plan(self):
+        with tempfile.TemporaryDirectory() as dossier, override_settings(MEDIA_ROOT=dossier):
+            reponse = self.client.post(reverse("exporter_demandes") + "?statut=EN_ATTENTE")
+            self.assertEqual(reponse.status_code, 202)
+            suivi = reponse.json()["suivi"]
+            self.assertEqual(self.client.get(suivi).json()["statut"], Tache.Statut.EN_ATTENTE)
+
+            self.assertEqual(travailler(jusqu_a_file_vide=True), 1)
+            with self.assertNumQueries(2):  # utilisateur, tâche (session en cache)
+                etat = self.client.get(suivi).json()
+            self.assertEqual((etat["statut"], etat["progression"]), (Tache.Statut.TERMINEE, 100))
+            fichier = self.client.get(etat["telechargement"])
+            lignes = b"".join(fichier.streaming_content).decode("utf-8-sig").splitlines()
+            en_attente = DemandeConge.objects.filter(statut=DemandeConge.Statut.EN_ATTENTE).count()
+            self.assertEqual(len(lignes), en_attente + 1)
+
+        self.client.login(username=self.jeu.rh.username, password="secret")
+        self.assertEqual(self.client.get(suivi).status_code, 404)
+
+
+class PriseEnChargeConcurrenteTests(TransactionTestCase):
+    TRAVAILLEURS = 8
+
+    def test_une_tache_un_seul_travailleur(self):
+        tache_id = mettre_en_file("envoyer_rappels").pk
+        resultats = en_parallele(lambda i: prendre_tache(f"t{i}"), self.TRAVAILLEURS)
+        prises = [r for r in resultats if isinstance(r, Tache)]
+        self.assertEqual(len(prises), 1, resultats)
+        self.assertTrue(all(r is None for r in resultats if r not in prises), resultats)
+        self.assertEqual(Tache.objects.get(pk=tache_id).tentatives, 1)
+
+
+class DemarrageTests(TestCase):
+    """Démarrage à froid d'un processus WSGI (voir conges.demarrage)"""
+    # Environ 0,45 s mesurées en local ; surcharge possible sur une machine plus lente
+    BUDGET_SECONDES = float(os.environ.get("CONGES_BUDGET_DEMARRAGE", "1.5"))
+
+    def test_demarrage_a_froid(self):
+        # La plus rapide de trois mesures : la première paie le cache disque
+        demarrage = min((mesurer_demarrage("wsgi") for _ in range(3)), key=lambda mesure: mesure.duree)
+        self.assertNotIn("holidays", demarrage.modules)
+        self.assertLess(demarrage.duree, self.BUDGET_SECONDES,
+                        [paquet for paquet in demarrage.paquets()[:10]])
+
+    def test_jours_feries_charges_au_premier_calcul(self):
+        employe = User.objects.create_user("ferie", password="secret")
+        # Lundi 1er juillet 2024 : fête de l'indépendance
+        self.assertEqual(employe.calculer_jours_ouvrables(date(2024, 7, 1), date(2024, 7, 7)), 4)
+
+
+class CalendriersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.jeu = JeuDonnees()
+        self.employe = self.jeu.ajouter_employes(1, 0)[0]
+        self.autre = JeuDonnees(prefixe="autre").ajouter_employes(1, 0)[0]
+
+    def test_calendrier_par_direction(self):
+        # Semaine du lundi 1er juillet 2024, férié au Burundi
+        debut, fin = date(2024, 7, 1), date(2024, 7, 7)
+        self.assertEqual(self.employe.calculer_jours_ouvrables(debut, fin), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            site = CalendrierFeries.objects.create(nom="Site de Kigali", code="RW", pays="RW")
+            JourFerie.objects.create(calendrier=site, date=date(2024, 7, 5), libelle="Inventaire",
+                                     type_jour=JourFerie.Type.FERMETURE)
+            self.jeu.direction.calendrier = site
+            self.jeu.direction.save()
+        # Rwanda : 1er juillet (indépendance) et 4 juillet (libération) fériés, plus la fermeture
+        self.assertEqual(self.employe.calculer_jours_ouvrables(debut, fin), 2)
+        self.assertEqual(self.autre.calculer_jours_ouvrables(debut, fin), 4)
+
+    def test_calendriers_en_memoire(self):
+        self.employe.calculer_jours_ouvrables(date(2024, 1, 1), date(2024, 12, 31))
+        with self.assertNumQueries(0):
+            # À cheval sur deux années : 25 décembre et 1er janvier fériés
+            self.assertEqual(self.employe.calculer_jours_ouvrables(date(2024, 12, 23), date(2025, 1, 3)), 8)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            JourFerie.objects.create(calendrier=CalendrierFeries.objects.get(par_defaut=True),
+                                     date=date(2024, 12, 27), libelle="Fermeture de fin d'année")
+        self.assertEqual(calendrier_employe(self.employe).jours_ouvrables(date(2024, 12, 23), date(2025, 1, 3)), 7)
+
+
+class JoursOuvrablesDemandeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.jeu = JeuDonnees()
+        self.employe = self.jeu.ajouter_employes(1, 0)[0]
+        # Lundi 1er au vendredi 5 juillet 2024, 1er juillet férié
+        self.demande = DemandeConge.objects.create(
+            employe=self.employe, type_conge=self.jeu.type_annuel, date_debut=date(2024, 7, 1),
+            date_fin=date(2024, 7, 5), motif_demande="Vacances", statut=DemandeConge.Statut.APPROUVE)
+
+    def test_calcul_a_l_enregistrement(self):
+        self.assertEqual(self.demande.jours_ouvrables, 4)
+        self.demande.date_fin = date(2024, 7, 12)
+        self.demande.save(update_fields=["date_fin"])
+        self.demande.refresh_from_db()
+        self.assertEqual(self.demande.jours_ouvrables, 9)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.employe.conges_consommes_annee(2024), 9)
+
+    def test_recalcul_en_file_apres_modification_du_calendrier(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            JourFerie.objects.create(calendrier=CalendrierFeries.objects.get(par_defaut=True),
+                                     date=date(2024, 7, 5), libelle="Fermeture")
+        tache_en_file = Tache.objects.get(nom="recalculer_jours_ouvrables")
+        self.assertEqual(travailler(jusqu_a_file_vide=True), 1)
+        tache_en_file.refresh_from_db()
+        self.assertEqual(tache_en_file.resultat, {"modifiees": 1})
+        self.demande.refresh_from_db()
+        self.assertEqual(self.demande.jours_ouvrables, 3)
+
+    def test_recalcul_seulement_si_le_calendrier_de_la_direction_change(self):
+        site = CalendrierFeries.objects.create(nom="Site de Kigali", code="RW", pays="RW")
+        Tache.objects.all().delete()
+        direction = Direction.objects.get(pk=self.jeu.direction.pk)
+        direction.nom = "Direction renommée"
+        with self.captureOnCommitCallbacks(execute=True):
+            direction.save()
+        self.assertFalse(Tache.objects.filter(nom="recalculer_jours_ouvrables").exists())
+
+        direction.calendrier = site
+        with self.captureOnCommitCallbacks(execute=True):
+            direction.save()
+            direction.save()
+        self.assertEqual(list(Tache.objects.filter(nom="recalculer_jours_ouvrables").values_list(
+            "parametres", flat=True)), [{"direction_id": direction.pk}])
+
+    def test_soldes_et_validateurs_suivent_le_recalcul(self):
+        # Du lundi 8 au vendredi 12 juillet, 5 jours réservés
+        en_attente = DemandeConge.objects.create(
+            employe=self.employe, type_conge=self.jeu.type_annuel, date_debut=date(2024, 7, 8),
+            date_fin=date(2024, 7, 12), motif_demande="Vacances")
+        DemandeConge.objects.filter(pk=en_attente.pk).update(jours_reserves=5)
+        solde = initialiser_solde(self.employe, 2024)
+        self.assertEqual((solde.jours_pris, solde.jours_reserves), (4, 5))
+        self.client.force_login(self.jeu.rh)
+        etag = self.client.get(reverse("liste_demandes"))["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for jour in (date(2024, 7, 5), date(2024, 7, 12)):
+                JourFerie.objects.create(calendrier=CalendrierFeries.objects.get(par_defaut=True), date=jour,
+                                         libelle="Fermeture")
+        with self.captureOnCommitCallbacks(execute=True):
+            travailler(jusqu_a_file_vide=True)
+        en_attente.refresh_from_db()
+        self.assertEqual((en_attente.jours_ouvrables, en_attente.jours_reserves), (4, 4))
+        solde.refresh_from_db()
+        self.assertEqual((solde.jours_pris, solde.jours_reserves), (3, 4))
+        self.assertEqual(self.client.get(reverse("liste_demandes"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_commande_d_initialisation(self):
+        DemandeConge.objects.update(jours_ouvrables=0)
+        sortie = io.StringIO()
+        call_command("calculer_jours_ouvrables", stdout=sortie)
+        self.demande.refresh_from_db()
+        self.assertEqual(self.demande.jours_ouvrables, 4)
+        self.assertFalse(DemandeConge.objects.filter(jours_ouvrables=0, date_fin__gt=F("date_debut")).exists())
+        call_command("calculer_jours_ouvrables", stdout=sortie)
+        self.assertIn("0 demande(s) mise(s) à jour", sortie.getvalue())
+
+
+class RemplacementsTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.employe, self.absent, self.sollicite, self.libre = self.jeu.ajouter_employes(4, 0)
+        # Même direction, autre service : moins proche
+        self.voisin = self.jeu.ajouter_employes(1, 0)[0]
+        self.voisin.service = Service.objects.create(nom="Autre service", code="AUT", direction=self.jeu.direction)
+        self.voisin.departement = None
+        self.voisin.save()
+        self.debut, self.fin = date.today() + timedelta(days=30), date.today() + timedelta(days=34)
+
+        def demande(employe, debut, fin, **champs):
+            return DemandeConge.objects.create(employe=employe, type_conge=self.jeu.type_maladie, date_debut=debut,
+                                               date_fin=fin, motif_demande="Test", **champs)
+
+        demande(self.absent, self.fin, self.fin + timedelta(days=3), statut=DemandeConge.Statut.APPROUVE)
+        # Une demande rejetée ne rend pas indisponible
+        demande(self.jeu.manager, self.debut, self.fin, statut=DemandeConge.Statut.REJETE)
+        demande(self.libre, self.debut + timedelta(days=60), self.fin + timedelta(days=60), remplacant=self.sollicite)
+
+    def test_disponibles_classes(self):
+        with self.assertNumQueries(1):
+            suggestions = list(suggerer_remplacants(self.employe, self.debut, self.fin))
+        self.assertNotIn(self.absent, suggestions)
+        self.assertEqual([s.proximite for s in suggestions], sorted(s.proximite for s in suggestions))
+        rangs = {s.pk: (s.proximite, s.charge) for s in suggestions}
+        self.assertEqual(rangs[self.sollicite.pk], (0, 1))
+        self.assertEqual(rangs[self.libre.pk], (0, 0))
+        self.assertEqual(rangs[self.voisin.pk][0], 2)
+        self.assertLess(suggestions.index(self.libre), suggestions.index(self.sollicite))
+        self.assertIn(self.jeu.manager, suggestions)
+
+    def test_remplacant_absent_refuse(self):
+        form = DemandeCongeForm({"type_conge": self.jeu.type_maladie.pk, "date_debut": self.debut,
+                                 "date_fin": self.fin, "motif_demande": "Test", "priorite": "NORMALE",
+                                 "remplacant": self.absent.pk}, user=self.employe)
+        self.assertFalse(form.is_valid())
+        self.assertIn("remplacant", form.errors)
+
+
+class AffectationsTests(TestCase):
+    def setUp(self):
+        self.jeu = JeuDonnees()
+        self.jeu.ajouter_employes(3, 4)
+        self.en_attente = [d for d in self.jeu.demandes if d.statut == DemandeConge.Statut.EN_ATTENTE]
+
+    def approbateurs(self, demande):
+        return set(AffectationApprobation.objects.filter(demande=demande).values_list("approbateur_id", flat=True))
+
+    def test_memes_approbateurs_que_les_regles(self):
+        self.assertTrue(self.en_attente)
+        for demande in self.en_attente:
+            self.assertEqual(self.approbateurs(demande), {u.pk for u in demande.get_approbateurs_possibles()})
+        self.assertFalse(AffectationApprobation.objects.exclude(demande__statut=DemandeConge.Statut.EN_ATTENTE))
+
+    def test_boite_et_transition(self):
+        demande = next(d for d in self.en_attente if d.type_conge == self.jeu.type_annuel)
+        self.client.force_login(self.jeu.manager)
+        reponse = self.client.get(reverse("boite_approbation"))
+        attendues = [d for d in self.en_attente if d.type_conge == self.jeu.type_annuel]
+        self.assertEqual(reponse.context["total"], len(attendues))
+        self.assertEqual({d.pk for d in reponse.context["demandes"]}, {d.pk for d in attendues})
+
+        effectuer_transition(demande, DemandeConge.Statut.APPROUVE, self.jeu.manager)
+        self.assertFalse(self.approbateurs(demande))
+        reponse = self.client.get(reverse("boite_approbation"), {"type": self.jeu.type_annuel.pk,
+                                                                  "priorite": DemandeConge.Priorite.NORMALE})
+        self.assertEqual(len(reponse.context["demandes"]), len(attendues) - 1)
+
+    def test_recalcul_apres_changement_de_manager(self):
+        demande = next(d for d in self.en_attente if d.type_conge == self.jeu.type_annuel)
+        nouveau = User.objects.create(username="nouveau_manager", role=User.Role.MANAGER)
+        employe = demande.employe
+        employe.manager = nouveau
+        with self.captureOnCommitCallbacks(execute=True):
+            employe.save()
+        self.assertEqual(Tache.objects.filter(nom="affecter_approbateurs").count(), 1)
+        travailler(jusqu_a_file_vide=True)
+        self.assertEqual(self.approbateurs(demande), {nouveau.pk})
+
+    def test_nouveau_titulaire_d_un_role(self):
+        demande = next(d for d in self.en_attente if d.type_conge == self.jeu.type_maladie)
+        rh = User.objects.create(username="rh2", role=User.Role.RH)
+        travailler(jusqu_a_file_vide=True)
+        self.assertEqual(self.approbateurs(demande), {self.jeu.rh.pk, rh.pk})
+        AffectationApprobation.objects.all().delete()
+        self.assertEqual(reaffecter(), sum(len(d.get_approbateurs_possibles()) for d in self.en_attente))
+
+
+class CircuitsApprobationTests(TestCase):
+    def setUp(self):
+        # Règles et portées en cache d'un test à l'autre, mêmes identifiants
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.jeu = JeuDonnees()
+        self.employe = self.jeu.ajouter_employes(1, 0)[0]
+        self.chef = User.objects.create(username="chef_service", role=User.Role.CHEF_SERVICE)
+        self.jeu.service.chef_service = self.chef
+        self.jeu.service.save()
+        self.directeur = User.objects.create(username="directeur", role=User.Role.DIRECTEUR)
+        self.jeu.direction.directeur = self.directeur
+        self.jeu.direction.save()
+        # Manager, puis chef de service au-delà de 5 jours, escaladé au directeur après 3 jours
+        type_annuel = self.jeu.type_annuel
+        EtapeApprobation.objects.create(type_conge=type_annuel, ordre=1, approbateur=TypeConge.Approbateur.MANAGER)
+        EtapeApprobation.objects.create(type_conge=type_annuel, ordre=2, approbateur=TypeConge.Approbateur.CHEF_SERV,
+                                        seuil_jours=5, escalade_apres_jours=3,
+                                        escalade_vers=TypeConge.Approbateur.DIRECTEUR)
+        cache.clear()
+
+    def demande(self, jours):
+        debut = date(2030, 3, 4)  # un lundi
+        return DemandeConge.objects.create(employe=self.employe, type_conge=self.jeu.type_annuel, date_debut=debut,
+                                           date_fin=debut + timedelta(days=jours - 1), motif_demande="Vacances")
+
+    def approbateurs(self, demande):
+        return dict(AffectationApprobation.objects.filter(demande=demande).values_list("approbateur_id", "escalade"))
+
+    def test_seuil_de_jours(self):
+        self.assertEqual([e["approbateur"] for e in self.demande(3).circuit], [TypeConge.Approbateur.MANAGER])
+        self.assertEqual([e["approbateur"] for e in self.demande(10).circuit],
+                         [TypeConge.Approbateur.MANAGER, TypeConge.Approbateur.CHEF_SERV])
+
+    def test_approbation_etape_par_etape(self):
+        with self.captureOnCommitCallbacks(execute=True):  # journal d'audit
+            demande = self.demande(10)
+            self.assertEqual(self.approbateurs(demande), {self.jeu.manager.pk: False})
+
+            with self.assertNumQueries(4):  # UPDATE conditionnel, puis réaffectation (lecture, suppression, insertion)
+                effectuer_transition(demande, DemandeConge.Statut.APPROUVE, self.jeu.manager)
+            demande.refresh_from_db()
+            self.assertEqual((demande.statut, demande.etape), (DemandeConge.Statut.EN_ATTENTE, 1))
+            self.assertEqual(self.approbateurs(demande), {self.chef.pk: False})
+            self.assertEqual([u.pk for u in demande.get_approbateurs_possibles()], [self.chef.pk])
+
+            effectuer_transition(demande, DemandeConge.Statut.APPROUVE, self.chef)
+            demande.refresh_from_db()
+            self.assertEqual(demande.statut, DemandeConge.Statut.APPROUVE)
+            self.assertFalse(self.approbateurs(demande))
+        self.assertEqual(list(HistoriqueConge.objects.filter(demande=demande).order_by("pk").values_list(
+            "action", flat=True)), [Action.CREATION, Action.APPROBATION_ETAPE, Action.APPROBATION])
+
+    def test_seuls_les_approbateurs_de_l_etape(self):
+        demande = self.demande(10)
+        effectuer_transition(demande, DemandeConge.Statut.APPROUVE, self.jeu.manager)
+        self.client.force_login(self.jeu.manager)
+        self.client.post(reverse("traiter_demande", args=[demande.pk]),
+                         {"statut": DemandeConge.Statut.APPROUVE, "version": demande.version})
+        demande.refresh_from_db()
+        self.assertEqual((demande.statut, demande.etape), (DemandeConge.Statut.EN_ATTENTE, 1))
+
+        # Le chef de service n'est pas manager : il traite la demande depuis sa boîte
+        self.client.force_login(self.chef)
+        self.assertEqual(self.client.get(reverse("boite_approbation")).context["total"], 1)
+        self.client.post(reverse("traiter_demande", args=[demande.pk]),
+                         {"statut": DemandeConge.Statut.APPROUVE, "version": demande.version})
+        demande.refresh_from_db()
+        self.assertEqual(demande.statut, DemandeConge.Statut.APPROUVE)
+
+    def test_escalade(self):
+        demande = self.demande(10)
+        effectuer_transition(demande, DemandeConge.Statut.APPROUVE, self.jeu.manager)
+        demande.refresh_from_db()
+        self.assertEqual(escalader(), 0)
+        self.assertEqual(escalader(maintenant=demande.escalade_a + timedelta(minutes=1)), 1)
+        self.assertEqual(self.approbateurs(demande), {self.chef.pk: False, self.directeur.pk: True})
+        self.assertTrue(NotificationConge.objects.filter(
+            destinataire=self.directeur, type_notification=NotificationConge.TypeNotification.RAPPEL_APPROBATION))
+        self.assertEqual(escalader(maintenant=demande.escalade_a + timedelta(days=10)), 0)
+
+
+class ArchivesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.jeu = JeuDonnees()
+        self.employe = self.jeu.ajouter_employes(1, 0)[0]
+
+    def demande(self, debut, statut, jours=5):
+        with self.captureOnCommitCallbacks(execute=True):  # journal d'audit
+            demande = DemandeConge.objects.create(
+                employe=self.employe, type_conge=self.jeu.type_annuel, date_debut=debut,
+                date_fin=debut + timedelta(days=jours - 1), motif_demande="Vacances", statut=statut,
+                approbateur=None if statut == DemandeConge.Statut.EN_ATTENTE else self.jeu.manager)
+        NotificationConge.objects.create(
+            demande=demande, destinataire=self.employe, titre="Demande traitée", message="",
+            type_notification=NotificationConge.TypeNotification.DEMANDE_APPROUVEE,
+            destinataire_type=NotificationConge.Destinataire.EMPLOYE)
+        return demande
+
+    def test_archivage(self):
+        approuvee = self.demande(date(2020, 3, 2), DemandeConge.Statut.APPROUVE)  # lundi : 5 jours ouvrables
+        rejetee = self.demande(date(2020, 6, 1), DemandeConge.Statut.REJETE)
+        en_attente = self.demande(date(2020, 9, 7), DemandeConge.Statut.EN_ATTENTE)
+        recente = self.demande(date(2021, 3, 1), DemandeConge.Statut.APPROUVE)
+        self.assertEqual(self.employe.conges_consommes_annee(2020), 5)
+        self.assertFalse(SoldeConge.objects.filter(employe=self.employe, annee=2020).exists())
+
+        self.assertEqual(archiver(date(2021, 1, 1)), 2)
+        self.assertEqual(set(DemandeConge.objects.values_list("pk", flat=True)), {en_attente.pk, recente.pk})
+        self.assertFalse(NotificationConge.objects.filter(demande_id__in=[approuvee.pk, rejetee.pk]).exists())
+        self.assertFalse(HistoriqueConge.objects.filter(demande_id__in=[approuvee.pk, rejetee.pk]).exists())
+        archivee = DemandeArchivee.objects.get(pk=approuvee.pk)
+        self.assertEqual((archivee.statut, archivee.jours_ouvrables), (DemandeConge.Statut.APPROUVE, 5))
+        self.assertEqual([entree["action"] for entree in archivee.historique], [Action.CREATION])
+        self.assertEqual(len(archivee.notifications), 1)
+
+        # Solde de l'année figé avant l'archivage, jours consommés inchangés
+        solde = SoldeConge.objects.get(employe=self.employe, annee=2020)
+        self.assertEqual(solde.jours_pris, 5)
+        self.assertEqual(self.employe.conges_consommes_annee(2020), 5)
+        self.assertEqual(archiver(date(2021, 1, 1)), 0)
+
+    def test_lecture_par_l_api(self):
+        demande = self.demande(date(2020, 3, 2), DemandeConge.Statut.APPROUVE)
+        archiver(date(2021, 1, 1))
+
+        self.client.force_login(self.employe)
+        liste = self.client.get(reverse("api_archives"), {"annee": 2020}).json()
+        self.assertEqual([ligne["id"] for ligne in liste["resultats"]], [demande.pk])
+        detail = self.client.get(reverse("api_archive", args=[demande.pk])).json()
+        self.assertEqual([entree["action"] for entree in detail["historique"]], [Action.CREATION])
+        self.assertEqual([n["titre"] for n in detail["notifications"]], ["Demande traitée"])
+
+        # Hors de la portée d'un autre employé
+        self.client.force_login(self.jeu.ajouter_employes(1, 0)[0])
+        self.assertEqual(self.client.get(reverse("api_archive", args=[demande.pk])).status_code, 404)
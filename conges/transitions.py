@@ -0,0 +1,113 @@
+"""
+Transitions de statut des demandes de congé, à concurrence optimiste.
+
+Chaque demande porte un numéro de version. Une transition est un UPDATE
+conditionnel (compare-and-swap) sur la version et le statut lus : si un
+autre approbateur a agi entre-temps, aucune ligne n'est modifiée et la
+transition est refusée avec l'état actuel de la demande, sans verrou posé
+sur la table.
+
+Les jours réservés sur le solde (conges.soldes) sont comptés comme pris à
+l'approbation et libérés au rejet ou à l'annulation, dans la même
+transaction que l'UPDATE, qui retire aussi la demande des boîtes de ses
+approbateurs (conges.affectations).
+
+Dans un circuit d'approbation à plusieurs étapes (conges.circuits),
+l'approbation d'une étape intermédiaire est le même UPDATE conditionnel,
+qui avance l'étape sans changer le statut ; la demande passe dans la boîte
+des approbateurs de l'étape suivante.
+
+L'UPDATE ne passe pas par save() : le journal d'audit et l'invalidation du
+cache sont déclenchés ici.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .affectations import affecter, retirer
+from .audit import ACTIONS_PAR_STATUT, Action, journaliser, memoriser_statut
+from .cache import invalider_utilisateurs
+from .circuits import echeance_escalade
+from .models import DemandeConge
+from .soldes import solder_reservation
+
+Statut = DemandeConge.Statut
+
+TRANSITIONS = {
+    Statut.EN_ATTENTE: {Statut.APPROUVE, Statut.REJETE, Statut.ANNULE},
+}
+
+
+class TransitionInvalide(Exception):
+    """Transition non prévue par la machine à états"""
+
+
+class ConflitTransition(TransitionInvalide):
+    """La demande a été modifiée depuis sa lecture ; porte l'état gagnant"""
+
+    def __init__(self, demande):
+        self.statut_actuel = demande.statut
+        self.version_actuelle = demande.version
+        self.approbateur = demande.approbateur
+        if demande.approbateur:
+            qui = demande.approbateur.get_full_name() or demande.approbateur.username
+            message = f"La demande a déjà été traitée par {qui} ({demande.get_statut_display().lower()})"
+        else:
+            message = f"La demande a été modifiée entre-temps ({demande.get_statut_display().lower()})"
+        super().__init__(message)
+
+
+def effectuer_transition(demande, nouveau_statut, acteur, version=None, depuis=None,
+                         motif_rejet="", commentaire_approbateur=""):
+    """Passe `demande` de `depuis` (statut lu, par défaut demande.statut) à
+    `nouveau_statut`, à condition que sa version soit toujours `version`
+    (par défaut demande.version). Une approbation avant la dernière étape du
+    circuit passe seulement à l'étape suivante. Met à jour l'instance en cas
+    de succès."""
+    depuis = depuis or demande.statut
+    version = demande.version if version is None else version
+    if nouveau_statut not in TRANSITIONS.get(depuis, ()):
+        raise TransitionInvalide(f"Transition impossible : {depuis} → {nouveau_statut}")
+
+    maintenant = timezone.now()
+    jours_reserves = demande.jours_reserves
+    etape_suivante = nouveau_statut == Statut.APPROUVE and not demande.est_derniere_etape()
+    if etape_suivante:
+        # Étape intermédiaire du circuit (conges.circuits) : la demande reste en attente
+        etape = demande.etape + 1
+        valeurs = {"etape": etape, "escaladee": False,
+                   "escalade_a": echeance_escalade(demande.circuit[etape], maintenant)}
+    else:
+        valeurs = {"statut": nouveau_statut, "jours_reserves": 0, "escalade_a": None}
+        if nouveau_statut != Statut.ANNULE:
+            valeurs.update(approbateur=acteur, date_traitement=maintenant,
+                           motif_rejet=motif_rejet, commentaire_approbateur=commentaire_approbateur)
+    # Sans point de sauvegarde : rien n'est levé dans le bloc, et un échec
+    # du compare-and-swap n'a rien écrit.
+    with transaction.atomic(savepoint=False):
+        modifiees = DemandeConge.objects.filter(pk=demande.pk, version=version, statut=depuis,
+                                                etape=demande.etape).update(version=F("version") + 1, **valeurs)
+        if modifiees and etape_suivante:
+            affecter(DemandeConge.objects.filter(pk=demande.pk))
+        elif modifiees:
+            retirer(demande.pk)
+            if jours_reserves:
+                solder_reservation(demande.employe_id, demande.date_debut.year, jours_reserves,
+                                   consommer=nouveau_statut == Statut.APPROUVE)
+    if not modifiees:
+        actuelle = DemandeConge.objects.select_related("approbateur").only(
+            "statut", "version", "approbateur").get(pk=demande.pk)
+        raise ConflitTransition(actuelle)
+
+    for champ, valeur in valeurs.items():
+        setattr(demande, champ, valeur)
+    demande.version = version + 1
+    memoriser_statut(demande)
+    if etape_suivante:
+        journaliser(demande.pk, acteur.pk, Action.APPROBATION_ETAPE, depuis, depuis, commentaire_approbateur)
+    else:
+        journaliser(demande.pk, acteur.pk, ACTIONS_PAR_STATUT[nouveau_statut], depuis, nouveau_statut,
+                    motif_rejet if nouveau_statut == Statut.REJETE else commentaire_approbateur)
+    employe_id = demande.employe_id
+    transaction.on_commit(lambda: invalider_utilisateurs(employe_id))
+    return demande
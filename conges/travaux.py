@@ -0,0 +1,102 @@
+"""
+Tâches exécutables par la file d'arrière-plan (voir conges.taches).
+"""
+import csv
+import io
+from datetime import date
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import QueryDict
+
+from .acquisitions import calculer_acquisitions
+from .affectations import demandes_concernees as demandes_a_affecter, reaffecter
+from .archives import archivables, archiver, limite_par_defaut
+from .calendriers import demandes_concernees, recalculer_jours_ouvrables
+from .circuits import escalader
+from .forms import FiltreDemandesForm
+from .models import DemandeConge, User
+from .rappels import envoyer_rappels
+from .taches import tache
+
+LIGNES_PAR_ETAPE = 2000
+
+
+@tache("exporter_demandes")
+def exporter_demandes(contexte, utilisateur_id, filtres=""):
+    """Export CSV des demandes visibles dans liste_demandes, avec les mêmes filtres"""
+    utilisateur = User.objects.get(pk=utilisateur_id)
+    form_filtre = FiltreDemandesForm(QueryDict(filtres) or None, user=utilisateur)
+    demandes = form_filtre.filtrer(
+        DemandeConge.objects.visible_to(utilisateur).select_related("employe", "type_conge", "approbateur")
+        .order_by("pk"))
+    total = demandes.count()
+
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon, delimiter=";")
+    ecrivain.writerow(["id", "employe", "type", "date_debut", "date_fin", "jours_ouvrables", "statut",
+                       "date_demande", "approbateur", "date_traitement"])
+    for numero, demande in enumerate(demandes.iterator(chunk_size=LIGNES_PAR_ETAPE), start=1):
+        ecrivain.writerow([
+            demande.pk, demande.employe.get_full_name() or demande.employe.username, demande.type_conge.nom,
+            demande.date_debut, demande.date_fin, demande.jours_ouvrables, demande.statut, demande.date_demande.isoformat(),
+            demande.approbateur.username if demande.approbateur else "",
+            demande.date_traitement.isoformat() if demande.date_traitement else "",
+        ])
+        if numero % LIGNES_PAR_ETAPE == 0:
+            contexte.progression(numero * 100 // max(total, 1), f"{numero} / {total} demandes")
+
+    nom = default_storage.save(f"exports/demandes-{contexte.tache.pk}.csv",
+                               ContentFile(tampon.getvalue().encode("utf-8-sig")))
+    return {"fichier": nom, "lignes": total}
+
+
+@tache("calculer_acquisitions")
+def tache_calculer_acquisitions(contexte, annee, mois):
+    return {"employes": calculer_acquisitions(annee, mois)}
+
+
+@tache("envoyer_rappels")
+def tache_envoyer_rappels(contexte):
+    return {"rappels": envoyer_rappels()}
+
+
+@tache("escalader_demandes")
+def tache_escalader_demandes(contexte):
+    return {"escaladees": escalader()}
+
+
+@tache("archiver_demandes")
+def tache_archiver_demandes(contexte, limite=None):
+    """Archivage planifié des demandes clôturées (voir conges.archives) ; `limite` au format AAAA-MM-JJ"""
+    limite = date.fromisoformat(limite) if limite else limite_par_defaut()
+    total = archivables(limite).count()
+
+    def progression(archivees):
+        contexte.progression(archivees * 100 // max(total, 1), f"{archivees} / {total} demandes archivées")
+
+    return {"archivees": archiver(limite, progression)}
+
+
+@tache("recalculer_jours_ouvrables")
+def tache_recalculer_jours_ouvrables(contexte, calendrier_id=None, direction_id=None, employe_id=None):
+    """Mise en file par les signaux à chaque modification d'un calendrier (voir conges.calendriers)"""
+    demandes = demandes_concernees(calendrier_id, direction_id, employe_id)
+    total = demandes.count()
+
+    def progression(lues, modifiees):
+        contexte.progression(lues * 100 // max(total, 1), f"{lues} / {total} demandes, {modifiees} modifiée(s)")
+
+    return {"modifiees": recalculer_jours_ouvrables(demandes, progression)}
+
+
+@tache("affecter_approbateurs")
+def tache_affecter_approbateurs(contexte, **criteres):
+    """Mise en file par les signaux à chaque changement d'organisation (voir conges.affectations)"""
+    demandes = demandes_a_affecter(**criteres)
+    total = demandes.count()
+
+    def progression(lues, enregistrees):
+        contexte.progression(lues * 100 // max(total, 1), f"{lues} / {total} demandes, {enregistrees} affectation(s)")
+
+    return {"affectations": reaffecter(demandes, progression)}
@@ -1,11 +1,32 @@
+import os
+
 from django.shortcuts import render, get_object_or_404, redirect
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.utils import timezone
-from django.db.models import Q
+from django.utils.safestring import mark_safe
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import AffectationApprobation, DemandeConge, NotificationConge, Tache, TypeConge
+from .forms import DemandeCongeForm, TraitementDemandeForm, FiltreDemandesForm
+from .cache import DUREE_FRAGMENTS, cle_fragment, generation as generation_utilisateur
+from .calendriers import generation_jours_ouvrables
+from .conditionnel import agregats_validateurs, ajouter_validateurs, calculer_validateurs, reponse_conditionnelle
+from .diffusion import DELAI_LONG_POLLING, RETRY_SSE, attendre_notifications, evenement_sse, flux_evenements
+from .soldes import SoldeInsuffisant, reserver
+from .stockage import GestionnaireTeleversementJustificatif, servir_fichier
+from .taches import mettre_en_file
+from .transitions import TransitionInvalide, effectuer_transition
 
-from .models import User, DemandeConge, NotificationConge
-from .forms import ( DemandeCongeForm,TraitementCongeForm,FiltreCongeForm, NotificationCongeForm)
+BOITE_MAX = 100
 
 
 # -------------------------------
@@ -20,93 +41,252 @@ def est_manager_ou_rh(user):
 # -------------------------------
 @login_required
 def dashboard(request):
-    demandes = DemandeConge.objects.filter(employe=request.user)
-    notifications = NotificationConge.objects.filter(employe=request.user, lu=False)
-    return render(request, "conges/dashboard.html", {
-        "demandes": demandes,
-        "notifications": notifications,
-    })
+    # Fragments en cache par utilisateur, versionnés par sa génération :
+    # une visite répétée sans écriture entre-temps n'interroge pas l'ORM.
+    generation = generation_utilisateur(request.user.pk)
+
+    # La génération change à chaque écriture sur les demandes ou notifications
+    # de l'utilisateur : c'est aussi un validateur HTTP qui ne coûte aucune requête.
+    # Le rôle décide des liens du menu, le nom de l'en-tête.
+    utilisateur = request.user
+    etag, _ = calculer_validateurs(
+        (utilisateur.pk, utilisateur.username, utilisateur.get_full_name(), utilisateur.role, generation)
+    )
+    non_modifiee = reponse_conditionnelle(request, etag, None)
+    if non_modifiee:
+        return non_modifiee
+
+    cles = {nom: cle_fragment(nom, request.user.pk, generation)
+            for nom in ("demandes", "notifications", "derniere_notification")}
+    fragments = cache.get_many(cles.values())
+    manquants = {}
+
+    if cles["demandes"] not in fragments:
+        demandes = DemandeConge.objects.filter(employe=request.user).select_related(
+            "employe", "type_conge", "approbateur"
+        )
+        manquants[cles["demandes"]] = render_to_string("conges/_dashboard_demandes.html", {"demandes": demandes})
+    if cles["notifications"] not in fragments or cles["derniere_notification"] not in fragments:
+        # Non lues, plus la plus récente même lue : son identifiant sert de point
+        # de départ au flux direct, qui ne doit manquer aucune notification
+        # créée entre le rendu et la connexion.
+        recues = NotificationConge.objects.filter(destinataire=request.user)
+        notifications = list(recues.filter(lu=False) | recues.filter(pk=recues.order_by("-id").values("id")[:1]))
+        manquants[cles["notifications"]] = render_to_string("conges/_dashboard_notifications.html", {
+            "notifications": [notification for notification in notifications if not notification.lu],
+        })
+        manquants[cles["derniere_notification"]] = max((notification.pk for notification in notifications),
+                                                       default=0)
+    if manquants:
+        cache.set_many(manquants, DUREE_FRAGMENTS)
+        fragments.update(manquants)
+
+    return ajouter_validateurs(render(request, "conges/dashboard.html", {
+        "fragment_demandes": mark_safe(fragments[cles["demandes"]]),
+        "fragment_notifications": mark_safe(fragments[cles["notifications"]]),
+        "dernier_id": fragments[cles["derniere_notification"]],
+        "flux_sse": _flux_sse(request),
+    }), etag, None)
 
 
 # -------------------------------
 # Créer une demande de congé
 # -------------------------------
+# Le gestionnaire d'upload doit être installé avant la lecture du corps de
+# la requête, donc avant la vérification CSRF (voir la documentation Django
+# « Modifying upload handlers on the fly »).
 @login_required
+@csrf_exempt
 def creer_demande_conge(request):
+    request.upload_handlers.insert(0, GestionnaireTeleversementJustificatif(request))
+    return _creer_demande_conge(request)
+
+
+@csrf_protect
+def _creer_demande_conge(request):
     if request.method == "POST":
-        form = DemandeCongeForm(request.POST, request.FILES, employe=request.user)
+        form = DemandeCongeForm(request.POST, request.FILES, user=request.user)
+        for erreur in getattr(request, "erreurs_televersement", []):
+            form.add_error("justificatif", erreur)
         if form.is_valid():
             demande = form.save(commit=False)
             demande.employe = request.user
-            demande.save()
-            messages.success(request, "Votre demande de congé a été soumise avec succès.")
-            return redirect("dashboard")
+            try:
+                # Réservation du solde, demande, notifications et journal d'audit validés ensemble
+                with transaction.atomic():
+                    reserver(demande)
+                    demande.save()
+                    NotificationConge.creer_notifications(demande, NotificationConge.TypeNotification.NOUVELLE_DEMANDE)
+            except SoldeInsuffisant as erreur:
+                form.add_error(None, str(erreur))
+            else:
+                messages.success(request, "Votre demande de congé a été soumise avec succès.")
+                return redirect("dashboard")
     else:
-        form = DemandeCongeForm(employe=request.user)
+        form = DemandeCongeForm(user=request.user)
 
     return render(request, "conges/creer_demande.html", {"form": form})
 
 
+# -------------------------------
+# Téléchargement du justificatif
+# -------------------------------
+@login_required
+def telecharger_justificatif(request, demande_id):
+    # Ses propres demandes, celles de sa portée et celles dont on approuve l'étape en cours
+    demandes = DemandeConge.objects.visible_to(request.user) | DemandeConge.objects.a_traiter_par(request.user)
+    demande = get_object_or_404(demandes.only("id", "employe_id", "justificatif"), id=demande_id)
+    if not demande.justificatif:
+        raise Http404("Aucun justificatif pour cette demande")
+    extension = os.path.splitext(demande.justificatif.name)[1]
+    return servir_fichier(request, demande.justificatif, f"justificatif-demande-{demande.pk}{extension}")
+
+
 # -------------------------------
 # Liste des demandes (RH / Manager)
 # -------------------------------
 @login_required
 @user_passes_test(est_manager_ou_rh)
 def liste_demandes(request):
-    demandes = DemandeConge.objects.all()
-    form_filtre = FiltreCongeForm(request.GET or None)
-
-    if form_filtre.is_valid():
-        if form_filtre.cleaned_data.get("date_debut"):
-            demandes = demandes.filter(date_debut__gte=form_filtre.cleaned_data["date_debut"])
-        if form_filtre.cleaned_data.get("date_fin"):
-            demandes = demandes.filter(date_fin__lte=form_filtre.cleaned_data["date_fin"])
-        if form_filtre.cleaned_data.get("statut"):
-            demandes = demandes.filter(statut=form_filtre.cleaned_data["statut"])
-        if form_filtre.cleaned_data.get("employe"):
-            demandes = demandes.filter(
-                employe__username__icontains=form_filtre.cleaned_data["employe"]
-            )
-
-    return render(request, "conges/liste_demandes.html", {
+    demandes = DemandeConge.objects.visible_to(request.user).select_related("employe", "type_conge", "approbateur")
+    form_filtre = FiltreDemandesForm(request.GET or None, user=request.user)
+    demandes = form_filtre.filtrer(demandes)
+
+    etag, derniere_modification = calculer_validateurs(
+        # Jours ouvrables recalculés sans changer de date (conges.calendriers)
+        (request.user.pk, request.GET.urlencode(), generation_jours_ouvrables()),
+        demandes.aggregate(**agregats_validateurs("date_demande", "date_traitement", version="version")),
+    )
+    non_modifiee = reponse_conditionnelle(request, etag, derniere_modification)
+    if non_modifiee:
+        return non_modifiee
+
+    return ajouter_validateurs(render(request, "conges/liste_demandes.html", {
         "demandes": demandes,
         "form_filtre": form_filtre
-    })
+    }), etag, derniere_modification)
 
 
 # -------------------------------
 # Traiter une demande de congé
 # -------------------------------
 @login_required
-@user_passes_test(est_manager_ou_rh)
 def traiter_demande(request, demande_id):
-    demande = get_object_or_404(DemandeConge, id=demande_id)
+    # Managers, RH et administrateurs dans leur portée, et approbateurs de l'étape en cours
+    demande = get_object_or_404(
+        DemandeConge.objects.a_traiter_par(request.user).select_related("employe__manager", "type_conge"),
+        id=demande_id,
+    )
 
     if request.method == "POST":
-        form = TraitementCongeForm(request.POST, instance=demande)
+        statut_lu = demande.statut  # le formulaire modifie l'instance
+        form = TraitementDemandeForm(request.POST, instance=demande)
         if form.is_valid():
-            demande = form.save(commit=False)
-            demande.manager = request.user
-            demande.date_traitement = timezone.now()
-            demande.save()
-
-            # Créer notification
-            message = f"Votre demande de congé a été {demande.get_statut_display()}."
-            if demande.statut == DemandeConge.Statut.REJETE:
-                message += f" Motif: {demande.motif_rejet}"
-
-            NotificationConge.objects.create(
-                demande=demande,
-                employe=demande.employe,
-                message=message
-            )
-
-            messages.success(request, "La demande a été traitée avec succès.")
-            return redirect("liste_demandes")
+            try:
+                if not (request.user.is_rh() or request.user.is_admin() or
+                        demande.affectations.filter(approbateur=request.user).exists()):
+                    raise TransitionInvalide("Vous n'êtes pas approbateur de l'étape en cours de cette demande")
+                with transaction.atomic():
+                    effectuer_transition(
+                        demande, form.cleaned_data["statut"], request.user,
+                        version=form.cleaned_data["version"], depuis=statut_lu,
+                        motif_rejet=form.cleaned_data["motif_rejet"],
+                        commentaire_approbateur=form.cleaned_data["commentaire_approbateur"],
+                    )
+                    # Créer les notifications : approbateurs de l'étape suivante, ou employé et manager
+                    if demande.statut == DemandeConge.Statut.EN_ATTENTE:
+                        type_notification = NotificationConge.TypeNotification.NOUVELLE_DEMANDE
+                    elif demande.statut == DemandeConge.Statut.APPROUVE:
+                        type_notification = NotificationConge.TypeNotification.DEMANDE_APPROUVEE
+                    else:
+                        type_notification = NotificationConge.TypeNotification.DEMANDE_REJETEE
+                    NotificationConge.creer_notifications(demande, type_notification)
+            except TransitionInvalide as erreur:
+                messages.error(request, str(erreur))
+            else:
+                if demande.statut == DemandeConge.Statut.EN_ATTENTE:
+                    messages.success(request, "Étape approuvée : la demande passe à l'étape suivante.")
+                else:
+                    messages.success(request, "La demande a été traitée avec succès.")
+            return redirect("liste_demandes" if est_manager_ou_rh(request.user) else "boite_approbation")
     else:
-        form = TraitementCongeForm(instance=demande)
+        form = TraitementDemandeForm(instance=demande)
+
+    return render(request, "conges/traiter_demande.html", {
+        "form": form,
+        "demande": demande,
+        "circuit": [
+            {"libelle": TypeConge.Approbateur(etape["approbateur"]).label,
+             "etat": "faite" if numero < demande.etape else "en cours" if numero == demande.etape else "à venir"}
+            for numero, etape in enumerate(demande.circuit)
+        ],
+    })
+
+
+# -------------------------------
+# Boîte d'approbation
+# -------------------------------
+@login_required
+def boite_approbation(request):
+    """Demandes en attente que l'utilisateur peut approuver, les plus anciennes
+    d'abord, avec leur nombre par type et priorité : deux requêtes sur les
+    index de AffectationApprobation (voir conges.affectations)."""
+    compteurs = [
+        {"type_conge": type_id, "type_libelle": TypeConge.Type(nom).label, "priorite": priorite,
+         "priorite_libelle": DemandeConge.Priorite(priorite).label, "nombre": nombre}
+        for type_id, nom, priorite, nombre in AffectationApprobation.objects.filter(approbateur=request.user)
+        .order_by("type_conge_id", "priorite").values_list("type_conge_id", "type_conge__nom", "priorite")
+        .annotate(nombre=Count("pk"))
+    ]
+
+    filtre = {"affectations__approbateur": request.user}
+    type_id, priorite = request.GET.get("type", ""), request.GET.get("priorite", "")
+    if type_id.isdigit():
+        filtre["affectations__type_conge_id"] = int(type_id)
+    if priorite in DemandeConge.Priorite.values:
+        filtre["affectations__priorite"] = priorite
+    demandes = (DemandeConge.objects.filter(**filtre).select_related("employe", "type_conge")
+                .order_by("affectations__date_demande", "pk")[:BOITE_MAX])
 
-    return render(request, "conges/traiter_demande.html", {"form": form, "demande": demande})
+    return render(request, "conges/boite_approbation.html", {
+        "demandes": demandes,
+        "compteurs": compteurs,
+        "total": sum(compteur["nombre"] for compteur in compteurs),
+        "boite_max": BOITE_MAX,
+    })
+
+
+# -------------------------------
+# Tâches en arrière-plan
+# -------------------------------
+@login_required
+@user_passes_test(est_manager_ou_rh)
+@require_POST
+def exporter_demandes(request):
+    tache = mettre_en_file("exporter_demandes", {"utilisateur_id": request.user.pk,
+                                                 "filtres": request.GET.urlencode()}, cree_par=request.user)
+    return JsonResponse({"id": tache.pk, "suivi": reverse("suivi_tache", args=[tache.pk])}, status=202)
+
+
+@login_required
+def suivi_tache(request, tache_id):
+    # Interrogée en boucle par le navigateur : une lecture de colonnes, rien d'autre
+    etat = Tache.objects.filter(pk=tache_id, cree_par=request.user).values(
+        "statut", "progression", "message", "resultat").first()
+    if etat is None:
+        raise Http404("Tâche introuvable")
+    if etat["statut"] == Tache.Statut.TERMINEE and (etat["resultat"] or {}).get("fichier"):
+        etat["telechargement"] = reverse("telecharger_export", args=[tache_id])
+    return JsonResponse(etat)
+
+
+@login_required
+def telecharger_export(request, tache_id):
+    tache = get_object_or_404(Tache, pk=tache_id, cree_par=request.user, statut=Tache.Statut.TERMINEE)
+    nom = (tache.resultat or {}).get("fichier")
+    if not nom or not default_storage.exists(nom):
+        raise Http404("Fichier introuvable")
+    return FileResponse(default_storage.open(nom, "rb"), as_attachment=True, filename=os.path.basename(nom))
 
 
 # -------------------------------
@@ -114,13 +294,68 @@ def traiter_demande(request, demande_id):
 # -------------------------------
 @login_required
 def notifications(request):
-    notifications = NotificationConge.objects.filter(employe=request.user)
-    return render(request, "conges/notifications.html", {"notifications": notifications})
+    portee = NotificationConge.objects.filter(destinataire=request.user)
+    etag, derniere_modification = calculer_validateurs(
+        request.user.pk, portee.aggregate(**agregats_validateurs("date_creation", "date_lecture"))
+    )
+    non_modifiee = reponse_conditionnelle(request, etag, derniere_modification)
+    if non_modifiee:
+        return non_modifiee
+
+    return ajouter_validateurs(
+        render(request, "conges/notifications.html", {"notifications": portee, "flux_sse": _flux_sse(request)}),
+        etag, derniere_modification,
+    )
 
 
 @login_required
 def marquer_notification_lue(request, notification_id):
-    notif = get_object_or_404(NotificationConge, id=notification_id, employe=request.user)
+    notif = get_object_or_404(NotificationConge, id=notification_id, destinataire=request.user)
     notif.marquer_comme_lu()
     return redirect("notifications")
 
+
+# -------------------------------
+# Notifications en direct (SSE / long-polling)
+# -------------------------------
+async def _dernier_id_recu(request, user):
+    """Dernier id de notification connu du client (Last-Event-ID ou ?depuis=),
+    à défaut le plus récent en base : seules les nouvelles sont envoyées."""
+    valeur = request.headers.get("Last-Event-ID") or request.GET.get("depuis")
+    if valeur and valeur.isdigit():
+        return int(valeur)
+    resultat = await NotificationConge.objects.filter(destinataire=user).aaggregate(dernier=Max("id"))
+    return resultat["dernier"] or 0
+
+
+def _flux_sse(request):
+    # Flux sans fin seulement sous ASGI : sous WSGI, Django consomme un
+    # itérateur asynchrone en entier avant d'envoyer quoi que ce soit
+    return isinstance(request, ASGIRequest)
+
+
+@login_required
+async def flux_notifications(request):
+    user = await request.auser()
+    dernier_id = await _dernier_id_recu(request, user)
+    if _flux_sse(request):
+        response = StreamingHttpResponse(flux_evenements(user.pk, dernier_id), content_type="text/event-stream")
+    else:
+        # Une attente bornée, puis reconnexion du navigateur (Last-Event-ID)
+        nouvelles = await attendre_notifications(user.pk, dernier_id, DELAI_LONG_POLLING)
+        response = HttpResponse(f"retry: {RETRY_SSE}\n\n" + "".join(map(evenement_sse, nouvelles)),
+                                content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@login_required
+async def attente_notifications(request):
+    user = await request.auser()
+    dernier_id = await _dernier_id_recu(request, user)
+    nouvelles = await attendre_notifications(user.pk, dernier_id, DELAI_LONG_POLLING)
+    return JsonResponse({
+        "notifications": nouvelles,
+        "dernier_id": nouvelles[-1]["id"] if nouvelles else dernier_id,
+    })
@@ -0,0 +1,16 @@
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+
+
+class ExecuteurTests(DiscoverRunner):
+    """Lanceur de tests qui part d'un cache vide.
+
+    Le cache est partagé sur disque (voir CACHES) : sans cela, des fragments
+    et générations d'une exécution précédente, ou de la base de
+    développement, seraient servis pour les mêmes identifiants.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        for cache in caches.all():
+            cache.clear()
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL = 'conges.User'
 
+LOGIN_REDIRECT_URL = 'dashboard'
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,10 +81,50 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Les écrivains concurrents attendent le verrou au lieu d'échouer
+        # (transitions concurrentes, voir conges.transitions).
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Base de test sur disque : une base en mémoire partagée entre threads
+        # refuse les écritures concurrentes au lieu de les sérialiser.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# Fragments du tableau de bord, portées, calendriers et sessions. Le cache
+# doit être partagé par tous les processus : les générations y sont
+# incrémentées aussi par les workers de tâches et les commandes (clôture,
+# archivage, rappels), et un cache propre à chaque processus servirait des
+# fragments périmés. Le cache fichier est partagé entre les processus d'une
+# même machine ; sur plusieurs machines, utiliser Redis ou Memcached.
+# Son incr() n'est pas atomique, sans conséquence ici : les générations
+# sont incrémentées après la validation des écritures, et deux incréments
+# simultanés qui n'en comptent qu'un donnent quand même une nouvelle valeur
+# postérieure aux deux écritures.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+}
+
+# Vide le cache partagé au lancement des tests (identifiants réutilisés
+# d'une base de test à l'autre)
+TEST_RUNNER = 'projconj.executeur_tests.ExecuteurTests'
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -119,6 +161,18 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Justificatifs déposés (stockage adressé par contenu, voir conges/stockage.py).
+# Ils ne sont jamais servis directement : le téléchargement passe par une vue
+# qui contrôle les droits.
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_URL = 'media/'
+JUSTIFICATIF_TAILLE_MAX = 5 * 1024 * 1024
+
+# Jours de congé annuel reportables sur l'année suivante (clôture annuelle)
+CONGES_REPORT_MAX = 5
+# Ancienneté (heures) d'une demande en attente à partir de laquelle ses approbateurs sont relancés
+CONGES_DELAI_RAPPEL_HEURES = 48
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
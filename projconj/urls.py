@@ -15,11 +15,37 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
-from conges import views
+from django.urls import include, path
+from conges import api, views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('accounts/', include('django.contrib.auth.urls')),
 
-    
+    path('', views.dashboard, name='dashboard'),
+    path('demandes/nouvelle/', views.creer_demande_conge, name='creer_demande_conge'),
+    path('demandes/', views.liste_demandes, name='liste_demandes'),
+    path('demandes/<int:demande_id>/traiter/', views.traiter_demande, name='traiter_demande'),
+    path('demandes/<int:demande_id>/justificatif/', views.telecharger_justificatif,
+         name='telecharger_justificatif'),
+    path('demandes/export/', views.exporter_demandes, name='exporter_demandes'),
+    path('approbations/', views.boite_approbation, name='boite_approbation'),
+    path('taches/<int:tache_id>/', views.suivi_tache, name='suivi_tache'),
+    path('taches/<int:tache_id>/fichier/', views.telecharger_export, name='telecharger_export'),
+    path('notifications/', views.notifications, name='notifications'),
+    path('notifications/<int:notification_id>/lue/', views.marquer_notification_lue,
+         name='marquer_notification_lue'),
+    path('notifications/flux/', views.flux_notifications, name='flux_notifications'),
+    path('notifications/attente/', views.attente_notifications, name='attente_notifications'),
+
+    # API JSON (voir conges.api)
+    path('api/v1/demandes/', api.demandes, name='api_demandes'),
+    path('api/v1/demandes/<int:demande_id>/', api.demande, name='api_demande'),
+    path('api/v1/notifications/', api.notifications, name='api_notifications'),
+    path('api/v1/soldes/', api.soldes, name='api_soldes'),
+    path('api/v1/organisation/', api.organisation, name='api_organisation'),
+    path('api/v1/simulation/', api.simulation, name='api_simulation'),
+    path('api/v1/remplacants/', api.remplacants, name='api_remplacants'),
+    path('api/v1/archives/', api.archives, name='api_archives'),
+    path('api/v1/archives/<int:demande_id>/', api.archive, name='api_archive'),
 ]